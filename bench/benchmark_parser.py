@@ -0,0 +1,251 @@
+"""
+Banco de pruebas del parseo sin red.
+
+Ejecuta la extracción de scrape_booking_region (páginas de búsqueda) y de scrape_hotel_details
+(páginas de hotel) sobre un corpus de páginas guardadas en bench/fixtures/<tipo>/*.html y mide,
+por página y backend, el tiempo de construcción del árbol, el de extracción, el tiempo por tarjeta,
+la memoria reservada y el rendimiento. Los resultados se escriben en JSON para compararlos entre versiones:
+
+    python bench/benchmark_parser.py --salida actual.json
+    python bench/benchmark_parser.py --comparar base.json
+
+Con --grabar se añaden páginas reales al corpus (esa es la única opción que usa la red).
+"""
+
+import argparse
+import gzip
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(DIRECTORIO))
+
+import bs4  # noqa: E402
+import booking_scraper  # noqa: E402
+from booking_scraper import PAGE_EXTRACTORS, PAGE_REGIONS, parse_html, parser_backend_available  # noqa: E402
+
+CORPUS = os.path.join(DIRECTORIO, 'fixtures')
+
+
+def cargar_corpus(directorio, tipos):
+    """Lee las páginas del corpus; admite ficheros .html y .html.gz. Retorna una lista de (tipo, nombre, bytes)."""
+    paginas = []
+    for tipo in tipos:
+        carpeta = os.path.join(directorio, tipo)
+        if not os.path.isdir(carpeta):
+            continue
+        for nombre in sorted(os.listdir(carpeta)):
+            ruta = os.path.join(carpeta, nombre)
+            if nombre.endswith('.html.gz'):
+                with gzip.open(ruta, 'rb') as f:
+                    paginas.append((tipo, nombre, f.read()))
+            elif nombre.endswith('.html'):
+                with open(ruta, 'rb') as f:
+                    paginas.append((tipo, nombre, f.read()))
+    return paginas
+
+
+def medir_pagina(tipo, content, backend, subarbol, repeticiones):
+    """
+    Mide una página con un backend.
+
+    Retorna:
+        dict: Medianas de parseo y extracción en segundos, número de tarjetas (1 en páginas de hotel),
+              pico de memoria y memoria retenida por el árbol en bytes.
+    """
+    extractor = PAGE_EXTRACTORS[tipo]
+    kind = tipo if subarbol else None
+    # Calentamiento: compila selectores y carga módulos perezosos antes de medir
+    extraidos = extractor(parse_html(content, backend, kind))
+
+    parseos, extracciones = [], []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        arbol = parse_html(content, backend, kind)
+        medio = time.perf_counter()
+        extractor(arbol)
+        fin = time.perf_counter()
+        parseos.append(medio - inicio)
+        extracciones.append(fin - medio)
+        del arbol
+
+    tracemalloc.start()
+    try:
+        arbol = parse_html(content, backend, kind)
+        retenido = tracemalloc.get_traced_memory()[0]
+        extractor(arbol)
+        pico = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    del arbol
+
+    tarjetas = len(extraidos) if tipo == 'busqueda' else 1
+    parseo = statistics.median(parseos)
+    extraccion = statistics.median(extracciones)
+    total = parseo + extraccion
+    return {
+        'bytes': len(content),
+        'tarjetas': tarjetas,
+        'parseo_s': parseo,
+        'extraccion_s': extraccion,
+        'total_s': total,
+        'por_tarjeta_s': total / tarjetas if tarjetas else None,
+        'paginas_por_s': 1 / total if total else None,
+        'tarjetas_por_s': tarjetas / total if total else None,
+        'mb_por_s': len(content) / total / 1e6 if total else None,
+        'pico_bytes': pico,
+        'retenido_bytes': retenido,
+    }
+
+
+def ejecutar(paginas, backends, subarbol, repeticiones):
+    """Mide todas las páginas con todos los backends y agrega los totales por backend y tipo de página."""
+    resultados, totales = [], {}
+    for backend in backends:
+        for tipo, nombre, content in paginas:
+            medida = medir_pagina(tipo, content, backend, subarbol, repeticiones)
+            resultados.append({'backend': backend, 'tipo': tipo, 'pagina': nombre, **medida})
+            acumulado = totales.setdefault(f"{backend}/{tipo}", {'paginas': 0, 'tarjetas': 0, 'bytes': 0, 'total_s': 0.0})
+            acumulado['paginas'] += 1
+            acumulado['tarjetas'] += medida['tarjetas']
+            acumulado['bytes'] += medida['bytes']
+            acumulado['total_s'] += medida['total_s']
+    for acumulado in totales.values():
+        segundos = acumulado['total_s']
+        acumulado['por_tarjeta_s'] = segundos / acumulado['tarjetas'] if acumulado['tarjetas'] else None
+        acumulado['paginas_por_s'] = acumulado['paginas'] / segundos if segundos else None
+        acumulado['tarjetas_por_s'] = acumulado['tarjetas'] / segundos if segundos else None
+        acumulado['mb_por_s'] = acumulado['bytes'] / segundos / 1e6 if segundos else None
+    return resultados, totales
+
+
+def version_codigo():
+    """Commit actual del repositorio, si está disponible, para identificar la versión medida."""
+    try:
+        salida = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=DIRECTORIO,
+                                capture_output=True, text=True, timeout=5)
+        return salida.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def imprimir(resultados, totales):
+    print(f"{'backend':<14} {'tipo':<9} {'página':<32} {'parseo ms':>9} {'extr. ms':>9} {'ms/tarj.':>9} "
+          f"{'pico KiB':>9} {'ret. KiB':>9}")
+    for r in resultados:
+        por_tarjeta = f"{r['por_tarjeta_s'] * 1000:.3f}" if r['por_tarjeta_s'] is not None else '-'
+        print(f"{r['backend']:<14} {r['tipo']:<9} {r['pagina'][:32]:<32} {r['parseo_s'] * 1000:>9.2f} "
+              f"{r['extraccion_s'] * 1000:>9.2f} {por_tarjeta:>9} {r['pico_bytes'] / 1024:>9.0f} "
+              f"{r['retenido_bytes'] / 1024:>9.0f}")
+    print()
+    for clave, t in totales.items():
+        print(f"{clave}: {t['paginas']} páginas, {t['tarjetas']} tarjetas, {t['paginas_por_s']:.1f} páginas/s, "
+              f"{t['tarjetas_por_s']:.0f} tarjetas/s, {t['mb_por_s']:.1f} MB/s")
+
+
+def comparar(actual, base, umbral):
+    """
+    Compara el tiempo total de cada página con una ejecución anterior.
+
+    Retorna:
+        list: Claves (backend, tipo, página) cuyo tiempo ha empeorado más que el umbral relativo.
+    """
+    anteriores = {(r['backend'], r['tipo'], r['pagina']): r for r in base['resultados']}
+    regresiones = []
+    print(f"\nComparación con {base.get('version') or 'ejecución anterior'} ({base.get('fecha')}):")
+    for r in actual['resultados']:
+        clave = (r['backend'], r['tipo'], r['pagina'])
+        anterior = anteriores.get(clave)
+        if anterior is None:
+            continue
+        ratio = r['total_s'] / anterior['total_s'] if anterior['total_s'] else float('inf')
+        memoria = r['pico_bytes'] / anterior['pico_bytes'] if anterior['pico_bytes'] else float('inf')
+        marca = ''
+        if ratio > 1 + umbral:
+            regresiones.append(clave)
+            marca = '  <-- REGRESIÓN'
+        print(f"  {'/'.join(clave)}: tiempo x{ratio:.2f}, pico de memoria x{memoria:.2f}{marca}")
+    return regresiones
+
+
+def grabar(tipo, urls, directorio):
+    """Descarga páginas reales con la misma sesión y cabeceras que el scraper y las guarda comprimidas en el corpus."""
+    carpeta = os.path.join(directorio, tipo)
+    os.makedirs(carpeta, exist_ok=True)
+    booking_scraper._http_session = booking_scraper.abrir_sesion_http()
+    try:
+        for url in urls:
+            content = booking_scraper.fetch_page(url)
+            nombre = f"{tipo}_{datetime.now().strftime('%Y%m%d%H%M%S%f')}.html.gz"
+            with gzip.open(os.path.join(carpeta, nombre), 'wb') as f:
+                f.write(content)
+            print(f"{url} -> {nombre} ({len(content)} bytes)")
+    finally:
+        booking_scraper.cerrar_sesion_http(booking_scraper._http_session)
+        booking_scraper._http_session = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Banco de pruebas del parseo de páginas de Booking.com sin red")
+    parser.add_argument('--corpus', default=CORPUS, help="Directorio con subcarpetas busqueda/ y hotel/ (por defecto bench/fixtures).")
+    parser.add_argument('--tipo', choices=sorted(PAGE_REGIONS), action='append',
+                        help="Tipo de página a medir; se puede repetir (por defecto todos).")
+    parser.add_argument('--backend', action='append',
+                        help="Backend de parseo; se puede repetir (por defecto todos los disponibles).")
+    parser.add_argument('--subarbol', action='store_true', help="Parsea solo los subárboles de interés (como PARSE_SUBTREES=1).")
+    parser.add_argument('--repeticiones', type=int, default=5, help="Repeticiones por página; se usa la mediana (por defecto 5).")
+    parser.add_argument('--salida', help="Fichero JSON donde guardar los resultados.")
+    parser.add_argument('--comparar', metavar='BASE', help="JSON de una ejecución anterior con el que comparar.")
+    parser.add_argument('--umbral', type=float, default=0.10,
+                        help="Empeoramiento relativo a partir del cual --comparar falla (por defecto 0.10).")
+    parser.add_argument('--grabar', nargs='+', metavar=('TIPO', 'URL'),
+                        help="Descarga las URL indicadas al corpus como páginas del TIPO dado y termina.")
+    args = parser.parse_args()
+
+    if args.grabar:
+        tipo, *urls = args.grabar
+        if tipo not in PAGE_REGIONS or not urls:
+            parser.error("--grabar necesita un tipo (busqueda u hotel) y al menos una URL")
+        grabar(tipo, urls, args.corpus)
+        return 0
+
+    backends = args.backend or [b for b in booking_scraper.PARSER_BACKENDS if parser_backend_available(b)]
+    for backend in backends:
+        if not parser_backend_available(backend):
+            parser.error(f"backend de parseo no disponible: {backend}")
+    paginas = cargar_corpus(args.corpus, args.tipo or sorted(PAGE_REGIONS))
+    if not paginas:
+        parser.error(f"no hay páginas en el corpus {args.corpus}")
+
+    resultados, totales = ejecutar(paginas, backends, args.subarbol, args.repeticiones)
+    informe = {
+        'version': version_codigo(),
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'beautifulsoup4': bs4.__version__,
+        'subarbol': args.subarbol,
+        'repeticiones': args.repeticiones,
+        'resultados': resultados,
+        'totales': totales,
+    }
+    imprimir(resultados, totales)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(informe, f, ensure_ascii=False, indent=2)
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            base = json.load(f)
+        if comparar(informe, base, args.umbral):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
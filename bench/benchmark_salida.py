@@ -0,0 +1,173 @@
+"""
+Banco de pruebas de los formatos de salida.
+
+Escribe el mismo conjunto de registros con cada formato de OUTPUT_FORMATS (ndjson sin comprimir, que es
+el formato actual, ndjson.gz, ndjson.zst y parquet si están instaladas sus dependencias) y mide el tamaño
+en disco, el tiempo de escritura, el tiempo de lectura completa y el de un recorrido analítico (precio
+medio, que en Parquet solo lee la columna 'precio'):
+
+    python bench/benchmark_salida.py --registros 50000
+    python bench/benchmark_salida.py --entrada /data/out/almería_20250101.ndjson --salida formatos.json
+
+Los registros se toman de un fichero de salida existente (--entrada, repetido hasta --registros) o se
+generan con la forma de los de build_hotel_record.
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from itertools import cycle, islice
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(DIRECTORIO))
+
+import booking_scraper  # noqa: E402
+from booking_scraper import OUTPUT_FORMATS, leer_registros, output_format_available, split_hotel_record  # noqa: E402
+
+
+def registros_sinteticos(n, semilla=2425):
+    """Registros anchos con textos y listas de tamaño parecido a los reales, para n / 30 hoteles en 30 fechas."""
+    aleatorio = random.Random(semilla)
+    servicios = ['Piscina al aire libre', 'WiFi gratis', 'Parking gratis', 'Habitaciones sin humo',
+                 'Restaurante', 'Bar', 'Desayuno muy bueno', 'Servicio de habitaciones']
+    hoteles = []
+    for i in range(max(n // 30, 1)):
+        hoteles.append({
+            'url': f"https://www.booking.com/hotel/es/hotel-{i}.es.html",
+            'id': f"hotel-{i}",
+            'nombre': f"Hotel {i}",
+            'marca': aleatorio.choice([None, 'Grupo Playa Senator', 'Meliá']),
+            'destacados': aleatorio.sample(['Hotel sostenible', 'Genius', 'Hotel preferente'], 2),
+            'provincia': 'Almería',
+            'localidad': aleatorio.choice(['Roquetas de Mar', 'Mojácar', 'Níjar', 'Vera']),
+            'direccion': f"Avenida {i}, 04740 Roquetas de Mar, España",
+            'location': {'lat': round(36 + aleatorio.random(), 6), 'lon': round(-2 - aleatorio.random(), 6)},
+            'servicios': aleatorio.sample(servicios, 5),
+            'descripcion': 'El alojamiento ofrece piscina al aire libre, terraza y bar. ' * aleatorio.randint(6, 16),
+        })
+    inicio = date.today()
+    registros = []
+    for dia in range(30):
+        entrada = inicio + timedelta(days=dia)
+        for hotel in hoteles:
+            puntuacion = round(aleatorio.uniform(6, 9.8), 1)
+            registros.append({
+                **hotel,
+                'puntuacion': puntuacion,
+                'opinion': puntuacion,
+                'comentarios': aleatorio.randint(3, 4000),
+                'fechaEntrada': entrada.isoformat(),
+                'fechaSalida': (entrada + timedelta(days=1)).isoformat(),
+                'huespedes': 2,
+                'precio': aleatorio.randint(45, 900),
+            })
+            if len(registros) >= n:
+                return registros
+    return registros
+
+
+def medir_formato(formato, tipo, registros, directorio, repeticiones):
+    """Escribe y lee los registros con un formato; retorna tamaño, tiempos (mediana) y rendimiento."""
+    booking_scraper.OUTPUT_FORMAT = formato
+    path_base = os.path.join(directorio, f"{tipo}_{formato.replace('.', '_')}")
+    escrituras, lecturas, recorridos = [], [], []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        writer = booking_scraper.abrir_writer(path_base, tipo)
+        for registro in registros:
+            writer.write(registro)
+        writer.commit()
+        escrituras.append(time.perf_counter() - inicio)
+
+        inicio = time.perf_counter()
+        leidos = sum(1 for _ in leer_registros(writer.path))
+        lecturas.append(time.perf_counter() - inicio)
+
+        inicio = time.perf_counter()
+        precio_medio = recorrido_precio(writer.path)
+        recorridos.append(time.perf_counter() - inicio)
+    assert leidos == len(registros), f"{formato}: se leyeron {leidos} de {len(registros)} registros"
+    tamano = os.path.getsize(writer.path)
+    escritura = statistics.median(escrituras)
+    return {
+        'formato': formato,
+        'tipo': tipo,
+        'registros': len(registros),
+        'bytes': tamano,
+        'escritura_s': escritura,
+        'lectura_s': statistics.median(lecturas),
+        'recorrido_precio_s': statistics.median(recorridos),
+        'registros_por_s': len(registros) / escritura if escritura else None,
+        'precio_medio': precio_medio,
+    }
+
+
+def recorrido_precio(path):
+    """Precio medio del fichero: en Parquet se lee solo la columna; en ndjson hay que decodificar cada línea."""
+    if path.endswith('.parquet'):
+        columna = booking_scraper.pyarrow.parquet.read_table(path, columns=['precio']).column('precio').to_pylist()
+    else:
+        columna = [registro.get('precio') for registro in leer_registros(path)]
+    precios = [p for p in columna if p is not None]
+    return sum(precios) / len(precios) if precios else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Banco de pruebas de los formatos de salida del scraper")
+    parser.add_argument('--entrada', help="Fichero de salida del scraper del que tomar los registros.")
+    parser.add_argument('--registros', type=int, default=20000, help="Número de registros a escribir (por defecto 20000).")
+    parser.add_argument('--formato', choices=sorted(OUTPUT_FORMATS), action='append',
+                        help="Formato a medir; se puede repetir (por defecto todos los disponibles).")
+    parser.add_argument('--repeticiones', type=int, default=3, help="Repeticiones por formato; se usa la mediana (por defecto 3).")
+    parser.add_argument('--directorio', help="Directorio donde escribir (por defecto uno temporal, p. ej. para medir sobre NFS).")
+    parser.add_argument('--salida', help="Fichero JSON donde guardar los resultados.")
+    args = parser.parse_args()
+
+    if args.entrada:
+        origen = list(leer_registros(args.entrada))
+        if not origen:
+            parser.error(f"{args.entrada} no contiene registros")
+        registros = list(islice(cycle(origen), args.registros))
+    else:
+        registros = registros_sinteticos(args.registros)
+    provincia = registros[0].get('provincia', '')
+    precios = [split_hotel_record(registro, provincia)[1] for registro in registros]
+
+    formatos = args.formato or [f for f in OUTPUT_FORMATS if output_format_available(f)]
+    directorio = tempfile.mkdtemp(prefix='salida_', dir=args.directorio)
+    resultados = []
+    try:
+        for tipo, datos in (('ancho', registros), ('precios', precios)):
+            for formato in formatos:
+                if not output_format_available(formato):
+                    parser.error(f"formato no disponible: {formato}")
+                resultados.append(medir_formato(formato, tipo, datos, directorio, args.repeticiones))
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    referencia = {r['tipo']: r for r in resultados if r['formato'] == 'ndjson'}
+    print(f"{'tipo':<8} {'formato':<11} {'MB':>8} {'ratio':>6} {'escritura s':>12} {'registros/s':>12} "
+          f"{'lectura s':>10} {'precio medio s':>15}")
+    for r in resultados:
+        base = referencia.get(r['tipo'])
+        r['ratio_tamano'] = r['bytes'] / base['bytes'] if base else None
+        ratio = f"{r['ratio_tamano']:.2f}" if base else '-'
+        print(f"{r['tipo']:<8} {r['formato']:<11} {r['bytes'] / 1e6:>8.2f} {ratio:>6} {r['escritura_s']:>12.3f} "
+              f"{r['registros_por_s']:>12.0f} {r['lectura_s']:>10.3f} {r['recorrido_precio_s']:>15.3f}")
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump({'fecha': datetime.now().isoformat(timespec='seconds'), 'registros': len(registros),
+                       'resultados': resultados}, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
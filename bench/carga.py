@@ -0,0 +1,128 @@
+"""
+Prueba de carga de extremo a extremo contra el servidor local de bench/servidor_booking.py.
+
+Arranca el servidor (o usa uno ya en marcha con --url), apunta BOOKING_BASE_URL a él y ejecuta scraping()
+sobre la rejilla completa de provincias x fechas en un directorio temporal. Mide el tiempo total, las
+solicitudes por segundo y la latencia de las respuestas (p50/p95/p99) tal como las ve el cliente HTTP.
+La concurrencia y el límite de solicitudes se ajustan con las mismas variables de entorno que el scraper:
+
+    REQUEST_RATE=0 SCRAPER_WORKERS=8 python bench/carga.py --dias 3 --latencia 50 --variacion 100
+    ASYNC_MODE=1 python bench/carga.py --tasa-429 0.05 --salida carga.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(DIRECTORIO))
+sys.path.insert(0, DIRECTORIO)
+
+from servidor_booking import argumentos_servidor, config_desde_argumentos, iniciar_servidor  # noqa: E402
+
+
+class RegistroSolicitudes:
+    """Latencia y código de estado de cada respuesta recibida por la sesión HTTP del scraper."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencias = []
+        self.estados = Counter()
+
+    def hook(self, response, *args, **kwargs):
+        # response.elapsed va del envío de la solicitud a la recepción de las cabeceras
+        with self._lock:
+            self.latencias.append(response.elapsed.total_seconds())
+            self.estados[response.status_code] += 1
+        return response
+
+
+def percentil(valores, p):
+    """Percentil p (0-100) por el método del rango más cercano."""
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    indice = max(0, min(len(ordenados) - 1, -(-len(ordenados) * p // 100) - 1))
+    return ordenados[int(indice)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga del scraper contra un servidor local")
+    parser.add_argument('--url', help="URL base de un servidor ya arrancado; si no se indica se arranca uno local.")
+    parser.add_argument('--provincias', type=int, default=None,
+                        help="Número de provincias de DEST_IDS_TO_SCRAPE a recorrer (por defecto todas).")
+    parser.add_argument('--dias', type=int, default=None, help="Fechas de entrada a recorrer (por defecto DAYS_TO_SCRAPE).")
+    parser.add_argument('--salida', help="Fichero JSON donde guardar el resultado.")
+    parser.add_argument('--directorio', help="Directorio de salida del scraper (por defecto uno temporal).")
+    argumentos_servidor(parser)
+    args = parser.parse_args()
+
+    servidor = None
+    if args.url:
+        base_url = args.url.rstrip('/')
+    else:
+        servidor = iniciar_servidor(config_desde_argumentos(args))
+        base_url = servidor.base_url
+    # Las constantes del scraper se leen al importarlo
+    os.environ['BOOKING_BASE_URL'] = base_url
+    import booking_scraper
+
+    booking_scraper.OUT_DIRECTORY = args.directorio or tempfile.mkdtemp(prefix='carga_')
+    if args.provincias:
+        booking_scraper.DEST_IDS_TO_SCRAPE = booking_scraper.DEST_IDS_TO_SCRAPE[:args.provincias]
+    if args.dias:
+        booking_scraper.DAYS_TO_SCRAPE = args.dias
+
+    registro = RegistroSolicitudes()
+    abrir_sesion_http = booking_scraper.abrir_sesion_http
+
+    def abrir_sesion_con_registro():
+        session = abrir_sesion_http()
+        session.hooks['response'].append(registro.hook)
+        return session
+
+    booking_scraper.abrir_sesion_http = abrir_sesion_con_registro
+
+    inicio = time.perf_counter()
+    booking_scraper.scraping()
+    duracion = time.perf_counter() - inicio
+
+    total = sum(registro.estados.values())
+    resultado = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'base_url': base_url,
+        'trabajos': len(booking_scraper.build_jobs(date.today())),
+        'modo': 'asincrono' if booking_scraper.ASYNC_MODE else f"{booking_scraper.SCRAPER_WORKERS} hilos",
+        'request_rate': booking_scraper.REQUEST_RATE,
+        'segundos': duracion,
+        'solicitudes': total,
+        'solicitudes_por_s': total / duracion if duracion else None,
+        'estados': {str(k): v for k, v in sorted(registro.estados.items())},
+        'latencia_s': {f"p{p}": percentil(registro.latencias, p) for p in (50, 95, 99)},
+        'latencia_max_s': max(registro.latencias, default=None),
+        'directorio': booking_scraper.OUT_DIRECTORY,
+    }
+    if servidor is not None:
+        resultado['servidor'] = servidor.estadisticas()
+        servidor.shutdown()
+
+    latencias = ', '.join(f"{k} {v * 1000:.1f} ms" for k, v in resultado['latencia_s'].items() if v is not None)
+    print(f"{resultado['trabajos']} trabajos ({resultado['modo']}) en {duracion:.2f} s: {total} solicitudes, "
+          f"{resultado['solicitudes_por_s']:.1f} solicitudes/s")
+    print(f"Latencia: {latencias or 'sin respuestas'}")
+    print(f"Respuestas por código: {resultado['estados']}")
+    print(f"Salida y log del scraper en {resultado['directorio']}")
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,234 @@
+"""
+Servidor HTTP local que imita a Booking.com para pruebas de carga sin tocar el sitio real.
+
+Sirve páginas de resultados de búsqueda (/searchresults.es.html, con paginación por offset) y páginas de
+hotel (/hotel/es/<id>.es.html) generadas con la misma estructura que esperan los selectores del scraper.
+Permite simular latencia, errores 5xx, respuestas 429 con Retry-After y páginas de distinto tamaño.
+Las páginas de hotel llevan ETag y responden 304 a las solicitudes condicionales:
+
+    python bench/servidor_booking.py --puerto 8080 --latencia 80 --tasa-429 0.02
+    BOOKING_BASE_URL=http://127.0.0.1:8080 python booking_scraper.py
+
+Las estadísticas de solicitudes servidas se consultan en /__estadisticas.
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+LOCALIDADES = ['Roquetas de Mar', 'Mojácar', 'Níjar', 'Vera', 'El Ejido', 'Aguadulce', 'Carboneras', 'Almuñécar']
+NOMBRES = ['Hotel Playa', 'Hostal Sol', 'Hotel Mediterráneo', 'Apartahotel Cabo', 'Hotel Alcazaba', 'Hotel Indalo']
+SERVICIOS = ['Piscina al aire libre', 'WiFi gratis', 'Parking gratis', 'Habitaciones sin humo', 'Restaurante', 'Bar']
+
+
+class ConfigServidor:
+    """Parámetros del servidor: tamaño de las respuestas y fallos simulados."""
+
+    def __init__(self, hoteles=120, por_pagina=25, relleno=0, latencia=0.0, variacion=0.0,
+                 tasa_errores=0.0, tasa_429=0.0, retry_after=1, semilla=None):
+        self.hoteles = hoteles # Resultados por provincia y fecha
+        self.por_pagina = por_pagina # Tarjetas por página de resultados
+        self.relleno = relleno # Bytes de contenido irrelevante añadidos a cada página
+        self.latencia = latencia # Segundos de espera antes de responder
+        self.variacion = variacion # Segundos adicionales aleatorios (uniforme entre 0 y este valor)
+        self.tasa_errores = tasa_errores # Fracción de respuestas 503
+        self.tasa_429 = tasa_429 # Fracción de respuestas 429
+        self.retry_after = retry_after # Valor de la cabecera Retry-After en las respuestas 429
+        self.random = random.Random(semilla)
+
+
+def _tarjeta(base_url, dest_id, indice, checkin, checkout):
+    """Tarjeta de un hotel en la página de resultados; los id son estables entre fechas para que funcione la caché."""
+    nombre = f"{NOMBRES[indice % len(NOMBRES)]} {indice}"
+    localidad = LOCALIDADES[indice % len(LOCALIDADES)]
+    hotel_id = f"h{dest_id}-{indice}"
+    puntuacion = 6 + (indice * 7 % 39) / 10
+    precio = f"{45 + indice * 37 % 1900:,}".replace(',', '.')
+    return (
+        f'<div data-testid="property-card" class="c066246e13"><div class="c624d7469d"><h3>'
+        f'<a data-testid="title-link" href="{base_url}/hotel/es/{hotel_id}.es.html?aid=304142&checkin={checkin}'
+        f'&checkout={checkout}&dest_id={dest_id}&hpos={indice + 1}&ss={localidad.replace(" ", "+")}">'
+        f'<div data-testid="title" class="fcab3ed991">{nombre}</div></a></h3>'
+        f'<span data-testid="address" class="aee5343fdb">{localidad}, Andalucía</span>'
+        f'<div data-testid="review-score"><div>{puntuacion:.1f}</div><div>{str(round(puntuacion, 1)).replace(".", ",")}</div>'
+        f'<div>{indice * 13 % 4000 + 3} comentarios</div></div>'
+        f'<span data-testid="price-and-discounted-price" class="f6431b446c">€ {precio}</span>'
+        f'</div></div>'
+    )
+
+
+def pagina_busqueda(config, base_url, query):
+    dest_id = query.get('dest_id', ['0'])[0]
+    checkin = query.get('checkin', [''])[0]
+    checkout = query.get('checkout', [''])[0]
+    offset = int(query.get('offset', ['0'])[0])
+    tarjetas = ''.join(_tarjeta(base_url, dest_id, i, checkin, checkout)
+                       for i in range(offset, min(offset + config.por_pagina, config.hoteles)))
+    return (f'<!DOCTYPE html><html lang="es"><head><meta charset="utf-8"><title>Resultados</title></head><body>'
+            f'<div id="filtros">{_relleno(config.relleno)}</div>'
+            f'<h1 aria-live="assertive">Provincia {dest_id}: {config.hoteles:,} alojamientos encontrados</h1>'.replace(',', '.')
+            + tarjetas + '</body></html>')
+
+
+def pagina_hotel(config, hotel_id):
+    dest_id, _, indice = hotel_id[1:].partition('-')
+    indice = int(indice) if indice.isdigit() else 0
+    lat = 36 + indice % 100 / 100
+    lon = -2 - indice % 50 / 100
+    servicios = ''.join(f'<li class="b0bf4dc58f"><div class="aa8988bf9c"><span class="f006e3fcbd">{s}</span></div></li>'
+                        for s in SERVICIOS[:3 + indice % 4])
+    return (
+        f'<!DOCTYPE html><html lang="es"><head><meta charset="utf-8"><title>{hotel_id}</title></head><body>'
+        f'<div id="hp_hotel_name"><span class="hp__hotel_ratings pp-header__badges pp-header__badges--combined">'
+        f'<div data-capla-component-boundary="b-property-web-property-page/Badges"><span>Hotel preferente</span></div></span>'
+        f'<div class="d7b319a0ec"><div class="b08850ce41">Grupo {dest_id}</div></div>'
+        f'<div class="b99b6ef58f cb4b7a25d9">Calle {indice} 1, 04000 {LOCALIDADES[indice % len(LOCALIDADES)]}, España</div>'
+        f'<a id="map_trigger_header_pin" data-atlas-latlng="{lat:.4f},{lon:.4f}" href="#map">Ver mapa</a></div>'
+        f'<p data-testid="property-description">Alojamiento {hotel_id} con piscina y terraza.</p>'
+        f'<div class="hp--popular_facilities"><ul class="e9f7361569">{servicios}</ul></div>'
+        f'<div id="opiniones">{_relleno(config.relleno)}</div></body></html>'
+    )
+
+
+def _relleno(n):
+    """Bloques de marcado sin interés para el scraper hasta sumar unos n bytes."""
+    bloque = '<div class="f0a9c1"><span>Filtro</span><ul><li><label><input type="checkbox"> Opción</label></li></ul></div>'
+    return bloque * (n // len(bloque))
+
+
+class ManejadorBooking(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        servidor = self.server
+        config = servidor.config
+        url = urlparse(self.path)
+        if url.path == '/__estadisticas':
+            return self._responder(200, json.dumps(servidor.estadisticas()).encode(), 'application/json')
+
+        espera = config.latencia + config.random.uniform(0, config.variacion)
+        if espera:
+            time.sleep(espera)
+        sorteo = config.random.random()
+        if sorteo < config.tasa_429:
+            return self._responder(429, b'Too Many Requests', cabeceras={'Retry-After': str(config.retry_after)})
+        if sorteo < config.tasa_429 + config.tasa_errores:
+            return self._responder(503, b'Service Unavailable')
+
+        host = self.headers.get('Host') or f"127.0.0.1:{servidor.server_address[1]}"
+        base_url = f"http://{host}"
+        if url.path.startswith('/searchresults'):
+            cuerpo = pagina_busqueda(config, base_url, parse_qs(url.query))
+        elif url.path.startswith('/hotel/'):
+            cuerpo = pagina_hotel(config, url.path.rsplit('/', 1)[-1].split('.')[0]).encode('utf-8')
+            # Las páginas de hotel no cambian entre fechas: se validan con ETag como las de Booking
+            etag = '"' + hashlib.sha1(cuerpo).hexdigest()[:16] + '"'
+            if self.headers.get('If-None-Match') == etag:
+                return self._responder(304, b'', cabeceras={'ETag': etag})
+            return self._responder(200, cuerpo, cabeceras={'ETag': etag})
+        else:
+            return self._responder(404, b'Not Found')
+        self._responder(200, cuerpo.encode('utf-8'))
+
+    def _responder(self, estado, cuerpo, tipo='text/html; charset=utf-8', cabeceras=None):
+        if estado == 200 and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            cuerpo = gzip.compress(cuerpo, compresslevel=5)
+            cabeceras = {**(cabeceras or {}), 'Content-Encoding': 'gzip'}
+        self.server.contar(estado, len(cuerpo))
+        self.send_response(estado)
+        self.send_header('Content-Type', tipo)
+        self.send_header('Content-Length', str(len(cuerpo)))
+        for nombre, valor in (cabeceras or {}).items():
+            self.send_header(nombre, valor)
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+
+class ServidorBooking(ThreadingHTTPServer):
+    """Servidor con hilos por conexión y contadores de respuestas por código de estado."""
+
+    daemon_threads = True
+
+    def __init__(self, direccion, config):
+        super().__init__(direccion, ManejadorBooking)
+        self.config = config
+        self._lock = threading.Lock()
+        self._estados = Counter()
+        self._bytes = 0
+
+    def handle_error(self, request, client_address):
+        # El cliente cierra la conexión al agotar su tiempo de espera; no es un error del servidor
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+    def contar(self, estado, n_bytes):
+        with self._lock:
+            self._estados[estado] += 1
+            self._bytes += n_bytes
+
+    def estadisticas(self):
+        with self._lock:
+            return {'respuestas': {str(k): v for k, v in sorted(self._estados.items())}, 'bytes': self._bytes}
+
+    @property
+    def base_url(self):
+        host, puerto = self.server_address[:2]
+        return f"http://{host}:{puerto}"
+
+
+def iniciar_servidor(config, host='127.0.0.1', puerto=0):
+    """Arranca el servidor en un hilo en segundo plano y lo devuelve (puerto 0 elige uno libre)."""
+    servidor = ServidorBooking((host, puerto), config)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+def argumentos_servidor(parser):
+    """Añade al parser las opciones del servidor, compartidas con bench/carga.py."""
+    parser.add_argument('--hoteles', type=int, default=120, help="Resultados por provincia y fecha (por defecto 120).")
+    parser.add_argument('--por-pagina', type=int, default=25, help="Tarjetas por página de resultados (por defecto 25).")
+    parser.add_argument('--relleno', type=int, default=0, help="Bytes de marcado irrelevante añadidos a cada página.")
+    parser.add_argument('--latencia', type=float, default=0, help="Milisegundos de espera antes de cada respuesta.")
+    parser.add_argument('--variacion', type=float, default=0, help="Milisegundos adicionales aleatorios (uniforme).")
+    parser.add_argument('--tasa-errores', type=float, default=0, help="Fracción de respuestas 503.")
+    parser.add_argument('--tasa-429', type=float, default=0, help="Fracción de respuestas 429.")
+    parser.add_argument('--retry-after', type=int, default=1, help="Segundos indicados en Retry-After de las respuestas 429.")
+    parser.add_argument('--semilla', type=int, default=None, help="Semilla de los fallos y la latencia simulados.")
+
+
+def config_desde_argumentos(args):
+    return ConfigServidor(hoteles=args.hoteles, por_pagina=args.por_pagina, relleno=args.relleno,
+                          latencia=args.latencia / 1000, variacion=args.variacion / 1000,
+                          tasa_errores=args.tasa_errores, tasa_429=args.tasa_429,
+                          retry_after=args.retry_after, semilla=args.semilla)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local que imita las páginas de Booking.com")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--puerto', type=int, default=8080)
+    argumentos_servidor(parser)
+    args = parser.parse_args()
+    servidor = ServidorBooking((args.host, args.puerto), config_desde_argumentos(args))
+    print(f"Sirviendo en {servidor.base_url} (BOOKING_BASE_URL={servidor.base_url})")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+
+if __name__ == "__main__":
+    main()
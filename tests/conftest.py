@@ -0,0 +1,5 @@
+import os
+import sys
+
+# booking_scraper es un script en la raíz del repositorio, no un paquete instalado
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,106 @@
+"""Caché de detalles de hotel compartida entre réplicas (SHARDING) y descargas de detalles compartidas entre trabajos."""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+
+import booking_scraper
+from booking_scraper import DetailCache, rutas_replicas
+
+
+def abrir(tmp_path, replica):
+    path = str(tmp_path / f"cache_detalles.{replica}.ndjson")
+    return DetailCache(path, 3600, 100, lambda: rutas_replicas(str(tmp_path), 'cache_detalles.ndjson'))
+
+
+def test_lee_los_detalles_de_otra_replica_y_los_copia(tmp_path, monkeypatch):
+    monkeypatch.setattr(booking_scraper, 'DETAIL_CACHE_RESCAN', 0)
+    r1, r2 = abrir(tmp_path, 'r1'), abrir(tmp_path, 'r2')
+    assert r2.get('h1') is None
+    r1.put('h1', {'marca': 'A'})
+    assert r2.get('h1') == {'marca': 'A'}
+    assert r2.hits_replicas == 1
+    # Copiado a la caché propia: sobrevive aunque r1 desaparezca
+    (tmp_path / 'cache_detalles.r1.ndjson').unlink()
+    assert abrir(tmp_path, 'r2').get('h1') == {'marca': 'A'}
+
+
+def test_sigue_las_entradas_nuevas_y_la_compactacion(tmp_path, monkeypatch):
+    monkeypatch.setattr(booking_scraper, 'DETAIL_CACHE_RESCAN', 0)
+    r1, r2 = abrir(tmp_path, 'r1'), abrir(tmp_path, 'r2')
+    r1.put('h1', {'marca': 'A'})
+    r1.put('h2', {'marca': 'B'})
+    assert r2.get('h1') == {'marca': 'A'}
+    # r1 se reinicia y compacta su fichero: cambian los desplazamientos
+    r1 = abrir(tmp_path, 'r1')
+    r1.put('h3', {'marca': 'C'})
+    assert r2.get('h2') == {'marca': 'B'}
+    assert r2.get('h3') == {'marca': 'C'}
+    assert r2.get('h4') is None
+    assert r2.misses == 1
+
+
+def test_sin_otras_no_busca_fuera(tmp_path):
+    r1 = DetailCache(str(tmp_path / 'cache_detalles.r1.ndjson'), 3600, 100)
+    abrir(tmp_path, 'r2').put('h1', {'marca': 'A'})
+    assert r1.get('h1') is None
+
+
+def esperar_compartido(cache, descargas):
+    """scrape_hotel_details de prueba: no termina hasta que otra consulta espera a esta descarga."""
+    def scrape(url, hotel_id=None):
+        descargas.append(hotel_id)
+        limite = time.monotonic() + 5
+        while cache.compartidos == 0 and time.monotonic() < limite:
+            time.sleep(0.001)
+        return {'marca': 'A'}
+    return scrape
+
+
+def test_consulta_que_espera_una_descarga_en_curso_cuenta_como_acierto(tmp_path, monkeypatch):
+    cache = DetailCache(str(tmp_path / 'cache_detalles.ndjson'), 3600, 100)
+    descargas = []
+    monkeypatch.setattr(booking_scraper, '_detail_cache', cache)
+    monkeypatch.setattr(booking_scraper, 'scrape_hotel_details', esperar_compartido(cache, descargas))
+    resultados = []
+    hilos = [threading.Thread(target=lambda: resultados.append(booking_scraper.get_hotel_details('h1', 'url')))
+             for _ in range(2)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert descargas == ['h1']
+    assert resultados == [{'marca': 'A'}, {'marca': 'A'}]
+    assert (cache.misses, cache.compartidos, cache.aciertos) == (1, 1, 1)
+
+
+def test_modo_asincrono_cuenta_la_descarga_compartida(tmp_path, monkeypatch):
+    cache = DetailCache(str(tmp_path / 'cache_detalles.ndjson'), 3600, 100)
+    descargas = []
+    monkeypatch.setattr(booking_scraper, '_detail_cache', cache)
+    motor = booking_scraper.AsyncFetchEngine(4, 4)
+
+    async def scrape(url, hotel_id=None):
+        descargas.append(hotel_id)
+        for _ in range(1000):
+            if cache.compartidos:
+                break
+            await asyncio.sleep(0)
+        return {'marca': 'A'}
+    monkeypatch.setattr(motor, 'scrape_hotel_details', scrape)
+
+    async def consultar():
+        return await asyncio.gather(motor.get_hotel_details('h1', 'url'), motor.get_hotel_details('h1', 'url'))
+    assert asyncio.run(consultar()) == [{'marca': 'A'}, {'marca': 'A'}]
+    assert descargas == ['h1']
+    assert (cache.misses, cache.compartidos, cache.aciertos) == (1, 1, 1)
+
+
+def test_modo_pipeline_cuenta_la_descarga_compartida(tmp_path, monkeypatch):
+    cache = DetailCache(str(tmp_path / 'cache_detalles.ndjson'), 3600, 100)
+    en_curso = Future()
+    monkeypatch.setattr(booking_scraper, '_detail_cache', cache)
+    monkeypatch.setattr(booking_scraper, '_detalles_en_curso', {'h1': en_curso})
+    assert booking_scraper.pedir_detalles('h1', 'url') is en_curso
+    assert (cache.misses, cache.compartidos) == (0, 1)
@@ -0,0 +1,72 @@
+"""Diario de la ejecución (RunJournal): qué trabajos se omiten al reanudar y cuáles se repiten."""
+
+from datetime import date
+
+from booking_scraper import RunJournal, sha256_fichero
+
+DIA = date(2025, 1, 1)
+
+
+def salida(path, contenido, offset=0):
+    """Escribe contenido en path a partir de offset y retorna la salida tal como la anota el diario."""
+    with open(path, 'ab') as f:
+        f.write(contenido)
+    entrada = {'path': str(path), 'sha256': sha256_fichero(str(path), offset, len(contenido) if offset else None)}
+    if offset:
+        entrada.update(offset=offset, longitud=len(contenido))
+    return entrada
+
+
+def reabrir(diario):
+    """Abre el diario de nuevo desde disco, como al reiniciar tras una caída."""
+    return RunJournal(diario.path)
+
+
+def test_omite_los_trabajos_con_salidas_intactas(tmp_path):
+    diario = RunJournal(str(tmp_path / 'diario.ndjson'))
+    diario.registrar('1', DIA, [salida(tmp_path / 'a.ndjson', b'{"id": 1}\n')])
+    diario.registrar('2', DIA, [salida(tmp_path / 'b.ndjson', b'{"id": 2}\n')], '7n2p')
+    assert reabrir(diario).completados() == {('1', '2025-01-01', ''), ('2', '2025-01-01', '7n2p')}
+
+
+def test_repite_el_trabajo_si_cambia_el_sha256(tmp_path):
+    diario = RunJournal(str(tmp_path / 'diario.ndjson'))
+    diario.registrar('1', DIA, [salida(tmp_path / 'a.ndjson', b'{"id": 1}\n')])
+    (tmp_path / 'a.ndjson').write_bytes(b'{"id": 9}\n')
+    assert reabrir(diario).completados() == set()
+
+
+def test_repite_el_trabajo_si_falta_una_salida(tmp_path):
+    diario = RunJournal(str(tmp_path / 'diario.ndjson'))
+    diario.registrar('1', DIA, [salida(tmp_path / 'a.ndjson', b'{"id": 1}\n'),
+                              salida(tmp_path / 'p.ndjson', b'{"precio": 1}\n')])
+    (tmp_path / 'p.ndjson').unlink()
+    assert reabrir(diario).completados() == set()
+
+
+def test_comprueba_solo_el_tramo_de_un_segmento(tmp_path):
+    segmento = tmp_path / 'segmento.ndjson'
+    diario = RunJournal(str(tmp_path / 'diario.ndjson'))
+    diario.registrar('1', DIA, [salida(segmento, b'{"id": 1}\n')])
+    diario.registrar('2', DIA, [salida(segmento, b'{"id": 2}\n', offset=segmento.stat().st_size)])
+    # Lo que se añade al segmento después no afecta al tramo del trabajo 2, pero sí al sha256 del fichero completo
+    with open(segmento, 'ab') as f:
+        f.write(b'{"id": 3}\n')
+    assert reabrir(diario).completados() == {('2', '2025-01-01', '')}
+
+
+def test_ignora_la_ultima_linea_truncada(tmp_path):
+    diario = RunJournal(str(tmp_path / 'diario.ndjson'))
+    diario.registrar('1', DIA, [salida(tmp_path / 'a.ndjson', b'{"id": 1}\n')])
+    with open(diario.path, 'a', encoding='utf-8') as f:
+        f.write('{"dest_id": "2", "checkin": "2025-01')
+    assert reabrir(diario).completados() == {('1', '2025-01-01', '')}
+
+
+def test_la_ultima_entrada_de_un_trabajo_es_la_que_cuenta(tmp_path):
+    diario = RunJournal(str(tmp_path / 'diario.ndjson'))
+    diario.registrar('1', DIA, [salida(tmp_path / 'a.ndjson', b'{"id": 1}\n')])
+    (tmp_path / 'a.ndjson').unlink()
+    # El trabajo se repitió y escribió otra salida
+    diario.registrar('1', DIA, [salida(tmp_path / 'b.ndjson', b'{"id": 1}\n')])
+    assert reabrir(diario).completados() == {('1', '2025-01-01', '')}
@@ -0,0 +1,139 @@
+"""Reclamo, expiración y recuperación de leases del modo distribuido (SHARDING)."""
+
+import json
+import os
+import time
+from datetime import date, timedelta
+
+import pytest
+
+import booking_scraper
+from booking_scraper import FileLeaseStore, MemoryLeaseStore, clave_trabajo
+
+CHECKIN = date(2025, 1, 1)
+JOB = ('1363', CHECKIN, CHECKIN + timedelta(days=1), booking_scraper.DEFAULT_GUESTS)
+OTRO = ('755', CHECKIN, CHECKIN + timedelta(days=1), booking_scraper.DEFAULT_GUESTS)
+
+
+@pytest.fixture(params=['fichero', 'memoria'])
+def replica(request, tmp_path):
+    """Crea réplicas que comparten el mismo almacén de leases."""
+    directorio = str(tmp_path / 'leases')
+    clase = FileLeaseStore if request.param == 'fichero' else MemoryLeaseStore
+    yield lambda nombre: clase(directorio, nombre, 60)
+    MemoryLeaseStore._tablas.pop(directorio, None)
+
+
+@pytest.fixture
+def almacenes(replica):
+    return replica('r1'), replica('r2')
+
+
+def expirar(store, clave):
+    entrada = store.leer(clave)
+    store._escribir(clave, {**entrada, 'expira': time.time() - 1})
+
+
+def test_clave_trabajo_variante():
+    assert clave_trabajo(*JOB) == '1363_20250101'
+    assert clave_trabajo('1363', CHECKIN, CHECKIN + timedelta(days=7), 4) == '1363_20250101_7n4p'
+
+
+def test_cada_trabajo_lo_reclama_una_sola_replica(almacenes):
+    r1, r2 = almacenes
+    assert r1.siguiente([JOB, OTRO]) == (JOB, 1)
+    # JOB está en curso en r1 y sigue vivo: r2 pasa al siguiente
+    assert r2.siguiente([JOB, OTRO]) == (OTRO, 2)
+    assert r2.siguiente([JOB, OTRO]) == (None, 2)
+
+
+def test_lease_expirado_lo_recupera_otra_replica(almacenes):
+    r1, r2 = almacenes
+    r1.siguiente([JOB])
+    clave = clave_trabajo(*JOB)
+    expirar(r1, clave)
+    assert r2.siguiente([JOB]) == (JOB, 1)
+    assert r2.recuperados == 1
+    assert r2.leer(clave)['replica'] == 'r2'
+    assert r2.leer(clave)['intentos'] == 2
+    # r1 deja de renovarlo al ver que es de otra réplica
+    r1.renovar()
+    assert r1.perdidos == 1
+    assert r2.leer(clave)['replica'] == 'r2'
+
+
+def test_trabajo_hecho_no_se_repite_mientras_existan_sus_salidas(almacenes, replica, tmp_path):
+    r1, r2 = almacenes
+    salida = tmp_path / 'almería_20250101.ndjson'
+    salida.write_text('{}\n', encoding='utf-8')
+    r1.siguiente([JOB])
+    r1.terminar(clave_trabajo(*JOB), [{'path': str(salida), 'registros': 1, 'sha256': 'x'}])
+    assert r2.siguiente([JOB]) == (None, 0)
+
+    # Si sus salidas desaparecen, otra réplica lo repite
+    salida.unlink()
+    assert replica('r3').siguiente([JOB]) == (JOB, 1)
+
+
+def test_trabajo_fallido_se_reintenta_hasta_lease_max_attempts(almacenes, monkeypatch):
+    monkeypatch.setattr(booking_scraper, 'LEASE_MAX_ATTEMPTS', 2)
+    r1, r2 = almacenes
+    clave = clave_trabajo(*JOB)
+    r1.siguiente([JOB])
+    r1.terminar(clave, None)
+    assert r2.siguiente([JOB]) == (JOB, 1)
+    r2.terminar(clave, None)
+    assert r1.siguiente([JOB]) == (None, 0)
+
+
+def test_liberar_permite_reclamar_sin_esperar(almacenes):
+    r1, r2 = almacenes
+    r1.siguiente([JOB])
+    r1.liberar()
+    assert r2.siguiente([JOB]) == (JOB, 1)
+    assert r2.recuperados == 0
+
+
+@pytest.mark.parametrize('contenido', ['', '{"replica": "r1", "estado": "en_c'])
+def test_lease_vacio_o_truncado_se_recupera_al_expirar(tmp_path, contenido):
+    store = FileLeaseStore(str(tmp_path), 'r2', 1)
+    path = tmp_path / f"{clave_trabajo(*JOB)}.lease"
+    path.write_text(contenido, encoding='utf-8')
+    # Mientras no expira se trata como en curso por otra réplica
+    assert store.siguiente([JOB]) == (None, 1)
+
+    antiguo = time.time() - 10
+    os.utime(path, (antiguo, antiguo))
+    assert store.siguiente([JOB]) == (JOB, 1)
+    entrada = json.loads(path.read_text(encoding='utf-8'))
+    assert entrada['replica'] == 'r2' and entrada['estado'] == 'en_curso'
+    assert not [p for p in os.listdir(tmp_path) if p != path.name]
+
+
+def test_solicitudes_de_las_demas_replicas(almacenes):
+    r1, r2 = almacenes
+    r1.publicar_solicitudes(5)
+    r2.publicar_solicitudes(3)
+    r1.publicar_solicitudes(8)
+    assert r1.solicitudes_otras() == 3
+    assert r2.solicitudes_otras() == 8
+    # Los contadores no cuentan como trabajos pendientes
+    assert r1.siguiente([JOB], reclamar=False) == (None, 1)
+
+
+def test_sin_empezar_no_cuenta_los_trabajos_en_curso(almacenes):
+    r1, r2 = almacenes
+    tercero = ('766', CHECKIN, CHECKIN + timedelta(days=1), booking_scraper.DEFAULT_GUESTS)
+    jobs = [JOB, OTRO, tercero]
+    r1.siguiente(jobs)
+    assert r2.sin_empezar(jobs) == 2
+    expirar(r1, clave_trabajo(*JOB))
+    assert r2.sin_empezar(jobs) == 3
+
+
+def test_soltar_devuelve_el_trabajo_sin_gastar_intentos(almacenes):
+    r1, r2 = almacenes
+    r1.siguiente([JOB])
+    r1.soltar(clave_trabajo(*JOB))
+    assert r2.siguiente([JOB]) == (JOB, 1)
+    assert r2.leer(clave_trabajo(*JOB))['intentos'] == 1
@@ -0,0 +1,35 @@
+"""Ritmo adaptativo (AdaptivePacer): los huecos de solicitudes en vuelo se devuelven aunque la descarga falle."""
+
+import pytest
+
+import booking_scraper
+from booking_scraper import AdaptivePacer, TokenBucket
+
+
+@pytest.fixture
+def pacer(monkeypatch):
+    pacer = AdaptivePacer(TokenBucket(0, 1), 0.5, 16, 1, 4, 2.0)
+    monkeypatch.setattr(booking_scraper, '_pacer', pacer)
+    monkeypatch.setattr(booking_scraper, '_http_session', None)
+    return pacer
+
+
+class ProfilerRoto:
+    def empezar_traza(self, url, tipo):
+        raise RuntimeError("traza")
+
+
+def test_devuelve_el_hueco_si_falla_la_traza(pacer, monkeypatch):
+    monkeypatch.setattr(booking_scraper, '_profiler', ProfilerRoto())
+    with pytest.raises(RuntimeError):
+        booking_scraper._fetch_once('http://127.0.0.1:9/hotel/es/mar.html')
+    assert pacer._en_curso == 0
+
+
+def test_devuelve_el_hueco_si_falla_el_limitador(pacer, monkeypatch):
+    def acquire():
+        raise KeyboardInterrupt
+    monkeypatch.setattr(pacer.limiter, 'acquire', acquire)
+    with pytest.raises(KeyboardInterrupt):
+        pacer.acquire()
+    assert pacer._en_curso == 0
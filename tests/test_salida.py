@@ -0,0 +1,113 @@
+"""Ficheros de salida: formatos, segmentos y unión del modo normalizado."""
+
+import json
+from datetime import date
+
+import pytest
+
+import booking_scraper
+from booking_scraper import (HotelDimension, SegmentWriter, comprobar_formato_salida, leer_tramo, split_hotel_record,
+                             unir_salida)
+
+DIA = date(2025, 1, 1)
+HOTEL = {'url': 'https://www.booking.com/hotel/es/mar.html?checkin=2025-01-01', 'id': 'h1', 'nombre': 'Mar',
+         'marca': None, 'provincia': 'Almería', 'localidad': 'Roquetas', 'servicios': ['wifi'],
+         'puntuacion': '8,5', 'fechaEntrada': '2025-01-01', 'fechaSalida': '2025-01-02', 'huespedes': 2,
+         'precio': '95 €'}
+
+
+def test_formato_desconocido_termina_con_error(monkeypatch):
+    monkeypatch.setattr(booking_scraper, 'OUTPUT_FORMAT', 'csv')
+    with pytest.raises(SystemExit) as salida:
+        comprobar_formato_salida()
+    assert salida.value.code == 1
+
+
+def test_formato_sin_dependencia_termina_con_error(monkeypatch):
+    monkeypatch.setattr(booking_scraper, 'OUTPUT_FORMAT', 'parquet')
+    monkeypatch.setattr(booking_scraper, 'pyarrow', None)
+    with pytest.raises(SystemExit):
+        comprobar_formato_salida()
+    # ndjson no necesita nada y sigue adelante
+    monkeypatch.setattr(booking_scraper, 'OUTPUT_FORMAT', 'ndjson')
+    comprobar_formato_salida()
+
+
+def escribir_tramo(segmentos, provincia, registros, sufijo=''):
+    tramo = segmentos.tramo(provincia, DIA, sufijo)
+    for record in registros:
+        tramo.write(record)
+    tramo.commit()
+    return tramo
+
+
+@pytest.mark.parametrize('formato', ['ndjson', 'ndjson.gz', 'ndjson.zst'])
+def test_leer_tramo_devuelve_los_registros_del_trabajo(tmp_path, formato):
+    if not booking_scraper.output_format_available(formato):
+        pytest.skip(f"{formato} no disponible")
+    extension, compresion = booking_scraper.OUTPUT_FORMATS[formato]
+    segmentos = SegmentWriter(str(tmp_path), 'hoteles_20250101_000000', extension, compresion, 1 << 20)
+    escribir_tramo(segmentos, 'Almería', [{'id': 'h1'}, {'id': 'h2'}])
+    escribir_tramo(segmentos, 'Almería', [{'id': 'h3'}], '7n2p')
+    escribir_tramo(segmentos, 'Sevilla', [{'id': 'h4', 'nombre': 'Triana'}])
+    segmentos.close()
+    assert list(leer_tramo(str(tmp_path), 'almería', '2025-01-01')) == [{'id': 'h1'}, {'id': 'h2'}]
+    assert list(leer_tramo(str(tmp_path), 'almería', '2025-01-01', sufijo='7n2p')) == [{'id': 'h3'}]
+    assert list(leer_tramo(str(tmp_path), 'sevilla', '2025-01-01')) == [{'id': 'h4', 'nombre': 'Triana'}]
+    assert list(leer_tramo(str(tmp_path), 'sevilla', '2025-01-02')) == []
+    assert list(leer_tramo(str(tmp_path), 'almería', '2025-01-01', 'precios')) == []
+
+
+def test_leer_tramo_usa_el_mas_reciente_y_cruza_segmentos(tmp_path):
+    # max_bytes=1: cada tramo abre un segmento nuevo
+    anterior = SegmentWriter(str(tmp_path), 'hoteles_20250101_000000', '.ndjson', None, 1)
+    escribir_tramo(anterior, 'Almería', [{'id': 'viejo'}])
+    escribir_tramo(anterior, 'Sevilla', [{'id': 'h4'}])
+    anterior.close()
+    assert len(anterior.segmentos) == 2
+    actual = SegmentWriter(str(tmp_path), 'hoteles_20250101_120000', '.ndjson', None, 1)
+    tramo = escribir_tramo(actual, 'Almería', [{'id': 'nuevo'}])
+    actual.close()
+    assert tramo.path == f"{tramo.segmento}@0"
+    assert list(leer_tramo(str(tmp_path), 'almería', '2025-01-01')) == [{'id': 'nuevo'}]
+    assert list(leer_tramo(str(tmp_path), 'sevilla', '2025-01-01')) == [{'id': 'h4'}]
+
+
+def test_un_tramo_abortado_no_aparece_en_el_indice(tmp_path):
+    segmentos = SegmentWriter(str(tmp_path), 'hoteles_20250101_000000', '.ndjson', None, 1 << 20)
+    tramo = segmentos.tramo('Almería', DIA)
+    tramo.write({'id': 'h1'})
+    tramo.abort()
+    segmentos.close()
+    assert list(leer_tramo(str(tmp_path), 'almería', '2025-01-01')) == []
+
+
+def escribir_precios(path, filas):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(''.join(json.dumps(fila, ensure_ascii=False) + "\n" for fila in filas), encoding='utf-8')
+
+
+def test_unir_salida_reconstruye_el_registro_ancho(tmp_path):
+    atributos, fila, completo = split_hotel_record(HOTEL, 'Almería')
+    HotelDimension(str(tmp_path / 'hoteles.ndjson')).upsert(atributos, completo)
+    precios = tmp_path / 'provincia=almería' / 'fecha=2025-01-01' / 'precios.ndjson'
+    escribir_precios(precios, [fila, {'id': 'desconocido', 'precio': '10 €'}])
+    esperado = {k: v for k, v in HOTEL.items() if v is not None}
+    esperado['url'] = 'https://www.booking.com/hotel/es/mar.html'
+    registros = list(unir_salida(str(precios)))
+    assert registros[0] == esperado
+    assert list(registros[0]) == list(esperado)
+    # Sin atributos en la dimensión queda solo la fila de precio
+    assert registros[1] == {'id': 'desconocido', 'precio': '10 €'}
+
+
+def test_unir_salida_usa_la_version_mas_reciente_entre_replicas(tmp_path):
+    atributos, fila, _ = split_hotel_record(HOTEL, 'Almería')
+    for replica, nombre, actualizado in (('r1', 'Mar', '2025-01-01T10:00:00'), ('r2', 'Mar Azul', '2025-01-01T11:00:00')):
+        entrada = {**atributos, 'nombre': nombre, 'actualizado': actualizado}
+        (tmp_path / f'hoteles.{replica}.ndjson').write_text(json.dumps(entrada, ensure_ascii=False) + "\n", encoding='utf-8')
+    precios = tmp_path / 'almería_20250101_precios.ndjson'
+    escribir_precios(precios, [fila])
+    assert [r['nombre'] for r in unir_salida(str(precios))] == ['Mar Azul']
+    # Con una dimensión explícita se usa solo esa
+    assert [r['nombre'] for r in unir_salida(str(precios), str(tmp_path / 'hoteles.r1.ndjson'))] == ['Mar']
@@ -1,5 +1,6 @@
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+import soupsieve
 import json
 import re
 import time
@@ -8,37 +9,267 @@ from urllib.parse import urlparse, parse_qs
 from datetime import date, timedelta, datetime 
 import logging
 import os
+import threading
+import asyncio
+import socket
+import tracemalloc
+import gzip
+import io
+import hashlib
+import zlib
+import shutil
+import tempfile
+import glob
+import argparse
+import multiprocessing
+import contextlib
+import contextvars
+import cProfile
+import pstats
+import bisect
+import email.utils
+from http.cookiejar import LWPCookieJar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from collections import Counter, OrderedDict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future
 import schedule
+import urllib3
+from requests.adapters import HTTPAdapter
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None # Sin cerrojo entre procesos fuera de Unix
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+try:
+    import brotli # noqa: F401  Permite a urllib3 descomprimir respuestas 'br'
+    ACCEPT_ENCODING = 'gzip, deflate, br'
+except ImportError:
+    try:
+        import brotlicffi # noqa: F401
+        ACCEPT_ENCODING = 'gzip, deflate, br'
+    except ImportError:
+        ACCEPT_ENCODING = 'gzip, deflate'
 
 OUT_DIRECTORY = '/data/out' #Cambiar a '/data/out' en producción
 
+# Lista de IDs de destino para las provincias a extraer
+# '1363': 'Almería'
+# '755': 'Granada'
+DEST_IDS_TO_SCRAPE = ['1363', '755', '766', '747', '774', '758', '750', '759']
+#DEST_IDS_TO_SCRAPE = ['1363']  # Descomenta esta línea y comenta la anterior para extraer solo Almería
+DAYS_TO_SCRAPE = 30 # Número de fechas de entrada consecutivas a partir de hoy
+
+# Matriz de estancias: cada búsqueda se repite para cada número de noches y de huéspedes (adultos en una
+# habitación). La variante por defecto (1 noche, 2 huéspedes) conserva los nombres de fichero de siempre.
+DEFAULT_STAY_NIGHTS = 1
+DEFAULT_GUESTS = 2
+STAY_LENGTHS = [int(n) for n in os.environ.get('STAY_LENGTHS', '1').split(',')] # Noches de estancia, p. ej. '1,2,3,7'
+GUEST_COUNTS = [int(n) for n in os.environ.get('GUEST_COUNTS', '2').split(',')] # Huéspedes por búsqueda, p. ej. '1,2,3,4'
+VARIANT_DAYS = int(os.environ.get('VARIANT_DAYS', 0)) # Días por delante en los que se buscan las variantes que no son la de por defecto; 0 en todos
+
+# URL base de Booking.com; se puede apuntar a un servidor local de pruebas (ver bench/servidor_booking.py)
+BOOKING_BASE_URL = os.environ.get('BOOKING_BASE_URL', 'https://www.booking.com').rstrip('/')
+
+# Modo de ejecución asíncrono (ASYNC_MODE=1); por defecto se usa el modo síncrono
+ASYNC_MODE = os.environ.get('ASYNC_MODE', '0') == '1'
+ASYNC_MAX_CONCURRENCY = int(os.environ.get('ASYNC_MAX_CONCURRENCY', 8)) # Solicitudes simultáneas en total
+ASYNC_MAX_PER_HOST = int(os.environ.get('ASYNC_MAX_PER_HOST', 4)) # Solicitudes simultáneas por host
+
+# Ejecución en paralelo de los trabajos (provincia, fecha) y límite global de solicitudes
+SCRAPER_WORKERS = int(os.environ.get('SCRAPER_WORKERS', 4)) # Trabajos simultáneos en modo síncrono; 1 los ejecuta en secuencia
+REQUEST_RATE = float(os.environ.get('REQUEST_RATE', 8)) # Solicitudes por segundo en total; 0 desactiva el límite
+REQUEST_BURST = int(os.environ.get('REQUEST_BURST', 4)) # Solicitudes que pueden salir seguidas tras un periodo inactivo
+
+# Ritmo adaptativo (AIMD) de las solicitudes; solo se aplica si REQUEST_RATE > 0
+ADAPTIVE_PACING = os.environ.get('ADAPTIVE_PACING', '1') == '1'
+REQUEST_RATE_MIN = float(os.environ.get('REQUEST_RATE_MIN', 0.5)) # Tasa mínima a la que se puede reducir el ritmo
+REQUEST_RATE_MAX = float(os.environ.get('REQUEST_RATE_MAX', 16)) # Tasa máxima a la que se puede subir el ritmo
+PACER_CONCURRENCY = int(os.environ.get('PACER_CONCURRENCY', 4)) # Solicitudes en vuelo al empezar la ejecución
+PACER_MAX_CONCURRENCY = int(os.environ.get('PACER_MAX_CONCURRENCY', 12)) # Solicitudes en vuelo como máximo
+PACER_LATENCY_TARGET = float(os.environ.get('PACER_LATENCY_TARGET', 2.0)) # Segundos de latencia media a partir de los que se frena
+PACER_INTERVAL = float(os.environ.get('PACER_INTERVAL', 10)) # Segundos entre ajustes del ritmo
+PACER_INCREASE = 0.5 # Solicitudes/s que se suman en cada intervalo sin problemas
+PACER_DECREASE = 0.5 # Factor por el que se multiplican la tasa y la concurrencia al frenar
+PACER_MAX_PAUSE = 300 # Segundos máximos de pausa por un Retry-After
+
+# Tiempos de espera, reintentos y cortocircuito de las descargas
+FETCH_CONNECT_TIMEOUT = float(os.environ.get('FETCH_CONNECT_TIMEOUT', 10)) # Segundos para establecer la conexión
+FETCH_READ_TIMEOUT = float(os.environ.get('FETCH_READ_TIMEOUT', 30)) # Segundos sin recibir datos de la respuesta
+FETCH_RETRIES = int(os.environ.get('FETCH_RETRIES', 4)) # Reintentos de una solicitud tras un error transitorio
+FETCH_BACKOFF_BASE = float(os.environ.get('FETCH_BACKOFF_BASE', 1.0)) # Segundos de espera antes del primer reintento
+FETCH_BACKOFF_MAX = float(os.environ.get('FETCH_BACKOFF_MAX', 60)) # Segundos máximos de espera entre reintentos
+CIRCUIT_FAILURES = int(os.environ.get('CIRCUIT_FAILURES', 10)) # Errores transitorios seguidos que detienen las descargas; 0 lo desactiva
+CIRCUIT_PAUSE = float(os.environ.get('CIRCUIT_PAUSE', 120)) # Segundos que se detienen las descargas antes de volver a probar
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504) # Códigos de estado que se reintentan
+
+# Métricas en formato Prometheus servidas en http://<host>:METRICS_PORT/metrics (y /health)
+METRICS_PORT = int(os.environ.get('METRICS_PORT', 9108)) # 0 desactiva el servidor de métricas
+METRICS_HOST = os.environ.get('METRICS_HOST', '0.0.0.0')
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60) # Límites de los histogramas en segundos
+HEALTH_STALL_SECONDS = int(os.environ.get('HEALTH_STALL_SECONDS', 900)) # Segundos sin progreso en una ejecución para /health 503
+
+# Manifiesto de cada ejecución (manifiesto_AAAAMMDD_HHMMSS.json en OUT_DIRECTORY) para comparar rendimiento entre ejecuciones
+MANIFEST_PREFIX = 'manifiesto_'
+
+# Perfil de la ejecución (--profile o PROFILE=1): cProfile por etapa y traza de tiempos por solicitud
+PROFILE = os.environ.get('PROFILE', '0') == '1'
+PROFILE_TOP = int(os.environ.get('PROFILE_TOP', 20)) # Funciones, solicitudes y páginas que se listan en los resúmenes
+PROFILE_PREFIX = 'perfil_' # perfil_AAAAMMDD_HHMMSS/ dentro de OUT_DIRECTORY
+
+# Backend de parseo HTML: 'html.parser' (BeautifulSoup puro Python), 'lxml' (BeautifulSoup sobre lxml) o 'selectolax'
+PARSER_BACKEND = os.environ.get('PARSER_BACKEND', 'html.parser')
+PARSER_PARITY = os.environ.get('PARSER_PARITY', '') # Segundo backend con el que comparar los campos extraídos; vacío lo desactiva
+PARSER_PARITY_SAMPLE = float(os.environ.get('PARSER_PARITY_SAMPLE', 1.0)) # Fracción de páginas que se comparan
+PARSE_SUBTREES = os.environ.get('PARSE_SUBTREES', '0') == '1' # Con BeautifulSoup, construye solo los subárboles que se extraen
+
+# Modo en cadena: las páginas de hotel se descargan en hilos y se parsean en un pool de procesos
+PIPELINE = os.environ.get('PIPELINE', '0') == '1'
+PIPELINE_FETCHERS = int(os.environ.get('PIPELINE_FETCHERS', 8)) # Hilos que descargan páginas de hotel, compartidos por los trabajos
+PARSE_PROCESSES = int(os.environ.get('PARSE_PROCESSES', 0)) # Procesos de parseo; 0 usa uno por núcleo
+PIPELINE_QUEUE_SIZE = int(os.environ.get('PIPELINE_QUEUE_SIZE', 32)) # Páginas descargadas esperando a un proceso de parseo como máximo
+PIPELINE_WINDOW = int(os.environ.get('PIPELINE_WINDOW', 16)) # Hoteles de un trabajo en curso por delante del que se escribe
+
+# Paginación de los resultados de búsqueda
+RESULTS_PAGE_SIZE = 25 # Hoteles por página de resultados de Booking.com (parámetro offset)
+MAX_RESULT_PAGES = int(os.environ.get('MAX_RESULT_PAGES', 40)) # Límite de seguridad de páginas por provincia y fecha
+PAGINATION_CONCURRENCY = int(os.environ.get('PAGINATION_CONCURRENCY', 3)) # Páginas de resultados descargadas a la vez por trabajo
+
+# Sesión HTTP compartida durante la ejecución
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 16)) # Conexiones keep-alive por host
+COOKIES_FILENAME = 'cookies.txt' # Cookies de Booking persistidas entre ejecuciones, dentro de OUT_DIRECTORY
+DNS_CACHE_TTL = int(os.environ.get('DNS_CACHE_TTL', 300)) # Segundos; 0 desactiva la caché de resolución DNS
+
+# Caché de detalles de hotel (marca, destacados, coordenadas, servicios, descripción y dirección)
+DETAIL_CACHE_TTL = int(os.environ.get('DETAIL_CACHE_TTL', 7 * 24 * 3600)) # Segundos de validez; 0 desactiva la caché
+DETAIL_CACHE_MAX_ITEMS = int(os.environ.get('DETAIL_CACHE_MAX_ITEMS', 2000)) # Entradas en el nivel LRU en memoria
+DETAIL_CACHE_FILENAME = 'cache_detalles.ndjson' # Nivel en disco, dentro de OUT_DIRECTORY
+DETAIL_CACHE_RESCAN = 1 # Segundos entre búsquedas de cachés de réplicas nuevas con SHARDING
+
+# Formato de salida: 'ancho' (un registro completo por hotel y fecha), 'normalizado' (atributos de hotel
+# deduplicados en HOTELS_FILENAME y filas de precio por fecha) o 'ambos'
+OUTPUT_MODE = os.environ.get('OUTPUT_MODE', 'ancho')
+HOTELS_FILENAME = 'hoteles.ndjson' # Dimensión de hoteles del modo normalizado, dentro de OUT_DIRECTORY
+OUTPUT_BUFFER_SIZE = int(os.environ.get('OUTPUT_BUFFER_SIZE', 1 << 20)) # Bytes de buffer de escritura por fichero de salida
+# Codificación de los ficheros de salida: 'ndjson', 'ndjson.gz', 'ndjson.zst' (requiere zstandard) o 'parquet' (requiere pyarrow)
+OUTPUT_FORMAT = os.environ.get('OUTPUT_FORMAT', 'ndjson')
+OUTPUT_COMPRESSION_LEVEL = int(os.environ.get('OUTPUT_COMPRESSION_LEVEL', 6)) # Nivel de gzip/zstd
+PARQUET_BATCH_ROWS = int(os.environ.get('PARQUET_BATCH_ROWS', 5000)) # Filas por grupo de filas en la salida Parquet
+OUTPUT_PARTITIONED = os.environ.get('OUTPUT_PARTITIONED', '0') == '1' # Directorios provincia=<provincia>/fecha=<AAAA-MM-DD>
+# Con OUTPUT_SEGMENTS=1 todos los registros de una ejecución se añaden a unos pocos segmentos grandes con un índice .idx
+OUTPUT_SEGMENTS = os.environ.get('OUTPUT_SEGMENTS', '0') == '1'
+OUTPUT_SEGMENT_MB = int(os.environ.get('OUTPUT_SEGMENT_MB', 256)) # Tamaño a partir del cual se abre un segmento nuevo
+SEGMENT_SPOOL_BYTES = 8 << 20 # Cada trabajo se acumula en memoria hasta este tamaño y después en un temporal en disco
+
+# Diario de trabajos completados para reanudar una ejecución interrumpida (RESUME=0 repite todos los trabajos)
+RESUME = os.environ.get('RESUME', '1') == '1'
+JOURNAL_PREFIX = 'checkpoint_' # checkpoint_AAAAMMDD.ndjson dentro de OUT_DIRECTORY
+
+# Programación de las ejecuciones diarias
+SCHEDULE_TIME = os.environ.get('SCHEDULE_TIME', '00:30') # Hora local de la ejecución diaria
+SCHEDULE_JITTER = int(os.environ.get('SCHEDULE_JITTER', 0)) # Segundos de retraso aleatorio máximo al inicio de cada ejecución programada
+RUN_ON_START = os.environ.get('RUN_ON_START', '1') == '1' # Ejecuta también al arrancar el contenedor
+RUN_TIME_BUDGET = int(os.environ.get('RUN_TIME_BUDGET', 0)) # Segundos tras los que no se empiezan más trabajos; 0 sin límite
+RUN_REQUEST_BUDGET = int(os.environ.get('RUN_REQUEST_BUDGET', 0)) # Solicitudes HTTP tras las que no se empiezan más trabajos; 0 sin límite
+LOCK_FILENAME = 'scraper.lock' # Cerrojo de ejecución dentro de OUT_DIRECTORY
+
+# Reparto de los trabajos entre varias réplicas del servicio mediante leases
+SHARDING = os.environ.get('SHARDING', '0') == '1'
+LEASE_BACKEND = os.environ.get('LEASE_BACKEND', 'fichero') # 'fichero' (en OUT_DIRECTORY, compartido por NFS) o 'memoria'
+LEASE_TTL = int(os.environ.get('LEASE_TTL', 120)) # Segundos sin renovar tras los que otra réplica puede quedarse un trabajo
+LEASE_HEARTBEAT = int(os.environ.get('LEASE_HEARTBEAT', 30)) # Segundos entre renovaciones de los leases en curso
+LEASE_MAX_ATTEMPTS = int(os.environ.get('LEASE_MAX_ATTEMPTS', 2)) # Intentos de un trabajo fallido entre todas las réplicas
+LEASE_POLL = float(os.environ.get('LEASE_POLL', 10)) # Segundos entre comprobaciones cuando los trabajos que quedan los tienen otras réplicas
+LEASE_RETENTION_DAYS = 7 # Días que se conservan los directorios de leases de ejecuciones anteriores
+LEASES_DIRNAME = 'leases' # leases/AAAAMMDD/ dentro de OUT_DIRECTORY
+LEASE_COUNTER_PREFIX = 'solicitudes.' # Solicitudes de cada réplica, para que RUN_REQUEST_BUDGET sea de toda la ejecución
+REPLICA_ID = re.sub(r'[^\w.-]', '_', os.environ.get('REPLICA_ID') or f"{socket.gethostname()}-{os.getpid()}")
+SHARDING_REPLICAS = max(int(os.environ.get('SHARDING_REPLICAS', 1)), 1) # Réplicas del servicio entre las que se reparten las tasas de solicitudes
+if SHARDING and SHARDING_REPLICAS > 1:
+    # REQUEST_RATE y sus límites son del servicio completo: cada réplica usa su parte
+    REQUEST_RATE /= SHARDING_REPLICAS
+    REQUEST_RATE_MIN /= SHARDING_REPLICAS
+    REQUEST_RATE_MAX /= SHARDING_REPLICAS
+
+# Caché HTTP de las páginas de hotel con revalidación (ETag / Last-Modified)
+HTTP_CACHE = os.environ.get('HTTP_CACHE', '1') == '1' # Con 0 se descarga siempre la página completa
+HTTP_CACHE_DIRNAME = 'cache_http' # Directorio dentro de OUT_DIRECTORY con una entrada por hotel
+
+# Agentes de usuario
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/14.1.1 Safari/605.1.15',
+    'Mozilla/5.0 (Windows NT 10.0; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.107 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.107 Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.107 Safari/537.36',
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.107 Safari/537.36',
+]
+
+def nombre_replica(nombre):
+    """
+    Con SHARDING, añade REPLICA_ID al nombre de un fichero propio de cada réplica (log, cachés, cookies, cerrojo,
+    manifiesto...) para que las réplicas no escriban a la vez el mismo fichero del directorio compartido.
+    """
+    if not SHARDING:
+        return nombre
+    base, extension = os.path.splitext(nombre)
+    return f"{base}.{REPLICA_ID}{extension}"
+
+def rutas_replicas(directorio, nombre):
+    """Ficheros de un directorio con el nombre dado, sin sufijo y con el de cada réplica (ver nombre_replica)."""
+    base, extension = os.path.splitext(nombre)
+    return sorted(glob.glob(os.path.join(directorio, f"{base}.*{extension}")) +
+                  glob.glob(os.path.join(directorio, nombre)))
+
 def configurar_logging():
     # Ruta a fichero logging
-    log_filename = f"scraper_{datetime.now().strftime('%Y%m%d')}.log"
+    log_filename = nombre_replica(f"scraper_{datetime.now().strftime('%Y%m%d')}.log")
     full_log_path = os.path.join(OUT_DIRECTORY, log_filename)
 
-    #Crea el directorio de salida en caso de que no exista
+    # Crea el directorio de salida si no existe
     if not os.path.exists(OUT_DIRECTORY):
         os.makedirs(OUT_DIRECTORY)
 
     write_permission = False
     try:
-        # Intenta abrir el fichero en modo append para comprobar los permisos de escritura
-        # y se asegura de que el manejador del fichero se cierre inmediatamente después de la comprobación.
-        with open(full_log_path, 'a') as f:
+        with open(full_log_path, 'a'):
             pass
         write_permission = True
     except IOError as e:
         write_permission = False
         print(f"Warning: No se puede escribir en {full_log_path}. Revise los permisos de escritura. Error: {e}")
 
-    # Configuración básica del logging
-    logging.basicConfig(
-        filename=full_log_path,  # Nombre del archivo de log (corrección aquí)
-        level=logging.INFO,      # Nivel mínimo de mensajes que se guardarán
-        format='%(asctime)s - SCRAPER - %(levelname)s - %(message)s'  # Formato del mensaje
-    )
+    # Configura el logger personalizado
+    logger = logging.getLogger()
+    logger.setLevel(logging.INFO)
+
+    # Elimina todos los handlers anteriores
+    while logger.hasHandlers():
+        logger.removeHandler(logger.handlers[0])
 
+    # Crea un nuevo FileHandler con la fecha actual
+    file_handler = logging.FileHandler(full_log_path)
+    formatter = logging.Formatter('%(asctime)s - SCRAPER - %(levelname)s - %(message)s')
+    file_handler.setFormatter(formatter)
+    logger.addHandler(file_handler)
 
 def get_province_from_dest_id(dest_id):
     """Mapea ID con nombre de provincia."""
@@ -54,503 +285,3981 @@ def get_province_from_dest_id(dest_id):
     }
     return province_map.get(dest_id, 'Unknown Province')
 
-def scrape_booking_region(dest_id, checkin_date, checkout_date):
+class DetailCache:
     """
-    Extrae datos de hoteles de Booking.com para una región especificada basada en dest_id.
+    Caché de detalles de hotel indexada por el id del hotel, con dos niveles:
+    un LRU en memoria y un fichero ndjson en disco que sobrevive a los reinicios.
 
-    Parámetros:
-        dest_id (str): El ID de destino para la región (ej. '1363' para Almería).
-        checkin_date (str): Fecha de entrada en formato 'YYYY-MM-DD'.
-        checkout_date (str): Fecha de salida en formato 'YYYY-MM-DD'.
+    El fichero en disco es de solo anexado; en memoria solo se guarda el desplazamiento
+    de la última entrada de cada id. Al abrir la caché se compacta el fichero
+    descartando entradas repetidas y caducadas.
 
-    Retorna:
-        list: Una lista de diccionarios, donde cada diccionario representa un hotel.
+    Con SHARDING cada réplica escribe su propio fichero, y otras(), si se indica, devuelve los de
+    las demás réplicas. Un hotel que no está en la caché propia se busca en ellos antes de darlo
+    por fallo y, si está vigente, se copia a la propia. De cada fichero ajeno se lee solo lo añadido
+    desde la última vez, o el fichero entero si su réplica lo ha compactado.
     """
-    # URL base para los resultados de búsqueda de Booking.com
-    # Las fechas y la moneda se añadirán como parámetros de consulta.
-    # Se añadió selected_currency=EUR para intentar forzar precios en EUR.
-    base_url = f"https://www.booking.com/searchresults.es.html?lang=es%E2%82%8AC&dest_id={dest_id}&dest_type=region&ac_langcode=es&nflt=ht_id%3D204&shw_aparth=0&selected_currency=EUR&checkin={{}}&checkout={{}}"
-    url = base_url.format(checkin_date, checkout_date)
 
-    # Obtiene el nombre de la provincia a partir del dest_id
-    province_name = get_province_from_dest_id(dest_id)
+    def __init__(self, path, ttl, max_items, otras=None):
+        self.path = path
+        self.ttl = ttl
+        self.max_items = max_items
+        self._lock = threading.Lock()
+        self._memoria = OrderedDict() # id -> (timestamp, detalles)
+        self._indice = {} # id -> (timestamp, desplazamiento en el fichero)
+        self._otras = otras
+        self._ajenas = {} # fichero de otra réplica -> {'inodo', 'leido' (bytes), 'indice' (id -> (timestamp, desplazamiento))}
+        self._buscadas = None # time.monotonic() de la última búsqueda de ficheros de otras réplicas
+        self.hits_memoria = 0
+        self.hits_disco = 0
+        self.hits_replicas = 0
+        self.compartidos = 0 # Consultas que esperaron a la descarga en curso del mismo hotel
+        self.misses = 0
+        self.expirados = 0
+        self._compactar()
 
-    # Agentes de usuario
-    user_agents = [
-        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/14.1.1 Safari/605.1.15',
-        'Mozilla/5.0 (Windows NT 10.0; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.107 Safari/537.36',
-        'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.107 Safari/537.36',
-        'Mozilla/5.0 (Windows NT 10.0; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.107 Safari/537.36',
-        'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.107 Safari/537.36',
-    ]
-    headers = {
-        'User-Agent': random.choice(user_agents)
-    }
+    def _vigente(self, ts):
+        return time.time() - ts < self.ttl
 
-    hotel_list = []
+    def _compactar(self):
+        """Carga el fichero en disco quedándose con la última entrada vigente de cada id y lo reescribe."""
+        if not os.path.exists(self.path):
+            return
+        entradas = {}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for linea in f:
+                try:
+                    entrada = json.loads(linea)
+                    entradas[entrada['id']] = entrada
+                except (ValueError, KeyError):
+                    continue # Línea truncada por una escritura interrumpida
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for hotel_id, entrada in entradas.items():
+                if not self._vigente(entrada['ts']):
+                    continue
+                self._indice[hotel_id] = (entrada['ts'], f.tell())
+                f.write(json.dumps(entrada, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.path)
 
-    try:
-        # Añade un retraso aleatorio antes de hacer la solicitud
-        time.sleep(random.uniform(0.3, 0.5)) # Retraso entre 0.3 y 0.5 segundos
-        logging.info(f"Obteniendo resultados de dest_id {dest_id} ({province_name}) el {checkin_date}...") # Corrección aquí
+    def get(self, hotel_id):
+        """Devuelve los detalles vigentes del hotel o None si no están en caché."""
+        with self._lock:
+            entrada = self._memoria.get(hotel_id)
+            if entrada is not None:
+                if self._vigente(entrada[0]):
+                    self._memoria.move_to_end(hotel_id)
+                    self.hits_memoria += 1
+                    return entrada[1]
+                del self._memoria[hotel_id]
 
-        response = requests.get(url, headers=headers)
-        response.raise_for_status() # Lanza una excepción para códigos de estado incorrectos
-        
-        soup = BeautifulSoup(response.content, 'html.parser')
-
-        # Encuentra todos los listados de hoteles en la página
-        # Necesitarás inspeccionar el HTML de la página de resultados de búsqueda
-        # para encontrar el selector correcto para los listados de hoteles individuales.
-        # Este es un selector de marcador de posición.
-        hotels = soup.select('div[data-testid="property-card"]')
-        logging.info(f"Encontrados {len(hotels)} hoteles en la página de resultados de búsqueda de {province_name}.") # Log Número de hoteles encontrados
-        for hotel in hotels:
-            hotel_data = {}
-
-            # Extrae puntos de datos
-            # Necesitarás inspeccionar el HTML para cada punto de datos y encontrar su selector.
-            # Estos son selectores y lógica de marcador de posición.
-
-            # URL hotel (sin fechas)
-            try:
-                url_element = hotel.select_one('a[data-testid="title-link"]')
-                if url_element and 'href' in url_element.attrs:
-                    full_url = url_element['href']
-                    hotel_data['url'] = full_url # Mantiene la URL completa para extraer la localidad
-
-                    # Extrae el ID de la ruta de la URL (texto después del último '/' y antes de '.html')
-                    last_part = full_url.split('/')[-1]
-                    hotel_id_with_extension = last_part.split('.html')[0]
-                    # Eliminar todo lo que va después del primer punto inclusive
-                    hotel_id = hotel_id_with_extension.split('.')[0]
-                    hotel_data['id'] = hotel_id
-
-                    # Extrae la localidad de la URL
-                    parsed_hotel_url = urlparse(full_url)
-                    hotel_query_params = parse_qs(parsed_hotel_url.query)
-                    locality = hotel_query_params.get('ss', [None])[0]
-                    if locality:
-                        # Reemplaza '+' con espacios
-                        hotel_data['localidad'] = locality.replace('+', ' ')
-                    else:
-                        hotel_data['localidad'] = None
+            posicion = self._indice.get(hotel_id)
+            if posicion is not None:
+                ts, offset = posicion
+                if self._vigente(ts):
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        f.seek(offset)
+                        detalles = json.loads(f.readline())['detalles']
+                    self._guardar_en_memoria(hotel_id, ts, detalles)
+                    self.hits_disco += 1
+                    return detalles
+                del self._indice[hotel_id]
+                self.expirados += 1
 
+            if self._otras is not None:
+                detalles = self._buscar_en_otras(hotel_id)
+                if detalles is not None:
+                    self.hits_replicas += 1
+                    return detalles
 
-                else:
-                    hotel_data['url'] = None
-                    hotel_data['id'] = None
-                    hotel_data['localidad'] = None # También establece la localidad a None si falta la URL
-            except Exception as e:
-                logging.error(f"Error obteniendo url, id, o localidad: {e}") #Localidad
-                hotel_data['url'] = None
-                hotel_data['id'] = None
-                hotel_data['localidad'] = None # También establece la localidad a None en caso de error
+            self.misses += 1
+            return None
 
-            # Nombre
-            try:
-                name_element = hotel.select_one('div[data-testid="title"]')
-                hotel_data['nombre'] = name_element.get_text(strip=True) if name_element else None
-            except Exception as e:
-                logging.error(f"Error obteniendo nombre del hotel: {e}")
-                hotel_data['nombre'] = None
+    def compartido(self):
+        """Cuenta como acierto una consulta que se resuelve con la descarga en curso del mismo hotel."""
+        with self._lock:
+            self.compartidos += 1
+
+    @property
+    def aciertos(self):
+        return self.hits_memoria + self.hits_disco + self.hits_replicas + self.compartidos
+
+    def put(self, hotel_id, detalles):
+        """Guarda los detalles del hotel en ambos niveles."""
+        with self._lock:
+            self._anexar(hotel_id, time.time(), detalles)
 
-            # marca (A menudo no está directamente disponible en los resultados de búsqueda, podría ser necesario visitar la página del hotel)
-            hotel_data['marca'] = None # Marcador de posición
+    def _anexar(self, hotel_id, ts, detalles):
+        linea = json.dumps({'id': hotel_id, 'ts': ts, 'detalles': detalles}, ensure_ascii=False) + "\n"
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.seek(0, os.SEEK_END)
+            self._indice[hotel_id] = (ts, f.tell())
+            f.write(linea)
+        self._guardar_en_memoria(hotel_id, ts, detalles)
 
-            # Dirección y Localidad
+    def _buscar_en_otras(self, hotel_id):
+        """Detalles vigentes del hotel en la caché de otra réplica (la entrada más reciente), copiados a la propia."""
+        try:
+            self._seguir_otras()
+        except (IOError, OSError) as e:
+            logging.error(f"No se pueden leer las cachés de detalles de otras réplicas: {e}")
+            return None
+        encontrada = None
+        for path, estado in self._ajenas.items():
+            posicion = estado['indice'].get(hotel_id)
+            if posicion is not None and self._vigente(posicion[0]) and (encontrada is None or posicion[0] > encontrada[0]):
+                encontrada = (posicion[0], path, posicion[1])
+        if encontrada is None:
+            return None
+        ts, path, offset = encontrada
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                f.seek(offset)
+                entrada = json.loads(f.readline())
+        except (IOError, OSError, ValueError):
+            return None
+        if entrada.get('id') != hotel_id:
+            return None # Compactado por su réplica después de leerlo; se volverá a leer entero
+        self._anexar(hotel_id, ts, entrada['detalles'])
+        return entrada['detalles']
+
+    def _seguir_otras(self):
+        """Indexa lo que las demás réplicas han añadido a sus cachés desde la última llamada."""
+        ahora = time.monotonic()
+        if self._buscadas is None or ahora - self._buscadas >= DETAIL_CACHE_RESCAN:
+            self._buscadas = ahora
+            for path in self._otras():
+                if os.path.abspath(path) != os.path.abspath(self.path):
+                    self._ajenas.setdefault(path, {'inodo': None, 'leido': 0, 'indice': {}})
+        for path, estado in self._ajenas.items():
             try:
-                address_element = hotel.select_one('span[data-testid="address"]')
-                if address_element:
-                    full_address = address_element.get_text(strip=True)
-                    # Asumiendo que la localidad es la primera parte antes de una coma o la cadena completa
-                    address_parts = full_address.split(',', 1)
-                    hotel_data['localidad'] = address_parts[0].strip()
-                    hotel_data['Dirección'] = full_address # Mantiene la dirección completa como Dirección
-                else:
-                    hotel_data['localidad'] = None
-                    hotel_data['Dirección'] = None
-            except Exception as e:
-                logging.error(f"Error obteniendo dirección o localidad: {e}")
-                hotel_data['localidad'] = None
-                hotel_data['Dirección'] = None
+                f = open(path, 'rb')
+            except FileNotFoundError:
+                continue
+            with f:
+                info = os.fstat(f.fileno())
+                if info.st_ino != estado['inodo'] or info.st_size < estado['leido']:
+                    estado.update(inodo=info.st_ino, leido=0, indice={})
+                f.seek(estado['leido'])
+                datos = f.read()
+            # Solo líneas completas: la última puede estar escribiéndose
+            completas = datos[:datos.rfind(b'\n') + 1]
+            offset = estado['leido']
+            for linea in completas.splitlines(keepends=True):
+                try:
+                    entrada = json.loads(linea)
+                    estado['indice'][entrada['id']] = (entrada['ts'], offset)
+                except (ValueError, KeyError):
+                    pass
+                offset += len(linea)
+            estado['leido'] = offset
 
+    def _guardar_en_memoria(self, hotel_id, ts, detalles):
+        self._memoria[hotel_id] = (ts, detalles)
+        self._memoria.move_to_end(hotel_id)
+        while len(self._memoria) > self.max_items:
+            self._memoria.popitem(last=False)
 
-            # Coordenadas (A menudo no están directamente disponibles en los resultados de búsqueda, podría ser necesario visitar la página del hotel o usar geocodificación)
-            hotel_data['Coordenadas'] = None # Marcador de posición
+    def resumen(self):
+        """Texto con los contadores de aciertos y fallos para el log."""
+        hits = self.aciertos
+        total = hits + self.misses
+        ratio = (hits / total * 100) if total else 0.0
+        return (f"{hits} aciertos (memoria: {self.hits_memoria}, disco: {self.hits_disco}, otras réplicas: {self.hits_replicas}, "
+                f"descargas compartidas: {self.compartidos}), "
+                f"{self.misses} fallos ({self.expirados} caducados), tasa de acierto {ratio:.1f}%")
 
-            # Servicios populares (A menudo no están directamente disponibles en los resultados de búsqueda, podría ser necesario visitar la página del hotel)
-            hotel_data['Servicios populares'] = None # Marcador de posición
+class HttpCache:
+    """
+    Caché HTTP de las páginas de hotel, indexada por el id del hotel (la URL cambia con las fechas).
 
-            # Descripción (A menudo no está completamente disponible en los resultados de búsqueda, podría ser necesario visitar la página del hotel)
-            hotel_data['Descripción'] = None # Marcador de posición
+    Por cada hotel guarda en disco el cuerpo comprimido con gzip ({id}.html.gz) y, aparte, los
+    validadores de la respuesta junto con los detalles ya extraídos ({id}.json). Con ellos se envían
+    solicitudes condicionales y, si Booking responde 304, se reutilizan los detalles sin volver a parsear.
+    """
 
-            # Puntuación, Opinión, Numero comentarios
-            try:
-                review_score_container = hotel.select_one('div[data-testid="review-score"]')
-                if review_score_container:
-                    # Obtiene todos los textos de los divs hijos directos
-                    score_texts = [div.get_text(strip=True) for div in review_score_container.select(':scope > div')]
-
-                    # Asigna según el índice, similar al fragmento proporcionado
-                    # Puntuación (valor numérico del índice 0)
-                    if len(score_texts) > 0 and score_texts[0]:
-                        try:
-                            hotel_data['Puntuación'] = float(score_texts[0])
-                        except (ValueError, TypeError):
-                            hotel_data['Puntuación'] = None
-                    else:
-                        hotel_data['Puntuación'] = None
-
-                    # Opinión (del índice 1)
-                    if len(score_texts) > 1 and score_texts[1]:
-                        try:
-                            # Reemplaza la coma por un punto para la conversión a flotante
-                            opinion_str = score_texts[1].replace(',', '.')
-                            hotel_data['Opinión'] = float(opinion_str)
-                        except (ValueError, TypeError):
-                            hotel_data['Opinión'] = None
-                    else:
-                        hotel_data['Opinión'] = None
-
-                    # Numero comentarios (valor numérico del índice 2 usando split)
-                    if len(score_texts) > 2 and score_texts[2]:
-                        num_comments_text = score_texts[2]
-                        # Usa regex para encontrar el número de comentarios
-                        match = re.search(r'\d+', num_comments_text)
-                        # Extrae solo el número y convierte a entero
-                        try:
-                            hotel_data['Numero comentarios'] = int(match.group(0)) if match else None
-                        except (ValueError, TypeError):
-                            hotel_data['Numero comentarios'] = None
-                    else:
-                        hotel_data['Numero comentarios'] = None
+    def __init__(self, directorio):
+        self.directorio = directorio
+        os.makedirs(directorio, exist_ok=True)
+        self._lock = threading.Lock()
+        self.revalidadas = 0 # Respuestas 304
+        self.descargadas = 0 # Respuestas 200 guardadas en la caché
+        self.sin_validadores = 0 # Respuestas 200 sin ETag ni Last-Modified, que no se guardan
+        self.bytes_ahorrados = 0
+        self.bytes_descargados = 0
 
-                else:
-                    hotel_data['Puntuación'] = None
-                    hotel_data['Opinión'] = None
-                    hotel_data['Numero comentarios'] = None
+    def _ruta(self, hotel_id, extension):
+        return os.path.join(self.directorio, re.sub(r'[^\w.-]', '_', hotel_id) + extension)
 
-            except Exception as e:
-                logging.error(f"Error obteniendo puntuación, opinión o número de comentarios: {e}")
-                hotel_data['Puntuación'] = None
-                hotel_data['Opinión'] = None
-                hotel_data['Numero comentarios'] = None
+    def get(self, hotel_id):
+        """Devuelve la entrada guardada del hotel (validadores, tamaño y detalles) o None."""
+        try:
+            with open(self._ruta(hotel_id, '.json'), 'r', encoding='utf-8') as f:
+                entrada = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if not os.path.exists(self._ruta(hotel_id, '.html.gz')):
+            return None
+        return entrada
 
+    def condiciones(self, entrada):
+        """Cabeceras de la solicitud condicional para revalidar una entrada."""
+        cabeceras = {}
+        if entrada is None:
+            return cabeceras
+        if entrada.get('etag'):
+            cabeceras['If-None-Match'] = entrada['etag']
+        if entrada.get('last_modified'):
+            cabeceras['If-Modified-Since'] = entrada['last_modified']
+        return cabeceras
 
-            # Fecha entrada (Proporcionada por el usuario)
-            hotel_data['Fecha entrada'] = checkin_date
+    def cuerpo(self, hotel_id):
+        """Cuerpo de la última respuesta completa del hotel, descomprimido."""
+        with gzip.open(self._ruta(hotel_id, '.html.gz'), 'rb') as f:
+            return f.read()
 
-            # Fecha salida (Proporcionada por el usuario)
-            hotel_data['Fecha salida'] = checkout_date
+    def put(self, hotel_id, response, detalles):
+        """Guarda el cuerpo y los validadores de una respuesta 200, si los trae."""
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        with self._lock:
+            self.bytes_descargados += len(response.content)
+            if not etag and not last_modified:
+                self.sin_validadores += 1
+                return
+            self.descargadas += 1
+        entrada = {'url': response.url, 'etag': etag, 'last_modified': last_modified, 'ts': time.time(),
+                   'bytes': len(response.content), 'detalles': detalles}
+        # Primero el cuerpo y después los metadatos, para no dejar validadores de un cuerpo que no existe
+        # Los temporales llevan el id de la réplica: con SHARDING otra réplica puede guardar el mismo hotel a la vez
+        cuerpo_path = self._ruta(hotel_id, '.html.gz')
+        cuerpo_tmp = nombre_replica(cuerpo_path + '.tmp')
+        with gzip.open(cuerpo_tmp, 'wb') as f:
+            f.write(response.content)
+        os.replace(cuerpo_tmp, cuerpo_path)
+        meta_path = self._ruta(hotel_id, '.json')
+        meta_tmp = nombre_replica(meta_path + '.tmp')
+        with open(meta_tmp, 'w', encoding='utf-8') as f:
+            json.dump(entrada, f, ensure_ascii=False)
+        os.replace(meta_tmp, meta_path)
 
-            # Precio
-            price_text = None
-            try:
-                price_element = hotel.select_one('span[data-testid="price-and-discounted-price"]')
-                if price_element:
-                     price_text = price_element.get_text(strip=True)
+    def revalidada(self, entrada):
+        """Anota una respuesta 304 para la entrada dada."""
+        with self._lock:
+            self.revalidadas += 1
+            self.bytes_ahorrados += entrada.get('bytes', 0)
+
+    def resumen(self):
+        """Texto con las revalidaciones y los bytes ahorrados para el log."""
+        total = self.revalidadas + self.descargadas + self.sin_validadores
+        ratio = (self.revalidadas / total * 100) if total else 0.0
+        return (f"{self.revalidadas} páginas sin cambios (304), {self.descargadas} descargadas, "
+                f"{self.sin_validadores} sin validadores; {self.bytes_ahorrados / 1e6:.1f} MB ahorrados "
+                f"de {(self.bytes_ahorrados + self.bytes_descargados) / 1e6:.1f} MB ({ratio:.1f}% de páginas revalidadas)")
+
+class TokenBucket:
+    """
+    Limitador de tasa compartido por todos los hilos: como máximo `rate` solicitudes por segundo
+    de media, con ráfagas de hasta `burst` solicitudes.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self._tokens = float(self.capacity)
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+        self.esperas = 0
+        self.tiempo_espera = 0.0
+
+    def acquire(self):
+        """Bloquea hasta que haya un token disponible y lo consume."""
+        if self.rate <= 0:
+            return
+        esperado = False
+        inicio = time.monotonic()
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (ahora - self._ultimo) * self.rate)
+                self._ultimo = ahora
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    if esperado:
+                        self.esperas += 1
+                        self.tiempo_espera += ahora - inicio
+                    return
+                espera = (1 - self._tokens) / self.rate
+            esperado = True
+            time.sleep(espera)
+
+    def set_rate(self, rate):
+        """Cambia la tasa conservando los tokens acumulados hasta ahora."""
+        with self._lock:
+            ahora = time.monotonic()
+            if self.rate > 0:
+                self._tokens = min(self.capacity, self._tokens + (ahora - self._ultimo) * self.rate)
+            self._ultimo = ahora
+            self.rate = rate
+
+    def resumen(self):
+        """Texto con las esperas acumuladas para el log."""
+        return f"{self.rate:g} solicitudes/s, {self.esperas} esperas, {self.tiempo_espera:.1f} s esperando"
+
+# Limitador global de solicitudes a Booking.com
+_rate_limiter = TokenBucket(REQUEST_RATE, REQUEST_BURST)
+
+def segundos_retry_after(valor):
+    """Segundos indicados por una cabecera Retry-After (en segundos o como fecha HTTP), o None si no es válida."""
+    if not valor:
+        return None
+    try:
+        return max(0.0, float(valor))
+    except ValueError:
+        pass
+    try:
+        fecha = email.utils.parsedate_to_datetime(valor)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (fecha - datetime.now(fecha.tzinfo)).total_seconds())
+
+class AdaptivePacer:
+    """
+    Ritmo adaptativo de las solicitudes (AIMD) sobre el limitador global.
+
+    Cada intervalo sin errores y con latencia media por debajo del objetivo se suma un poco a la tasa
+    del limitador y se permite una solicitud más en vuelo. Ante un 429, un 5xx, un error de conexión o
+    una latencia media por encima del objetivo, la tasa y la concurrencia se reducen a la mitad (como
+    mucho una vez por intervalo). Un Retry-After detiene todas las solicitudes el tiempo indicado.
+    """
+
+    def __init__(self, limiter, rate_min, rate_max, concurrencia, concurrencia_max, latencia_objetivo,
+                 intervalo=PACER_INTERVAL):
+        self.limiter = limiter
+        self.rate_min = rate_min
+        self.rate_max = max(rate_max, limiter.rate)
+        self.concurrencia = max(1, min(concurrencia, concurrencia_max))
+        self.concurrencia_max = concurrencia_max
+        self.latencia_objetivo = latencia_objetivo
+        self.intervalo = intervalo
+        self._cond = threading.Condition()
+        self._en_curso = 0
+        self._pausa_hasta = 0.0
+        self._ultimo_descenso = 0.0
+        self._nueva_ventana(time.monotonic())
+        # Totales de la ejecución para el resumen
+        self.subidas = 0
+        self.bajadas = 0
+        self.pausas = 0
+        self.tiempo_pausa = 0.0
+        self.rate_minima = self.rate_maxima = limiter.rate
+
+    def _nueva_ventana(self, ahora):
+        self._inicio_ventana = ahora
+        self._respuestas = 0
+        self._errores = 0
+        self._latencia = 0.0
+
+    def acquire(self):
+        """Espera a que no haya pausa ni demasiadas solicitudes en vuelo y después turno en el limitador."""
+        with self._cond:
+            while True:
+                espera = self._pausa_hasta - time.monotonic()
+                if espera > 0:
+                    self._cond.wait(espera)
+                elif self._en_curso < self.concurrencia:
+                    self._en_curso += 1
+                    break
                 else:
-                    # A veces el precio está en una estructura diferente
-                    price_element_alt = hotel.select_one('div[data-testid="price-and-discounted-price"] span')
-                    if price_element_alt:
-                        price_text = price_element_alt.get_text(strip=True)
+                    self._cond.wait()
+        try:
+            self.limiter.acquire()
+        except BaseException:
+            with self._cond:
+                self._en_curso -= 1
+                self._cond.notify()
+            raise
 
-                hotel_data['Precio_texto'] = price_text # Almacena el texto original para depuración
+    def release(self, latencia, estado, retry_after=None):
+        """
+        Registra el resultado de una solicitud y ajusta el ritmo.
 
-                if price_text:
-                    # Limpia la cadena de precio: elimina '€', espacios y reemplaza la coma por un punto
-                    cleaned_price_text = price_text.replace('€', '').replace(' ', '').replace('.', '').replace(',', '.') # Se añadió .replace('.', '') para eliminar separadores de miles
-                    try:
-                        # Convierte a entero
-                        hotel_data['Precio'] = int(cleaned_price_text)
-                    except (ValueError, TypeError):
-                        logging.error(f"Error al convertir el precio a entero: {cleaned_price_text}")
-                        hotel_data['Precio'] = None
+        Parámetros:
+            latencia (float): Segundos que tardó la solicitud.
+            estado (int): Código HTTP de la respuesta, o None si no hubo respuesta.
+            retry_after (str): Valor de la cabecera Retry-After, si la había.
+        """
+        with self._cond:
+            self._en_curso -= 1
+            ahora = time.monotonic()
+            self._respuestas += 1
+            self._latencia += latencia
+            error = estado is None or estado == 429 or estado >= 500
+            if error:
+                self._errores += 1
+            pausa = segundos_retry_after(retry_after) if estado in (429, 503) else None
+            if pausa:
+                self._pausar(ahora, min(pausa, PACER_MAX_PAUSE))
+            if error and ahora - self._ultimo_descenso >= self.intervalo:
+                self._reducir(ahora, f"respuesta {estado}" if estado else "error de conexión")
+            elif ahora - self._inicio_ventana >= self.intervalo:
+                media = self._latencia / self._respuestas
+                if media > self.latencia_objetivo:
+                    self._reducir(ahora, f"latencia media {media:.2f} s")
                 else:
-                    hotel_data['Precio'] = None
+                    if not self._errores:
+                        self._aumentar(media)
+                    self._nueva_ventana(ahora)
+            self._cond.notify_all()
 
-            except Exception as e:
-                logging.error(f"Error obteniendo o procesando el precio: {e}")
-                hotel_data['Precio'] = None
+    def _pausar(self, ahora, segundos):
+        hasta = ahora + segundos
+        if hasta > self._pausa_hasta:
+            self.tiempo_pausa += hasta - max(self._pausa_hasta, ahora)
+            self.pausas += 1
+            self._pausa_hasta = hasta
+            logging.warning(f"Retry-After: solicitudes en pausa {segundos:.0f} s.")
 
+    def _reducir(self, ahora, motivo):
+        rate = max(self.rate_min, self.limiter.rate * PACER_DECREASE)
+        self.concurrencia = max(1, int(self.concurrencia * PACER_DECREASE))
+        self.limiter.set_rate(rate)
+        self.rate_minima = min(self.rate_minima, rate)
+        self.bajadas += 1
+        self._ultimo_descenso = ahora
+        self._nueva_ventana(ahora)
+        logging.warning(f"Ritmo reducido por {motivo}: {self.estado()}.")
 
-            # Extrae detalles adicionales de la página individual del hotel
-            if hotel_data.get('url'):
-                hotel_details = scrape_hotel_details(hotel_data['url'])
-                if hotel_details:
-                    # Construye el diccionario en el orden deseado
-                    ordered_hotel_data = {
-                        'url': hotel_data.get('url'),
-                        'id': hotel_data.get('id'),
-                        'nombre': hotel_data.get('nombre'),
-                        'marca': hotel_details.get('marca'), # Obtiene marca de hotel_details
-                        'destacados': hotel_details.get('Destacados'), # Añade Destacados
-                        'provincia': province_name, # Añade el nombre de la provincia aquí
-                        'localidad': hotel_data.get('localidad'), # Añade la localidad aquí
-                        'direccion': hotel_details.get('Dirección_detalle'), # Obtiene Dirección de hotel_details
-                        'location': { # Crea un diccionario anidado para las coordenadas
-                            'lat': hotel_details.get('lat'), # Obtiene lat de hotel_details
-                            'lon': hotel_details.get('lon'), # Obtiene lon de hotel_details
-                        },
-                        'servicios': hotel_details.get('Servicios populares'), # Obtiene Servicios populares de hotel_details
-                        'descripcion': hotel_details.get('Descripción'), # Obtiene Descripción de hotel_details
-                        'puntuacion': hotel_data.get('Puntuación'),
-                        'opinion': hotel_data.get('Opinión'),
-                        'comentarios': hotel_data.get('Numero comentarios'),
-                        'fechaEntrada': hotel_data.get('Fecha entrada'),
-                        'fechaSalida': hotel_data.get('Fecha salida'),
-                        'precio': hotel_data.get('Precio'), # Usa el precio procesado
-                    }
-                    # Elimina claves con valores None o listas vacías para mantener la salida limpia
-                    hotel_data = {k: v for k, v in ordered_hotel_data.items() if v is not None and v != []}
-
-
-            hotel_list.append(hotel_data)
-
-        # TODO: Implementar paginación si es necesario
+    def _aumentar(self, media):
+        rate = min(self.rate_max, self.limiter.rate + PACER_INCREASE)
+        concurrencia = min(self.concurrencia_max, self.concurrencia + 1)
+        if rate == self.limiter.rate and concurrencia == self.concurrencia:
+            return
+        self.limiter.set_rate(rate)
+        self.concurrencia = concurrencia
+        self.rate_maxima = max(self.rate_maxima, rate)
+        self.subidas += 1
+        logging.info(f"Ritmo aumentado (latencia media {media:.2f} s): {self.estado()}.")
 
+    def estado(self):
+        return f"{self.limiter.rate:g} solicitudes/s, {self.concurrencia} en vuelo como máximo"
 
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Error al obtener la página de resultados: {e}")
-        return None
+    def resumen(self):
+        """Texto con el estado final y los ajustes de la ejecución para el log."""
+        return (f"{self.estado()}; tasa entre {self.rate_minima:g} y {self.rate_maxima:g} solicitudes/s, "
+                f"{self.subidas} subidas, {self.bajadas} bajadas, {self.pausas} pausas por Retry-After "
+                f"({self.tiempo_pausa:.0f} s)")
 
-    return hotel_list
+# Ritmo adaptativo activo durante la ejecución de scraping(), o None si está desactivado
+_pacer = None
 
-def scrape_hotel_details(url):
+class CircuitBreaker:
+    """
+    Cortocircuito de las descargas: tras `umbral` errores transitorios seguidos detiene todas las
+    solicitudes durante `pausa` segundos. Pasada la pausa deja salir una única solicitud de prueba;
+    si responde se reanudan las descargas y si falla se vuelve a esperar otra pausa.
     """
-    Extrae detalles adicionales de la página individual de un hotel en Booking.com.
 
-    Parámetros:
-        url (str): La URL de la página individual del hotel.
+    def __init__(self, umbral, pausa):
+        self.umbral = umbral
+        self.pausa = pausa
+        self._cond = threading.Condition()
+        self._fallos = 0
+        self._abierto_hasta = 0.0
+        self._sonda = False
+        self.aperturas = 0
+        self.tiempo_abierto = 0.0
 
-    Retorna:
-        dict: Un diccionario que contiene detalles adicionales del hotel.
+    def acquire(self):
+        """Espera mientras el circuito está abierto o hay una solicitud de prueba en curso."""
+        with self._cond:
+            while self._fallos >= self.umbral:
+                espera = self._abierto_hasta - time.monotonic()
+                if espera > 0:
+                    self._cond.wait(espera)
+                elif not self._sonda:
+                    self._sonda = True
+                    return
+                else:
+                    self._cond.wait()
+
+    def abierto(self):
+        with self._cond:
+            return self._fallos >= self.umbral and time.monotonic() < self._abierto_hasta
+
+    def exito(self):
+        """El servidor ha respondido: cierra el circuito."""
+        with self._cond:
+            if self._fallos >= self.umbral:
+                logging.info("Circuito cerrado: se reanudan las descargas.")
+            self._fallos = 0
+            self._sonda = False
+            self._cond.notify_all()
+
+    def fallo(self):
+        """Error transitorio: abre el circuito al llegar al umbral o si falla la solicitud de prueba."""
+        with self._cond:
+            self._fallos += 1
+            if self._sonda or self._fallos == self.umbral:
+                self._sonda = False
+                self._abierto_hasta = time.monotonic() + self.pausa
+                self.aperturas += 1
+                self.tiempo_abierto += self.pausa
+                logging.warning(f"Circuito abierto tras {self._fallos} errores seguidos: descargas detenidas {self.pausa:g} s.")
+            self._cond.notify_all()
+
+    def cancelar(self):
+        """Libera la solicitud de prueba si terminó sin respuesta ni error HTTP (p. ej. una excepción inesperada)."""
+        with self._cond:
+            self._sonda = False
+            self._cond.notify_all()
+
+    def resumen(self):
+        return f"abierto {self.aperturas} veces ({self.tiempo_abierto:.0f} s)"
+
+class FetchStats:
+    """Contadores de solicitudes, reintentos, tiempos de espera agotados y fallos definitivos de la ejecución."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.solicitudes = 0
+        self.reintentos = 0
+        self.timeouts = 0
+        self.errores_conexion = 0
+        self.errores_http = Counter()
+        self.fallidas = 0
+        self.bytes = 0
+        self.latencias = {} # tipo de página -> duraciones de los intentos, para los percentiles del manifiesto
+
+    def observar(self, tipo, duracion, n_bytes):
+        """Anota la duración y los bytes de contenido de un intento de descarga."""
+        with self._lock:
+            self.latencias.setdefault(tipo, []).append(duracion)
+            self.bytes += n_bytes
+
+    def registrar(self, error=None):
+        """Cuenta un intento de solicitud y, si falló, el tipo de error."""
+        with self._lock:
+            self.solicitudes += 1
+            if isinstance(error, requests.exceptions.Timeout):
+                self.timeouts += 1
+            elif isinstance(error, requests.exceptions.ConnectionError):
+                self.errores_conexion += 1
+            elif isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+                self.errores_http[error.response.status_code] += 1
+
+    def contar(self, campo):
+        with self._lock:
+            setattr(self, campo, getattr(self, campo) + 1)
+
+    def resumen(self):
+        """Texto con los contadores para el log."""
+        http = ', '.join(f"{codigo}: {n}" for codigo, n in sorted(self.errores_http.items())) or 'ninguno'
+        return (f"{self.solicitudes} solicitudes, {self.reintentos} reintentos, {self.timeouts} tiempos de espera agotados, "
+                f"{self.errores_conexion} errores de conexión, errores HTTP ({http}), "
+                f"{self.fallidas} solicitudes fallidas tras reintentar")
+
+# Cortocircuito y contadores de solicitudes activos durante la ejecución de scraping()
+_circuit = None
+_fetch_stats = FetchStats()
+
+def abrir_circuito():
+    """Crea el cortocircuito de la ejecución, o retorna None si está desactivado."""
+    return CircuitBreaker(CIRCUIT_FAILURES, CIRCUIT_PAUSE) if CIRCUIT_FAILURES > 0 else None
+
+def error_transitorio(error):
+    """Indica si merece la pena reintentar una solicitud que terminó con este error."""
+    if isinstance(error, requests.exceptions.HTTPError):
+        return error.response is not None and error.response.status_code in RETRY_STATUS_CODES
+    return isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError,
+                              requests.exceptions.ChunkedEncodingError))
+
+def espera_reintento(intento, error=None):
     """
-    user_agents = [
-        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/14.1.1 Safari/605.1.15',
-        'Mozilla/5.0 (Windows NT 10.0; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.107 Safari/537.36',
-        'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.107 Safari/537.36',
-        'Mozilla/5.0 (Windows NT 10.0; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.107 Safari/537.36',
-        'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.107 Safari/537.36',
-    ]
-    headers = {
-        'User-Agent': random.choice(user_agents)
-    }
+    Espera exponencial con variación aleatoria antes del reintento número `intento` (desde 0). Si la
+    respuesta traía Retry-After se espera al menos ese tiempo.
+    """
+    tope = min(FETCH_BACKOFF_MAX, FETCH_BACKOFF_BASE * 2 ** intento)
+    espera = tope / 2 + random.uniform(0, tope / 2)
+    response = getattr(error, 'response', None)
+    if response is not None:
+        retry_after = segundos_retry_after(response.headers.get('Retry-After'))
+        if retry_after:
+            espera = max(espera, min(retry_after, PACER_MAX_PAUSE))
+    return espera
+
+class Metrics:
+    """
+    Registro de métricas en memoria con el formato de exposición de texto de Prometheus: contadores,
+    valores instantáneos (gauge) e histogramas, con etiquetas. Dura toda la vida del proceso, de modo
+    que los contadores crecen de una ejecución diaria a la siguiente, como espera Prometheus.
+    """
+
+    def __init__(self, definiciones, cubetas=METRICS_BUCKETS):
+        self.definiciones = definiciones # nombre -> (tipo, ayuda)
+        self.cubetas = cubetas
+        self._lock = threading.Lock()
+        self._valores = {} # (nombre, etiquetas) -> valor, o [recuentos por cubeta, suma, total] en histogramas
+
+    def inc(self, nombre, valor=1, **etiquetas):
+        """Suma al contador o gauge (un valor negativo lo reduce)."""
+        clave = (nombre, tuple(sorted(etiquetas.items())))
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + valor
+
+    def set(self, nombre, valor, **etiquetas):
+        with self._lock:
+            self._valores[(nombre, tuple(sorted(etiquetas.items())))] = valor
+
+    def get(self, nombre, **etiquetas):
+        with self._lock:
+            return self._valores.get((nombre, tuple(sorted(etiquetas.items()))))
+
+    def observe(self, nombre, valor, **etiquetas):
+        """Añade una observación al histograma."""
+        clave = (nombre, tuple(sorted(etiquetas.items())))
+        with self._lock:
+            histograma = self._valores.get(clave)
+            if histograma is None:
+                histograma = self._valores[clave] = [[0] * (len(self.cubetas) + 1), 0.0, 0]
+            histograma[0][bisect.bisect_left(self.cubetas, valor)] += 1
+            histograma[1] += valor
+            histograma[2] += 1
 
-    details = {}
+    def render(self):
+        """Texto de todas las métricas en el formato de exposición de Prometheus."""
+        with self._lock:
+            valores = sorted(self._valores.items(), key=lambda item: item[0])
+        lineas = []
+        for nombre, (tipo, ayuda) in self.definiciones.items():
+            lineas.append(f"# HELP {nombre} {ayuda}")
+            lineas.append(f"# TYPE {nombre} {tipo}")
+            for (clave, etiquetas), valor in valores:
+                if clave != nombre:
+                    continue
+                if tipo != 'histogram':
+                    lineas.append(f"{nombre}{_etiquetas(etiquetas)} {_numero(valor)}")
+                    continue
+                recuentos, suma, total = valor
+                acumulado = 0
+                for limite, recuento in zip(self.cubetas + ('+Inf',), recuentos):
+                    acumulado += recuento
+                    lineas.append(f"{nombre}_bucket{_etiquetas(etiquetas + (('le', str(limite)),))} {acumulado}")
+                lineas.append(f"{nombre}_sum{_etiquetas(etiquetas)} {_numero(suma)}")
+                lineas.append(f"{nombre}_count{_etiquetas(etiquetas)} {total}")
+        return '\n'.join(lineas) + '\n'
 
+def _numero(valor):
+    """Valor de una muestra sin perder precisión (las marcas de tiempo necesitan todos los dígitos)."""
+    return str(valor) if isinstance(valor, int) else repr(float(valor))
+
+def _etiquetas(etiquetas):
+    """Etiquetas en la sintaxis de Prometheus, escapando barras, comillas y saltos de línea."""
+    if not etiquetas:
+        return ''
+    pares = []
+    for nombre, valor in etiquetas:
+        valor = str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pares.append(f'{nombre}="{valor}"')
+    return '{' + ','.join(pares) + '}'
+
+_metrics = Metrics({
+    'scraper_fetch_seconds': ('histogram', 'Duración de cada intento de descarga por tipo de página.'),
+    'scraper_parse_seconds': ('histogram', 'Duración del parseo y la extracción por tipo de página y backend.'),
+    'scraper_write_seconds': ('histogram', 'Tiempo de escritura de la salida de cada trabajo (provincia y fecha).'),
+    'scraper_requests_total': ('counter', 'Solicitudes HTTP por tipo de página y código de estado (error si no hubo respuesta).'),
+    'scraper_retries_total': ('counter', 'Reintentos de solicitudes por tipo de página.'),
+    'scraper_bytes_downloaded_total': ('counter', 'Bytes de contenido descargados (descomprimidos) por tipo de página.'),
+    'scraper_hotels_total': ('counter', 'Hoteles escritos por provincia.'),
+    'scraper_field_failures_total': ('counter', 'Fallos de extracción por tipo de página y campo.'),
+    'scraper_jobs_total': ('counter', 'Trabajos (provincia, fecha y variante de estancia) terminados por resultado.'),
+    'scraper_requests_in_flight': ('gauge', 'Solicitudes HTTP en curso.'),
+    'scraper_parse_queue': ('gauge', 'Páginas en cola o en parseo en el pool de procesos (modo PIPELINE).'),
+    'scraper_jobs_pending': ('gauge', 'Trabajos de la ejecución en cola sin empezar.'),
+    'scraper_jobs_running': ('gauge', 'Trabajos de la ejecución en curso.'),
+    'scraper_request_rate': ('gauge', 'Tasa actual del limitador de solicitudes (solicitudes/s).'),
+    'scraper_request_concurrency_limit': ('gauge', 'Solicitudes en vuelo permitidas por el ritmo adaptativo.'),
+    'scraper_circuit_open': ('gauge', '1 si el cortocircuito tiene detenidas las descargas.'),
+    'scraper_run_in_progress': ('gauge', '1 mientras hay una ejecución en curso.'),
+    'scraper_last_progress_timestamp_seconds': ('gauge', 'Momento de la última respuesta recibida u hotel escrito.'),
+    'scraper_last_run_end_timestamp_seconds': ('gauge', 'Momento en que terminó la última ejecución.'),
+    'scraper_last_run_duration_seconds': ('gauge', 'Duración de la última ejecución.'),
+})
+
+def tipo_de_url(url):
+    """Tipo de página de una URL de Booking para las etiquetas de las métricas."""
+    if '/searchresults' in url:
+        return 'busqueda'
+    if '/hotel/' in url:
+        return 'hotel'
+    return 'otra'
+
+def estado_salud():
+    """
+    Retorna (sano, mensaje): una ejecución en curso sin ninguna respuesta ni hotel escrito en
+    HEALTH_STALL_SECONDS se considera atascada.
+    """
+    if not _metrics.get('scraper_run_in_progress'):
+        return True, 'ok: sin ejecución en curso'
+    progreso = _metrics.get('scraper_last_progress_timestamp_seconds') or 0
+    parado = time.time() - progreso
+    if parado > HEALTH_STALL_SECONDS:
+        return False, f"ejecución sin progreso desde hace {parado:.0f} s"
+    return True, f"ok: ejecución en curso, último progreso hace {parado:.0f} s"
+
+class ManejadorMetricas(BaseHTTPRequestHandler):
+    """Sirve /metrics (formato Prometheus) y /health (200 o 503 según estado_salud)."""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split('?')[0] == '/metrics':
+            pacer = _pacer
+            _metrics.set('scraper_request_rate', _rate_limiter.rate)
+            if pacer is not None:
+                _metrics.set('scraper_request_concurrency_limit', pacer.concurrencia)
+            _metrics.set('scraper_circuit_open', 1 if _circuit is not None and _circuit.abierto() else 0)
+            self._responder(200, _metrics.render(), 'text/plain; version=0.0.4; charset=utf-8')
+        elif self.path.split('?')[0] == '/health':
+            sano, mensaje = estado_salud()
+            self._responder(200 if sano else 503, mensaje + '\n', 'text/plain; charset=utf-8')
+        else:
+            self._responder(404, 'Not Found\n', 'text/plain; charset=utf-8')
+
+    def _responder(self, estado, texto, tipo):
+        cuerpo = texto.encode('utf-8')
+        self.send_response(estado)
+        self.send_header('Content-Type', tipo)
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+def iniciar_servidor_metricas(puerto=METRICS_PORT, host=METRICS_HOST):
+    """Arranca el servidor de métricas en un hilo en segundo plano; retorna None si está desactivado o el puerto está ocupado."""
+    if puerto <= 0:
+        return None
     try:
-        # Añade un retraso aleatorio antes de hacer la solicitud
-        time.sleep(random.uniform(0.3, 0.5)) # Retraso entre 0.3 y 0.5 segundos
+        servidor = ThreadingHTTPServer((host, puerto), ManejadorMetricas)
+    except OSError as e:
+        logging.error(f"No se puede abrir el servidor de métricas en {host}:{puerto}: {e}")
+        return None
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name='metricas', daemon=True).start()
+    logging.info(f"Métricas en http://{host}:{puerto}/metrics")
+    return servidor
 
-        # logging.info(f"Obteniendo detalles del hotel: {url}") # Corrección aquí
-        response = requests.get(url, headers=headers)
-        response.raise_for_status() # Lanza una excepción para códigos de estado incorrectos
+# Perfil activo durante la ejecución de scraping(), o None sin --profile
+_profiler = None
+# Traza de la última solicitud del contexto actual, para sumarle el tiempo de parseo de su página
+_traza = contextvars.ContextVar('traza', default=None)
+# Traza de la solicitud en curso en cada hilo, para las mediciones de DNS, conexión y TLS
+_medidas = threading.local()
+
+def _medir(campo, funcion):
+    """
+    Envuelve funcion para sumar su duración al campo de la traza en curso del hilo, descontando
+    el tiempo de las mediciones anidadas (p. ej. el DNS dentro de la conexión).
+    """
+    def envoltura(*args, **kwargs):
+        traza = getattr(_medidas, 'traza', None)
+        if traza is None:
+            return funcion(*args, **kwargs)
+        anidado = traza['dns_s'] + traza['conexion_s'] + traza['tls_s']
+        inicio = time.perf_counter()
+        try:
+            return funcion(*args, **kwargs)
+        finally:
+            medido = traza['dns_s'] + traza['conexion_s'] + traza['tls_s'] - anidado
+            traza[campo] += time.perf_counter() - inicio - medido
+    envoltura.original = funcion
+    return envoltura
+
+class RunProfiler:
+    """
+    Perfil de una ejecución con --profile: un cProfile por etapa (descarga, parseo y escritura) y una
+    traza por solicitud con el desglose de su tiempo (DNS, conexión, TLS, espera hasta las cabeceras,
+    descarga del cuerpo y parseo de la página). Se guardan en OUT_DIRECTORY/perfil_<AAAAMMDD_HHMMSS>/.
+    """
+
+    ETAPAS = ('descarga', 'parseo', 'escritura')
 
-        soup = BeautifulSoup(response.content, 'html.parser')
+    def __init__(self, directorio, top=PROFILE_TOP):
+        self.directorio = directorio
+        self.top = top
+        self._lock = threading.Lock()
+        self._perfiles = {} # (etapa, hilo) -> cProfile.Profile; cProfile solo perfila el hilo que lo activa
+        self.trazas = []
 
-        # Extrae puntos de datos adicionales de la página del hotel
-        # Necesitarás inspeccionar el HTML de la página individual de un hotel
-        # para encontrar los selectores correctos para cada punto de datos.
-        # Estos son selectores y lógica de marcador de posición.
+    def instrumentar(self):
+        """Mide la resolución DNS, la conexión TCP y el saludo TLS de las conexiones nuevas de urllib3."""
+        socket.getaddrinfo = _medir('dns_s', socket.getaddrinfo)
+        urllib3.util.connection.create_connection = _medir('conexion_s', urllib3.util.connection.create_connection)
+        urllib3.connection.HTTPSConnection.connect = _medir('tls_s', urllib3.connection.HTTPSConnection.connect)
 
-        # Destacados
+    def desinstrumentar(self):
+        socket.getaddrinfo = getattr(socket.getaddrinfo, 'original', socket.getaddrinfo)
+        urllib3.util.connection.create_connection = getattr(urllib3.util.connection.create_connection, 'original',
+                                                            urllib3.util.connection.create_connection)
+        urllib3.connection.HTTPSConnection.connect = getattr(urllib3.connection.HTTPSConnection.connect, 'original',
+                                                             urllib3.connection.HTTPSConnection.connect)
+
+    @contextlib.contextmanager
+    def etapa(self, nombre):
+        """Perfila con cProfile el bloque como parte de la etapa indicada."""
+        clave = (nombre, threading.get_ident())
+        perfil = self._perfiles.get(clave)
+        if perfil is None:
+            with self._lock:
+                perfil = self._perfiles.setdefault(clave, cProfile.Profile())
+        perfil.enable()
         try:
-            # Usa el selector corregido para el contenedor principal de Destacados
-            highlight_container = soup.select_one('span.hp__hotel_ratings.pp-header__badges.pp-header__badges--combined div[data-capla-component-boundary="b-property-web-property-page/Badges"]')
-            if highlight_container:
-                # Selecciona todos los elementos span o div dentro del contenedor
-                highlight_elements = highlight_container.select('span, div')
-                # Extrae el texto de cada elemento y almacénalo en una lista, filtrando cadenas vacías
-                extracted_highlights = [elem.get_text(strip=True) for elem in highlight_elements if elem.get_text(strip=True)]
-
-                # Filtra elementos que parecen estar concatenados (heurística: busca minúscula seguida de mayúscula sin espacio)
-                # Elimina duplicados
-                filtered_highlights = []
-                seen_highlights = set()
-                for highlight in extracted_highlights:
-                    # Verifica el patrón como "aB" (minúscula seguida de mayúscula)
-                    if re.search(r'[a-z][A-Z]', highlight):
-                        continue # Omite si se encuentra el patrón
-
-                    # Añade a la lista filtrada y al conjunto visto si no es un duplicado
-                    if highlight not in seen_highlights:
-                        filtered_highlights.append(highlight)
-                        seen_highlights.add(highlight)
-
-                details['Destacados'] = filtered_highlights
-            else:
-                details['Destacados'] = [] # Usa una lista vacía si no se encuentra el contenedor
+            yield
+        finally:
+            perfil.disable()
 
-        except Exception as e:
-            logging.error(f"Error obteniendo destacados del hotel: {e}")
-            details['Destacados'] = [] # Usa una lista vacía en caso de error
+    def empezar_traza(self, url, tipo):
+        traza = {'url': url, 'tipo': tipo, 'inicio': datetime.now().isoformat(timespec='milliseconds'),
+                 'dns_s': 0.0, 'conexion_s': 0.0, 'tls_s': 0.0, 'parseo_s': 0.0}
+        _medidas.traza = traza
+        _traza.set(traza)
+        with self._lock:
+            self.trazas.append(traza)
+        return traza
+
+    def terminar_traza(self, traza, response, total):
+        """Completa la traza: response.elapsed llega hasta las cabeceras y el resto del total es la descarga del cuerpo."""
+        _medidas.traza = None
+        conexion = traza['dns_s'] + traza['conexion_s'] + traza['tls_s']
+        traza['conexion_nueva'] = conexion > 0
+        traza['total_s'] = total
+        if response is None:
+            traza['estado'] = None
+            return
+        cabeceras = response.elapsed.total_seconds()
+        traza['estado'] = response.status_code
+        traza['espera_s'] = max(0.0, cabeceras - conexion)
+        traza['descarga_s'] = max(0.0, total - cabeceras)
+        traza['bytes'] = len(response.content)
+        response.traza = traza
+
+    def sumar_parseo(self, segundos):
+        traza = _traza.get()
+        if traza is not None:
+            traza['parseo_s'] += segundos
+
+    def guardar(self):
+        """Escribe los perfiles, las trazas y el resumen; retorna las líneas del resumen para el log."""
+        os.makedirs(self.directorio, exist_ok=True)
+        lineas = [f"{len(self.trazas)} solicitudes trazadas en {self.directorio}"]
+        for etapa in self.ETAPAS:
+            perfiles = [perfil for (nombre, _), perfil in self._perfiles.items() if nombre == etapa]
+            if not perfiles:
+                continue
+            with open(os.path.join(self.directorio, f"{etapa}.txt"), 'w', encoding='utf-8') as f:
+                stats = pstats.Stats(*perfiles, stream=f)
+                stats.dump_stats(os.path.join(self.directorio, f"{etapa}.pstats"))
+                stats.sort_stats('cumulative').print_stats(self.top)
+            lineas.append(f"etapa {etapa}: {stats.total_tt:.1f} s en {len(perfiles)} hilos (ver {etapa}.txt)")
+
+        with open(os.path.join(self.directorio, 'trazas.ndjson'), 'w', encoding='utf-8') as f:
+            for traza in self.trazas:
+                f.write(json.dumps(traza, ensure_ascii=False) + '\n')
+
+        completas = [traza for traza in self.trazas if 'total_s' in traza]
+        resumen = [f"Solicitudes más lentas (de {len(completas)}):"]
+        resumen += [_linea_traza(traza) for traza in sorted(completas, key=lambda t: t['total_s'], reverse=True)[:self.top]]
+        resumen.append("Páginas más lentas (descarga y parseo):")
+        resumen += [_linea_traza(traza) for traza in
+                    sorted(completas, key=lambda t: t['total_s'] + t['parseo_s'], reverse=True)[:self.top]]
+        with open(os.path.join(self.directorio, 'resumen.txt'), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lineas + resumen) + '\n')
+        return lineas + resumen
+
+def _linea_traza(traza):
+    ms = lambda campo: f"{traza.get(campo, 0) * 1000:.0f}"
+    return (f"{ms('total_s')} ms + {ms('parseo_s')} ms de parseo [{traza.get('estado')}] {traza['url']} "
+            f"(dns {ms('dns_s')}, conexión {ms('conexion_s')}, tls {ms('tls_s')}, espera {ms('espera_s')}, "
+            f"descarga {ms('descarga_s')} ms)")
+
+def etapa_perfil(nombre):
+    """Contexto que perfila el bloque como parte de una etapa con --profile; sin perfil no hace nada."""
+    return _profiler.etapa(nombre) if _profiler is not None else contextlib.nullcontext()
 
-        # marca
+def abrir_pacer():
+    """Restablece el limitador a REQUEST_RATE y crea el ritmo adaptativo, o retorna None si no se usa."""
+    _rate_limiter.set_rate(REQUEST_RATE)
+    if not ADAPTIVE_PACING or REQUEST_RATE <= 0:
+        return None
+    return AdaptivePacer(_rate_limiter, REQUEST_RATE_MIN, REQUEST_RATE_MAX, PACER_CONCURRENCY,
+                         PACER_MAX_CONCURRENCY, PACER_LATENCY_TARGET)
+
+# Caché de detalles activa durante la ejecución de scraping()
+_detail_cache = None
+
+def abrir_cache_detalles():
+    """Abre la caché de detalles en OUT_DIRECTORY, o devuelve None si está desactivada o no se puede usar."""
+    if DETAIL_CACHE_TTL <= 0:
+        return None
+    try:
+        # Con SHARDING se leen también las cachés de las demás réplicas
+        otras = (lambda: rutas_replicas(OUT_DIRECTORY, DETAIL_CACHE_FILENAME)) if SHARDING else None
+        return DetailCache(os.path.join(OUT_DIRECTORY, nombre_replica(DETAIL_CACHE_FILENAME)), DETAIL_CACHE_TTL,
+                           DETAIL_CACHE_MAX_ITEMS, otras)
+    except (IOError, OSError) as e:
+        logging.error(f"No se puede abrir la caché de detalles, se continúa sin ella: {e}")
+        return None
+
+# Caché HTTP de páginas de hotel activa durante la ejecución de scraping()
+_http_cache = None
+
+def abrir_cache_http():
+    """Abre la caché HTTP en OUT_DIRECTORY, o devuelve None si está desactivada o no se puede usar."""
+    if not HTTP_CACHE:
+        return None
+    try:
+        return HttpCache(os.path.join(OUT_DIRECTORY, HTTP_CACHE_DIRNAME))
+    except (IOError, OSError) as e:
+        logging.error(f"No se puede abrir la caché HTTP, se continúa sin ella: {e}")
+        return None
+
+def revalidacion_hotel(hotel_id):
+    """Entrada de la caché HTTP del hotel y cabeceras condicionales con las que revalidarla."""
+    cache = _http_cache
+    if cache is None or not hotel_id:
+        return None, None
+    entrada = cache.get(hotel_id)
+    return entrada, cache.condiciones(entrada)
+
+def detalles_de_respuesta(hotel_id, entrada, response):
+    """
+    Detalles del hotel a partir de la respuesta a su página. En un 304 se reutilizan los detalles
+    guardados en la caché HTTP sin parsear; en un 200 se parsea y se actualiza la caché.
+    """
+    cache = _http_cache
+    if response.status_code == 304 and entrada is not None:
+        cache.revalidada(entrada)
+        if entrada.get('detalles') is not None:
+            return entrada['detalles']
         try:
-            brand_element = soup.select_one('div.d7b319a0ec div.b08850ce41')
-            details['marca'] = brand_element.get_text(strip=True) if brand_element else None
-        except Exception as e:
-            logging.error(f"Error obteniendo marca del hotel: {e}")
-            details['marca'] = None
+            return parse_hotel_details(cache.cuerpo(hotel_id))
+        except (IOError, OSError) as e:
+            logging.error(f"No se puede leer la página del hotel {hotel_id} de la caché HTTP: {e}")
+            return None
 
-        # Coordenadas
+    details = parse_hotel_details(response.content)
+    guardar_cache_http(hotel_id, response, details)
+    return details
+
+def guardar_cache_http(hotel_id, response, details):
+    """Guarda la página del hotel y sus detalles extraídos en la caché HTTP, si está activa."""
+    if _http_cache is not None and hotel_id:
         try:
-            coords_element = soup.select_one('a#map_trigger_header_pin')
-            coords_data = None
-            if coords_element and 'data-atlas-latlng' in coords_element.attrs:
-                coords_str = coords_element['data-atlas-latlng']
-                if coords_str:
-                    lat, lon = coords_str.split(',')
-                    details['lat'] = float(lat)
-                    details['lon'] = float(lon)
-            else:
-                # Alternativa a las meta tags si no se encuentra el selector principal
-                lat_meta = soup.find('meta', {'property': 'booking_com:location:latitude'})
-                lon_meta = soup.find('meta', {'property': 'booking_com:location:longitude'})
-                coords_content = None
-                if lat_meta and 'content' in lat_meta.attrs and lon_meta and 'content' in lon_meta.attrs:
-                    coords_content = f"{lat_meta['content']},{lon_meta['content']}"
-
-                if not coords_content or coords_content == ',':
-                     # Intenta meta tag alternativa
-                     geo_position_meta = soup.find('meta', {'name': 'geo.position'})
-                     if geo_position_meta and 'content' in geo_position_meta.attrs:
-                          coords_content = geo_position_meta['content']
-
-                if coords_content and coords_content != ',':
-                    lat, lon = coords_content.split(',')
-                    details['lat'] = float(lat)
-                    details['lon'] = float(lon)
+            _http_cache.put(hotel_id, response, details)
+        except (IOError, OSError) as e:
+            logging.error(f"Error guardando la página del hotel {hotel_id} en la caché HTTP: {e}")
 
-        except Exception as e:
-            logging.error(f"Error obteniendo coordenadas del hotel: {e}")
-            details['lat'] = None
-            details['lon'] = None
+def guardar_cache_detalles(hotel_id, details):
+    """Guarda los detalles del hotel en la caché de detalles, si está activa y hay detalles."""
+    if details is not None and _detail_cache is not None:
+        try:
+            _detail_cache.put(hotel_id, details)
+        except (IOError, OSError) as e:
+            logging.error(f"Error guardando detalles del hotel {hotel_id} en caché: {e}")
+
+def contar_detalles_compartidos():
+    """Anota en la caché de detalles, si está activa, una consulta resuelta por la descarga en curso de otro trabajo."""
+    if _detail_cache is not None:
+        _detail_cache.compartido()
+
+# Descargas de detalles en curso en modo síncrono: id de hotel -> Future con los detalles
+_detalles_en_curso = {}
+_detalles_en_curso_lock = threading.Lock()
+
+def get_hotel_details(hotel_id, url):
+    """
+    Devuelve los detalles del hotel desde la caché si están vigentes; si no, los extrae
+    con scrape_hotel_details y los guarda en la caché. Si otro hilo ya está descargando
+    el mismo hotel se espera a su resultado en lugar de repetir la descarga.
+    """
+    if not hotel_id:
+        return scrape_hotel_details(url)
+
+    with _detalles_en_curso_lock:
+        future = _detalles_en_curso.get(hotel_id)
+        propietario = future is None
+        if propietario:
+            future = _detalles_en_curso[hotel_id] = Future()
+    if not propietario:
+        contar_detalles_compartidos()
+        return future.result()
+
+    try:
+        details = _get_hotel_details_sin_duplicados(hotel_id, url)
+        future.set_result(details)
+        return details
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _detalles_en_curso_lock:
+            del _detalles_en_curso[hotel_id]
+
+def _get_hotel_details_sin_duplicados(hotel_id, url):
+    cache = _detail_cache
+    if cache is not None:
+        details = cache.get(hotel_id)
+        if details is not None:
+            return details
+
+    details = scrape_hotel_details(url, hotel_id)
+    guardar_cache_detalles(hotel_id, details)
+    return details
 
-        # Servicios populares
+def pedir_detalles(hotel_id, url):
+    """
+    Versión del modo PIPELINE de get_hotel_details: retorna enseguida un Future con los detalles del hotel
+    (o None). Si no están en la caché de detalles, la página se descarga en un hilo de _pipeline y se parsea
+    en su pool de procesos; el hilo queda libre para la siguiente descarga mientras tanto.
+    """
+    future = Future()
+    if hotel_id:
+        with _detalles_en_curso_lock:
+            en_curso = _detalles_en_curso.get(hotel_id)
+            if en_curso is None:
+                _detalles_en_curso[hotel_id] = future
+        if en_curso is not None:
+            contar_detalles_compartidos()
+            return en_curso
+        details = _detail_cache.get(hotel_id) if _detail_cache is not None else None
+        if details is not None:
+            _terminar_detalles(hotel_id, future, details)
+            return future
+    _pipeline.descargas.submit(_descargar_detalles, hotel_id, url, future)
+    return future
+
+def _terminar_detalles(hotel_id, future, details=None, error=None):
+    if hotel_id:
+        with _detalles_en_curso_lock:
+            _detalles_en_curso.pop(hotel_id, None)
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(details)
+
+def _descargar_detalles(hotel_id, url, future):
+    """Etapa de descarga de pedir_detalles: trae la página y encola su parseo sin esperar al resultado."""
+    try:
+        entrada, cabeceras = revalidacion_hotel(hotel_id)
         try:
-            amenities_list = soup.select('div.hp--popular_facilities ul.e9f7361569 li.b0bf4dc58f div.aa8988bf9c span.f006e3fcbd')
-            details['Servicios populares'] = [amenity.get_text(strip=True) for amenity in amenities_list] if amenities_list else [] # Usa una lista vacía si no se encuentra ninguno
-        except Exception as e:
-            logging.error(f"Error obteniendo servicios populares del hotel: {e}")
-            details['Servicios populares'] = [] # Usa una lista vacía en caso de error
+            response = fetch_response(url, cabeceras)
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Error al obtener la página del hotel {url}: {e}")
+            _terminar_detalles(hotel_id, future)
+            return
+        if _profiler is not None:
+            _traza.set(getattr(response, 'traza', None))
+        if response.status_code == 304 and entrada is not None:
+            details = detalles_de_respuesta(hotel_id, entrada, response)
+            guardar_cache_detalles(hotel_id, details)
+            _terminar_detalles(hotel_id, future, details)
+            return
+        backend, subarbol, etiqueta, paridad = opciones_parseo()
+        parseo = _pipeline.extraer(extract_hotel_details, 'hotel', response.content, backend, subarbol, etiqueta, paridad, ())
+    except BaseException as e:
+        _terminar_detalles(hotel_id, future, error=e)
+        return
 
-        # Descripción
+    def _parseado(parseo):
         try:
-            description_element = soup.select_one('p[data-testid="property-description"]')
-            details['Descripción'] = description_element.get_text(strip=True) if description_element else None
+            details = parseo.result()
         except Exception as e:
-            logging.error(f"Error obteniendo descripción del hotel: {e}")
-            details['Descripción'] = None
+            logging.error(f"Error al parsear la página del hotel {url}: {e}")
+            _terminar_detalles(hotel_id, future)
+            return
+        guardar_cache_http(hotel_id, response, details)
+        guardar_cache_detalles(hotel_id, details)
+        _terminar_detalles(hotel_id, future, details)
+
+    parseo.add_done_callback(_parseado)
+
+# Caché de resolución DNS en proceso: (host, puerto, ...) -> (caducidad, resultado de getaddrinfo)
+_dns_cache = {}
+_dns_lock = threading.Lock()
+_dns_stats = {'aciertos': 0, 'fallos': 0, 'obsoletos': 0}
+_getaddrinfo_original = socket.getaddrinfo
+
+def _getaddrinfo_cacheado(host, port, family=0, type=0, proto=0, flags=0):
+    """
+    Sustituto de socket.getaddrinfo que reutiliza las resoluciones durante DNS_CACHE_TTL segundos.
+    Si el DNS falla y hay una resolución anterior, se usa esa aunque haya caducado.
+    """
+    clave = (host, port, family, type, proto, flags)
+    ahora = time.monotonic()
+    with _dns_lock:
+        entrada = _dns_cache.get(clave)
+        if entrada is not None and entrada[0] > ahora:
+            _dns_stats['aciertos'] += 1
+            return entrada[1]
+    try:
+        resultado = _getaddrinfo_original(host, port, family, type, proto, flags)
+    except socket.gaierror:
+        if entrada is None:
+            raise
+        with _dns_lock:
+            _dns_stats['obsoletos'] += 1
+        logging.warning(f"Fallo de DNS para {host}, se usa la última resolución conocida.")
+        return entrada[1]
+    with _dns_lock:
+        _dns_cache[clave] = (ahora + DNS_CACHE_TTL, resultado)
+        _dns_stats['fallos'] += 1
+    return resultado
+
+# Sesión HTTP activa durante la ejecución de scraping()
+_http_session = None
+
+def abrir_sesion_http():
+    """
+    Crea la sesión HTTP de la ejecución: pool de conexiones keep-alive, compresión gzip/brotli,
+    cookies persistidas en OUT_DIRECTORY y caché de resolución DNS.
+    """
+    if DNS_CACHE_TTL > 0:
+        socket.getaddrinfo = _getaddrinfo_cacheado
 
-        # Dirección (from hotel page)
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    # Un único agente de usuario por ejecución, coherente con las cookies de la sesión
+    session.headers.update(get_request_headers())
+    session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+
+    session.cookies = LWPCookieJar(os.path.join(OUT_DIRECTORY, nombre_replica(COOKIES_FILENAME)))
+    if os.path.exists(session.cookies.filename):
         try:
-            address_container = soup.select_one('div.b99b6ef58f.cb4b7a25d9')
-            if address_container:
-                full_text = address_container.get_text(strip=True)
-                # Encuentra el segundo div dentro del contenedor
-                second_div = address_container.select_one('div:nth-of-type(2)')
-                if second_div:
-                    second_div_text = second_div.get_text(strip=True)
-                    # Divide el texto completo por el texto del segundo div
-                    address_parts = full_text.split(second_div_text, 1)
-                    if address_parts:
-                        extracted_address = address_parts[0].strip()
-                    else:
-                        extracted_address = full_text.strip() # Alternativa si la división falla
-                else:
-                    extracted_address = full_text.strip() # Si no hay segundo div, toma todo el texto
-
-                # Encuentra "España" y trunca
-                if extracted_address:
-                    espana_index = extracted_address.find('España')
-                    if espana_index != -1:
-                        # Incluye "España" en el resultado
-                        details['Dirección_detalle'] = extracted_address[:espana_index + len('España')]
-                    else:
-                        details['Dirección_detalle'] = extracted_address # Mantiene el original si no se encuentra "España"
-                else:
-                    details['Dirección_detalle'] = None # Mantiene None si no se extrajo dirección
-            else:
-                details['Dirección_detalle'] = None
-        except Exception as e:
-            logging.error(f"Error obteniendo dirección del hotel: {e}")
-            details['Dirección_detalle'] = None
+            session.cookies.load(ignore_discard=True)
+            logging.info(f"Cargadas {len(session.cookies)} cookies de la ejecución anterior.")
+        except (IOError, OSError) as e:
+            logging.error(f"No se pueden cargar las cookies de {session.cookies.filename}: {e}")
+    return session
 
-        # Precio (Ya extraído de los resultados de búsqueda, pero se confirma el selector si es necesario)
-        # El precio en la página individual podría ser diferente o más detallado.
-        # Por ahora, nos basaremos en el precio de los resultados de búsqueda como se solicitó inicialmente.
-        # Si se necesita un precio más específico de la página del hotel, esta sección se actualizaría.
-        # try:
-        #     price_element = soup.select_one('selector_for_price_on_hotel_page')
-        #     details['Precio'] = price_element.get_text(strip=True) if price_element else None
-        # except Exception as e:
-        #     details['Precio'] = None
+def estadisticas_conexiones(session):
+    """Devuelve (solicitudes, conexiones nuevas) acumuladas en los pools de conexiones de la sesión."""
+    solicitudes = 0
+    conexiones = 0
+    for adapter in set(session.adapters.values()):
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools[key]
+            solicitudes += pool.num_requests
+            conexiones += pool.num_connections
+    return solicitudes, conexiones
 
+def cerrar_sesion_http(session):
+    """Guarda las cookies de la sesión, registra la reutilización de conexiones y cierra la sesión."""
+    try:
+        session.cookies.save(ignore_discard=True)
+    except (IOError, OSError) as e:
+        logging.error(f"No se pueden guardar las cookies en {session.cookies.filename}: {e}")
 
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Error al obtener la página del hotel {url}: {e}")
-        return None
+    solicitudes, conexiones = estadisticas_conexiones(session)
+    reutilizadas = max(solicitudes - conexiones, 0)
+    ratio = (reutilizadas / solicitudes * 100) if solicitudes else 0.0
+    logging.info(f"Conexiones HTTP: {solicitudes} solicitudes, {conexiones} conexiones nuevas, "
+                 f"{reutilizadas} reutilizadas ({ratio:.1f}% sin handshake TCP/TLS).")
+    if DNS_CACHE_TTL > 0:
+        logging.info(f"Caché DNS: {_dns_stats['aciertos']} aciertos, {_dns_stats['fallos']} resoluciones, "
+                     f"{_dns_stats['obsoletos']} resoluciones obsoletas usadas por fallo de DNS.")
+    session.close()
 
-    return details
+def get_request_headers():
+    """Cabeceras HTTP con un agente de usuario aleatorio."""
+    return {
+        'User-Agent': random.choice(USER_AGENTS)
+    }
 
-def scraping():
-    configurar_logging()
+def fetch_page(url):
+    """
+    Descarga una página de Booking.com respetando el retraso entre solicitudes.
 
-    logging.info("Inicio de scraper booking.")
+    Parámetros:
+        url (str): La URL de la página.
 
-    # Obtiene la fecha de hoy como fecha de entrada inicial
-    start_date = date.today()
+    Retorna:
+        bytes: El contenido de la respuesta.
 
-    # Lista de IDs de destino para las provincias a extraer
-    # '1363': 'Almería'
-    # '755': 'Granada'
-    dest_ids_to_scrape = ['1363', '755', '766', '747', '774', '758', '750', '759']
-    # dest_ids_to_scrape = ['1363'] #['1363'] # Descomenta esta línea y comenta la anterior para extraer solo Almería
+    Lanza:
+        requests.exceptions.RequestException: Si la solicitud falla o devuelve un código de estado incorrecto.
+    """
+    return fetch_response(url).content
 
-    # Extrae para cada provincia y para X días consecutivos
-    for dest_id in dest_ids_to_scrape:
-        province_name = get_province_from_dest_id(dest_id)
-        # Bucle para N días consecutivos (i va de 0 a 2)
-        for i in range(30): # Cambiado a range(N) para N días
-            checkin_date = start_date + timedelta(days=i)
-            checkout_date = checkin_date + timedelta(days=1) # Estancia de 1 día
-
-            checkin_str = checkin_date.strftime("%Y-%m-%d")
-            checkout_str = checkout_date.strftime("%Y-%m-%d")
-
-            logging.info(f"Iniciando scraping para {province_name} para el {checkin_str}")
-            hotels_data = scrape_booking_region(dest_id, checkin_str, checkout_str)
-
-            if hotels_data:
-                # Define el nombre del archivo basado en la provincia y la fecha de entrada
-                json_filename = f"{province_name.lower().replace(' ', '_')}_{checkin_date.strftime('%Y%m%d')}.ndjson" # Usando .jsonl para JSON delimitado por líneas
-                full_json_path = os.path.join(OUT_DIRECTORY, json_filename)
-                with open(full_json_path, 'w', encoding='utf-8') as f:
-                    for hotel in hotels_data:
-                        # print(f"Escribiendo datos del hotel en JSON: {hotel}") # Impresión de depuración para los datos del hotel antes de escribir
-                        try:
-                            linea_json = json.dumps(hotel, ensure_ascii=False)
-                            f.write(linea_json + "\n")
-                        except Exception as e:
-                            print(f"Error escribiendo datos del hotel en JSON: {e} para el hotel: {hotel.get('nombre', 'N/A')}")
-                logging.info(f"Fin de scraping para {province_name} para el {checkin_str}. Guardado en {full_json_path}")
+def fetch_response(url, headers=None):
+    """
+    Como fetch_page, pero con cabeceras adicionales (p. ej. condicionales) y devolviendo la respuesta completa.
+    Una respuesta 304 no se considera un error. Los errores transitorios (tiempo de espera agotado, error de
+    conexión, 429 o 5xx) se reintentan hasta FETCH_RETRIES veces con espera exponencial.
+    """
+    intento = 0
+    while True:
+        circuit = _circuit
+        if circuit is not None:
+            circuit.acquire()
+        try:
+            response = _fetch_once(url, headers)
+        except requests.exceptions.RequestException as e:
+            _fetch_stats.registrar(e)
+            transitorio = error_transitorio(e)
+            if circuit is not None and transitorio:
+                circuit.fallo()
+            elif circuit is not None:
+                circuit.exito()
+            if not transitorio or intento >= FETCH_RETRIES:
+                if transitorio:
+                    _fetch_stats.contar('fallidas')
+                raise
+            espera = espera_reintento(intento, e)
+            intento += 1
+            _fetch_stats.contar('reintentos')
+            _metrics.inc('scraper_retries_total', tipo=tipo_de_url(url))
+            logging.warning(f"Reintento {intento}/{FETCH_RETRIES} de {url} en {espera:.1f} s: {e}")
+            time.sleep(espera)
+            continue
+        except BaseException:
+            if circuit is not None:
+                circuit.cancelar()
+            raise
+        _fetch_stats.registrar()
+        if circuit is not None:
+            circuit.exito()
+        return response
+
+def _fetch_once(url, headers=None):
+    """Un único intento de descarga de fetch_response."""
+    session = _http_session
+    tipo = tipo_de_url(url)
+    profiler = _profiler
+    # Espera turno en el limitador global (y en el ritmo adaptativo) en lugar de un retraso fijo por solicitud
+    pacer = _pacer
+    if pacer is not None:
+        pacer.acquire()
+    else:
+        _rate_limiter.acquire()
+
+    inicio = time.monotonic()
+    estado = retry_after = response = traza = None
+    en_vuelo = False
+    try:
+        # Desde aquí cualquier excepción pasa por el finally, que devuelve el hueco al ritmo adaptativo
+        traza = profiler.empezar_traza(url, tipo) if profiler is not None else None
+        _metrics.inc('scraper_requests_in_flight')
+        en_vuelo = True
+        timeout = (FETCH_CONNECT_TIMEOUT, FETCH_READ_TIMEOUT)
+        with etapa_perfil('descarga'):
+            if session is not None:
+                response = session.get(url, headers=headers, timeout=timeout)
             else:
-                logging.error(f"Error al obtener datos para {province_name} para el {checkin_str}")
-    logging.info("Fin de scraper booking.")
+                response = requests.get(url, headers={**get_request_headers(), **(headers or {})}, timeout=timeout)
+        estado = response.status_code
+        retry_after = response.headers.get('Retry-After')
+    finally:
+        duracion = time.monotonic() - inicio
+        if pacer is not None:
+            pacer.release(duracion, estado, retry_after)
+        if traza is not None:
+            profiler.terminar_traza(traza, response, duracion)
+        if en_vuelo:
+            _metrics.inc('scraper_requests_in_flight', -1)
+        _metrics.observe('scraper_fetch_seconds', duracion, tipo=tipo)
+        _metrics.inc('scraper_requests_total', tipo=tipo, estado=str(estado or 'error'))
+        _metrics.set('scraper_last_progress_timestamp_seconds', time.time())
+    _metrics.inc('scraper_bytes_downloaded_total', len(response.content), tipo=tipo)
+    _fetch_stats.observar(tipo, duracion, len(response.content))
+    response.raise_for_status() # Lanza una excepción para códigos de estado incorrectos
+    return response
 
-if __name__ == "__main__":
-    scraping()
-    # Descomentar el siguiente bloque en producción
-    schedule.every().day.at("00:30").do(scraping)
-    while True:
-        schedule.run_pending()
-        time.sleep(60)  # Espera 60 segundos entre comprobaciones
\ No newline at end of file
+class SelectolaxNode:
+    """
+    Adaptador de un nodo de selectolax (Lexbor) con el subconjunto de la API de BeautifulSoup
+    que usan los extractores: select, select_one, get_text, attrs y acceso por clave a los atributos.
+    """
+
+    __slots__ = ('_node',)
+
+    def __init__(self, node):
+        self._node = node
+
+    def _es_el_mismo(self, node):
+        # Lexbor incluye el propio nodo en los resultados si coincide con el selector; BeautifulSoup no.
+        # La raíz del documento (el parser) no tiene mem_id y nunca coincide.
+        mem_id = getattr(self._node, 'mem_id', None)
+        return mem_id is not None and node.mem_id == mem_id
+
+    def select(self, selector):
+        if selector.startswith(':scope > '):
+            # Lexbor no admite :scope; se resuelve como hijos directos con esa etiqueta
+            tag = selector[len(':scope > '):]
+            return [SelectolaxNode(child) for child in self._node.iter() if child.tag == tag]
+        return [SelectolaxNode(node) for node in self._node.css(selector) if not self._es_el_mismo(node)]
+
+    def select_one(self, selector):
+        if selector.startswith(':scope > '):
+            matches = self.select(selector)
+            return matches[0] if matches else None
+        node = self._node.css_first(selector)
+        if node is not None and self._es_el_mismo(node):
+            matches = self._node.css(selector)
+            node = matches[1] if len(matches) > 1 else None
+        return SelectolaxNode(node) if node is not None else None
+
+    def get_text(self, separator='', strip=False):
+        return self._node.text(deep=True, separator=separator, strip=strip)
+
+    @property
+    def attrs(self):
+        return self._node.attributes
+
+    def __getitem__(self, key):
+        return self._node.attributes[key]
+
+def _parse_selectolax(content):
+    return SelectolaxNode(LexborHTMLParser(content))
+
+# Backends de parseo disponibles: nombre -> función que construye el árbol a partir del HTML
+PARSER_BACKENDS = {
+    'html.parser': lambda content: BeautifulSoup(content, 'html.parser'),
+    'lxml': lambda content: BeautifulSoup(content, 'lxml'),
+    'selectolax': _parse_selectolax,
+}
+
+def parser_backend_available(backend):
+    """Indica si el backend de parseo existe y su dependencia opcional está instalada."""
+    if backend == 'lxml':
+        try:
+            import lxml # noqa: F401
+        except ImportError:
+            return False
+        return True
+    if backend == 'selectolax':
+        return LexborHTMLParser is not None
+    return backend in PARSER_BACKENDS
+
+# Regiones de cada tipo de página que usan los extractores: (etiqueta, atributo, valor).
+# Para 'class' basta con que el valor sea una de las clases del elemento; None acepta cualquier elemento de la etiqueta.
+SEARCH_REGIONS = (
+    ('div', 'data-testid', 'property-card'), # Tarjetas de hotel
+    ('h1', None, None), # Número total de resultados
+)
+HOTEL_REGIONS = (
+    ('span', 'class', 'hp__hotel_ratings'), # Destacados
+    ('div', 'class', 'd7b319a0ec'), # Marca
+    ('a', 'id', 'map_trigger_header_pin'), # Coordenadas
+    ('meta', 'property', 'booking_com:location:latitude'),
+    ('meta', 'property', 'booking_com:location:longitude'),
+    ('meta', 'name', 'geo.position'),
+    ('div', 'class', 'hp--popular_facilities'), # Servicios populares
+    ('p', 'data-testid', 'property-description'), # Descripción
+    ('div', 'class', 'b99b6ef58f'), # Dirección
+)
+PAGE_REGIONS = {
+    'busqueda': SEARCH_REGIONS,
+    'hotel': HOTEL_REGIONS,
+}
+
+class RegionStrainer(SoupStrainer):
+    """
+    SoupStrainer que solo crea los elementos de las regiones indicadas (con todo su contenido),
+    de modo que BeautifulSoup no construye el resto del documento.
+    """
+
+    def __init__(self, regions):
+        self._reglas = {}
+        for tag, attr, value in regions:
+            self._reglas.setdefault(tag, []).append((attr, value))
+        # BeautifulSoup < 4.13 llama a name(etiqueta, atributos); las versiones posteriores usan allow_tag_creation
+        super().__init__(name=self._coincide)
+
+    def _coincide(self, name, attrs=None):
+        reglas = self._reglas.get(name)
+        if not reglas or attrs is None:
+            return False
+        for attr, value in reglas:
+            if attr is None:
+                return True
+            actual = attrs.get(attr)
+            if actual is None:
+                continue
+            if attr == 'class':
+                clases = actual.split() if isinstance(actual, str) else actual
+                if value in clases:
+                    return True
+            elif actual == value:
+                return True
+        return False
+
+    def allow_tag_creation(self, nsprefix, name, attrs):
+        return self._coincide(name, attrs if attrs is not None else {})
+
+    def allow_string_creation(self, string):
+        # El texto fuera de las regiones no se conserva
+        return False
+
+# Strainers reutilizables por tipo de página
+PAGE_STRAINERS = {kind: RegionStrainer(regions) for kind, regions in PAGE_REGIONS.items()}
+
+def parse_html(content, backend=None, kind=None):
+    """
+    Construye el árbol del documento con el backend indicado (por defecto PARSER_BACKEND).
+
+    Si se indica el tipo de página ('busqueda' u 'hotel'), los backends de BeautifulSoup solo
+    construyen los subárboles de PAGE_REGIONS. selectolax siempre construye el documento completo,
+    ya que su parser en C no admite árboles parciales.
+    """
+    backend = backend or PARSER_BACKEND
+    if kind is not None and backend in ('html.parser', 'lxml'):
+        return BeautifulSoup(content, backend, parse_only=PAGE_STRAINERS[kind])
+    return PARSER_BACKENDS[backend](content)
+
+def measure_parse(content, kind, backend=None, repeticiones=3):
+    """
+    Compara el parseo del documento completo con el parseo de subárboles sobre una página.
+
+    Retorna:
+        dict: Para 'completo' y 'subarbol', el mejor tiempo de parseo y extracción en segundos y el pico
+              de memoria reservada durante el parseo en bytes; 'iguales' indica si se extrajeron los mismos campos.
+    """
+    extractor = PAGE_EXTRACTORS[kind]
+    resultado = {}
+    extraidos = {}
+    for modo, tipo in (('completo', None), ('subarbol', kind)):
+        mejor = None
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            extraidos[modo] = extractor(parse_html(content, backend, tipo))
+            duracion = time.perf_counter() - inicio
+            mejor = duracion if mejor is None else min(mejor, duracion)
+        tracemalloc.start()
+        try:
+            arbol = parse_html(content, backend, tipo)
+            pico = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        del arbol
+        resultado[modo] = {'segundos': mejor, 'pico_bytes': pico}
+    resultado['iguales'] = not diff_fields(extraidos['completo'], extraidos['subarbol'])
+    return resultado
+
+class ParseStats:
+    """Tiempos de parseo por backend y tipo de página, y discrepancias del modo de paridad."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.tiempos = {} # (backend, tipo) -> [páginas, segundos]
+        self.paginas_comparadas = 0
+        self.discrepancias = {} # (tipo, campo) -> número de páginas con el campo distinto
+
+    def record(self, backend, kind, seconds):
+        _metrics.observe('scraper_parse_seconds', seconds, tipo=kind, backend=backend)
+        with self._lock:
+            entrada = self.tiempos.setdefault((backend, kind), [0, 0.0])
+            entrada[0] += 1
+            entrada[1] += seconds
+
+    def record_parity(self, kind, campos):
+        with self._lock:
+            self.paginas_comparadas += 1
+            for campo in campos:
+                self.discrepancias[(kind, campo)] = self.discrepancias.get((kind, campo), 0) + 1
+
+    def resumen(self):
+        """Líneas de texto con los tiempos medios y las discrepancias para el log."""
+        with self._lock:
+            lineas = [f"{backend} ({kind}): {paginas} páginas, {segundos / paginas * 1000:.1f} ms de media"
+                      for (backend, kind), (paginas, segundos) in sorted(self.tiempos.items())]
+            if self.paginas_comparadas:
+                detalle = ', '.join(f"{kind}.{campo}: {n}" for (kind, campo), n in sorted(self.discrepancias.items())) or 'ninguna'
+                lineas.append(f"paridad: {self.paginas_comparadas} páginas comparadas, discrepancias por campo: {detalle}")
+            return lineas
+
+_parse_stats = ParseStats()
+
+def diff_fields(primario, secundario):
+    """Devuelve los campos cuyo valor difiere entre dos extracciones (dict de detalles o lista de tarjetas)."""
+    if isinstance(primario, dict):
+        return sorted(k for k in set(primario) | set(secundario) if primario.get(k) != secundario.get(k))
+    campos = set()
+    if len(primario) != len(secundario):
+        campos.add('numero_tarjetas')
+    for tarjeta_a, tarjeta_b in zip(primario, secundario):
+        campos.update(diff_fields(tarjeta_a, tarjeta_b))
+    return sorted(campos)
+
+def opciones_parseo(backend=None):
+    """
+    Opciones con las que se parsea una página: (backend, si se construyen solo subárboles, etiqueta para
+    las estadísticas, backend de paridad o None si esta página no se compara).
+    """
+    backend = backend or PARSER_BACKEND
+    subarbol = PARSE_SUBTREES and backend in ('html.parser', 'lxml')
+    etiqueta = f"{backend}+subarbol" if subarbol else backend
+    paridad = None
+    if PARSER_PARITY and PARSER_PARITY != etiqueta and random.random() < PARSER_PARITY_SAMPLE:
+        paridad = PARSER_PARITY
+    return backend, subarbol, etiqueta, paridad
+
+def extraer_pagina(extractor, kind, content, backend, subarbol, paridad, args):
+    """
+    Construye el árbol, aplica el extractor y, con paridad, repite la extracción con ese backend sobre
+    el documento completo. Se ejecuta en el hilo de la descarga o en un proceso del pool de parseo.
+
+    Retorna:
+        tuple: (resultado, segundos de parseo, segundos de la paridad o None, campos que difieren)
+    """
+    inicio = time.perf_counter()
+    result = extractor(parse_html(content, backend, kind if subarbol else None), *args)
+    segundos = time.perf_counter() - inicio
+    if paridad is None:
+        return result, segundos, None, []
+    inicio = time.perf_counter()
+    result_parity = extractor(parse_html(content, paridad), *args)
+    segundos_paridad = time.perf_counter() - inicio
+    if kind == 'busqueda':
+        campos = diff_fields(result[0], result_parity[0])
+    else:
+        campos = diff_fields(result, result_parity)
+    return result, segundos, segundos_paridad, campos
+
+def _extraer_en_proceso(*argumentos):
+    """extraer_pagina en un proceso del pool de parseo; devuelve también los fallos por campo, que se cuentan allí."""
+    global _field_failures
+    _field_failures = FieldFailures()
+    return extraer_pagina(*argumentos), _field_failures.fallos
+
+def registrar_parseo(kind, etiqueta, paridad, extraccion):
+    """Anota los tiempos y las discrepancias de paridad de una extracción (ver extraer_pagina) y retorna su resultado."""
+    result, segundos, segundos_paridad, campos = extraccion
+    _parse_stats.record(etiqueta, kind, segundos)
+    if _profiler is not None:
+        _profiler.sumar_parseo(segundos)
+    if segundos_paridad is not None:
+        _parse_stats.record(paridad, kind, segundos_paridad)
+        _parse_stats.record_parity(kind, campos)
+        if campos:
+            logging.warning(f"Paridad de parser ({kind}): {etiqueta} y {paridad} difieren en {', '.join(campos)}")
+    return result
+
+def run_parser(extractor, kind, content, backend, *args):
+    """
+    Construye el árbol con el backend indicado, aplica el extractor y registra el tiempo de parseo.
+    Con PARSER_PARITY se repite la extracción con el segundo backend sobre el documento completo
+    y se registran los campos que difieren. En el modo PIPELINE el parseo se hace en el pool de
+    procesos y este hilo espera al resultado.
+    """
+    backend, subarbol, etiqueta, paridad = opciones_parseo(backend)
+    if _pipeline is not None:
+        return _pipeline.extraer(extractor, kind, content, backend, subarbol, etiqueta, paridad, args).result()
+    with etapa_perfil('parseo'):
+        extraccion = extraer_pagina(extractor, kind, content, backend, subarbol, paridad, args)
+    return registrar_parseo(kind, etiqueta, paridad, extraccion)
+
+class ParsePipeline:
+    """
+    Etapas del modo PIPELINE: un pool de hilos que descarga las páginas de hotel y un pool de procesos que
+    las parsea, de modo que un hilo no espera al parseo de una página para pedir la siguiente y el parseo
+    usa todos los núcleos. Las páginas descargadas esperan a un proceso en una cola acotada
+    (PIPELINE_QUEUE_SIZE): si está llena, el hilo que trae otra se bloquea hasta que se libera un hueco,
+    así que la memoria no crece aunque la descarga vaya por delante del parseo.
+    """
+
+    def __init__(self, descargadores, procesos, cola):
+        self.procesos = procesos or os.cpu_count() or 1
+        self.descargas = ThreadPoolExecutor(max_workers=descargadores, thread_name_prefix='descarga')
+        # spawn en lugar de fork: el proceso ya tiene hilos en marcha (métricas, descargas)
+        self.parseo = ProcessPoolExecutor(max_workers=self.procesos, mp_context=multiprocessing.get_context('spawn'))
+        self._cola = threading.BoundedSemaphore(cola)
+        self._lock = threading.Lock()
+        self.paginas = 0
+        self.esperas = 0
+        self.segundos_espera = 0.0
+
+    def extraer(self, extractor, kind, content, backend, subarbol, etiqueta, paridad, args):
+        """
+        Encola la extracción de una página en el pool de procesos, esperando antes a que haya hueco en la cola.
+
+        Retorna:
+            Future: El resultado del extractor, con los tiempos y fallos ya anotados en las estadísticas.
+        """
+        if not self._cola.acquire(blocking=False):
+            inicio = time.monotonic()
+            self._cola.acquire()
+            with self._lock:
+                self.esperas += 1
+                self.segundos_espera += time.monotonic() - inicio
+        _metrics.inc('scraper_parse_queue')
+        traza = _traza.get()
+        resultado = Future()
+
+        def _terminado(future):
+            self._cola.release()
+            _metrics.inc('scraper_parse_queue', -1)
+            try:
+                extraccion, fallos = future.result()
+                for (kind_fallo, campo), n in fallos.items():
+                    _field_failures.add(kind_fallo, campo, n)
+                # La traza de la solicitud se creó en el hilo de la descarga; el parseo se le suma aquí
+                token = _traza.set(traza)
+                try:
+                    resultado.set_result(registrar_parseo(kind, etiqueta, paridad, extraccion))
+                finally:
+                    _traza.reset(token)
+            except BaseException as e:
+                resultado.set_exception(e)
+
+        try:
+            future = self.parseo.submit(_extraer_en_proceso, extractor, kind, content, backend, subarbol, paridad, args)
+        except BaseException:
+            self._cola.release()
+            _metrics.inc('scraper_parse_queue', -1)
+            raise
+        with self._lock:
+            self.paginas += 1
+        future.add_done_callback(_terminado)
+        return resultado
+
+    def cerrar(self):
+        self.descargas.shutdown(wait=True)
+        self.parseo.shutdown(wait=True)
+
+    def resumen(self):
+        """Texto con las páginas parseadas en procesos y las esperas por la cola llena para el log."""
+        return (f"{self.paginas} páginas parseadas en {self.procesos} procesos; la descarga esperó a la cola de parseo "
+                f"{self.esperas} veces ({self.segundos_espera:.1f} s)")
+
+# Etapas del modo PIPELINE durante la ejecución de scraping()
+_pipeline = None
+
+def abrir_pipeline():
+    """Crea las etapas del modo PIPELINE, o retorna None si está desactivado."""
+    if not PIPELINE:
+        return None
+    return ParsePipeline(PIPELINE_FETCHERS, PARSE_PROCESSES, PIPELINE_QUEUE_SIZE)
+
+def build_search_url(dest_id, checkin_date, checkout_date, offset=0, huespedes=DEFAULT_GUESTS):
+    """Construye la URL de la página de resultados de búsqueda para una región, unas fechas, unos huéspedes y un desplazamiento."""
+    # URL base para los resultados de búsqueda de Booking.com
+    # Las fechas y la moneda se añadirán como parámetros de consulta.
+    # Se añadió selected_currency=EUR para intentar forzar precios en EUR.
+    base_url = f"{BOOKING_BASE_URL}/searchresults.es.html?lang=es%E2%82%8AC&dest_id={dest_id}&dest_type=region&ac_langcode=es&nflt=ht_id%3D204&shw_aparth=0&selected_currency=EUR&checkin={{}}&checkout={{}}"
+    url = base_url.format(checkin_date, checkout_date)
+    if huespedes != DEFAULT_GUESTS:
+        # Sin estos parámetros Booking busca para DEFAULT_GUESTS adultos; la URL de siempre no cambia
+        url += f"&group_adults={huespedes}&no_rooms=1&group_children=0"
+    if offset:
+        url += f"&offset={offset}"
+    return url
+
+# Número total de resultados en la cabecera de la búsqueda, p. ej. "Málaga: 1.234 alojamientos encontrados"
+TOTAL_RESULTS_RE = re.compile(r'(\d[\d.]*)\s+alojamientos?')
+
+def parse_total_results(soup):
+    """Devuelve el número total de resultados indicado en la página de búsqueda, o None si no aparece."""
+    header = soup.select_one('h1')
+    if not header:
+        return None
+    match = TOTAL_RESULTS_RE.search(header.get_text(' ', strip=True))
+    if not match:
+        return None
+    return int(match.group(1).replace('.', ''))
+
+def result_page_offsets(total_results):
+    """Desplazamientos de las páginas de resultados posteriores a la primera, limitados a MAX_RESULT_PAGES."""
+    if not total_results:
+        return []
+    pages = min(-(-total_results // RESULTS_PAGE_SIZE), MAX_RESULT_PAGES)
+    return [page * RESULTS_PAGE_SIZE for page in range(1, pages)]
+
+class CompiledSelector:
+    """
+    Selector CSS compilado una sola vez al importar el módulo. Con BeautifulSoup se usa el patrón
+    compilado de soupsieve; con selectolax se pasa el texto del selector al adaptador.
+    """
+
+    __slots__ = ('css', '_compiled')
+
+    def __init__(self, css):
+        self.css = css
+        self._compiled = soupsieve.compile(css)
+
+    def select(self, node):
+        if isinstance(node, SelectolaxNode):
+            return node.select(self.css)
+        return self._compiled.select(node)
+
+    def select_one(self, node):
+        if isinstance(node, SelectolaxNode):
+            return node.select_one(self.css)
+        return self._compiled.select_one(node)
+
+# Especificación de un campo extraído:
+#   campo: nombre del campo, o tupla de nombres si el extractor devuelve varios valores
+#   selector: CompiledSelector, tupla de alternativas (se usa la primera que encuentre algo)
+#             o None para aplicar el extractor al nodo completo (tarjeta o página)
+#   extraer: función que recibe el elemento (o la lista de elementos si todos=True) y devuelve el valor en bruto
+#   tipo: conversión aplicada al valor en bruto (int, float...), una tupla de conversiones si hay varios campos, o None
+#   defecto: valor si el elemento no existe, el extractor devuelve None o la extracción falla
+#   todos: selecciona todos los elementos en lugar del primero
+FieldSpec = namedtuple('FieldSpec', 'campo selector extraer tipo defecto todos', defaults=(None, None, None, False))
+
+# Expresiones regulares compiladas una sola vez
+COMMENTS_RE = re.compile(r'\d+') # Número de comentarios
+CONCATENATED_RE = re.compile(r'[a-z][A-Z]') # Destacados concatenados, p. ej. "GeniusOferta"
+
+def _text(element):
+    """Texto del elemento sin espacios sobrantes."""
+    return element.get_text(strip=True)
+
+def _hotel_url_and_id(link):
+    """URL completa del hotel e id extraído de la ruta (texto tras el último '/' y antes del primer '.')."""
+    if 'href' not in link.attrs:
+        return None
+    full_url = link['href']
+    # Extrae el ID de la ruta de la URL (texto después del último '/' y antes de '.html')
+    last_part = full_url.split('/')[-1]
+    hotel_id_with_extension = last_part.split('.html')[0]
+    # Eliminar todo lo que va después del primer punto inclusive
+    hotel_id = hotel_id_with_extension.split('.')[0]
+    return full_url, hotel_id
+
+def _locality(address_element):
+    """Localidad: se asume que es la primera parte de la dirección antes de una coma."""
+    full_address = address_element.get_text(strip=True)
+    return full_address.split(',', 1)[0].strip()
+
+# Divs hijos directos del contenedor de puntuación: puntuación, opinión y número de comentarios
+REVIEW_SCORE_PARTS = CompiledSelector(':scope > div')
+
+def _review_scores(container):
+    """Textos de puntuación, opinión (con punto decimal) y número de comentarios; None si faltan o están vacíos."""
+    score_texts = [div.get_text(strip=True) for div in REVIEW_SCORE_PARTS.select(container)] + ['', '', '']
+    puntuacion, opinion, comentarios = score_texts[:3]
+    match = COMMENTS_RE.search(comentarios) if comentarios else None
+    return (puntuacion or None,
+            opinion.replace(',', '.') if opinion else None,
+            match.group(0) if match else None)
+
+def _clean_price(element):
+    """Limpia la cadena de precio: elimina '€', espacios y separadores de miles, y usa punto decimal."""
+    price_text = element.get_text(strip=True)
+    if not price_text:
+        return None
+    return price_text.replace('€', '').replace(' ', '').replace('.', '').replace(',', '.')
+
+# Selectores de la página de resultados
+PROPERTY_CARD = CompiledSelector('div[data-testid="property-card"]')
+TITLE_LINK = CompiledSelector('a[data-testid="title-link"]')
+CARD_ADDRESS = CompiledSelector('span[data-testid="address"]')
+# A veces el precio está en una estructura diferente
+CARD_PRICE = (CompiledSelector('span[data-testid="price-and-discounted-price"]'),
+              CompiledSelector('div[data-testid="price-and-discounted-price"] span'))
+
+# Campos de cada tarjeta de hotel, en el orden de salida. La localidad se toma de la dirección.
+# Los campos sin selector ni extractor (marca, coordenadas, servicios, descripción) solo están
+# en la página del hotel; las fechas y los huéspedes los añade extract_search_results.
+CARD_FIELDS = (
+    FieldSpec(('url', 'id'), TITLE_LINK, _hotel_url_and_id),
+    FieldSpec('localidad', CARD_ADDRESS, _locality),
+    FieldSpec('nombre', CompiledSelector('div[data-testid="title"]'), _text),
+    FieldSpec('marca', None),
+    FieldSpec('Dirección', CARD_ADDRESS, _text),
+    FieldSpec('Coordenadas', None),
+    FieldSpec('Servicios populares', None),
+    FieldSpec('Descripción', None),
+    FieldSpec(('Puntuación', 'Opinión', 'Numero comentarios'), CompiledSelector('div[data-testid="review-score"]'),
+              _review_scores, (float, float, int)),
+    FieldSpec('Fecha entrada', None),
+    FieldSpec('Fecha salida', None),
+    FieldSpec('Huéspedes', None),
+    FieldSpec('Precio_texto', CARD_PRICE, _text), # Texto original para depuración
+    FieldSpec('Precio', CARD_PRICE, _clean_price, int),
+)
+
+HIGHLIGHT_ELEMENTS = CompiledSelector('span, div')
+MAP_PIN = CompiledSelector('a#map_trigger_header_pin')
+LAT_META = CompiledSelector('meta[property="booking_com:location:latitude"]')
+LON_META = CompiledSelector('meta[property="booking_com:location:longitude"]')
+GEO_POSITION_META = CompiledSelector('meta[name="geo.position"]')
+SECOND_DIV = CompiledSelector('div:nth-of-type(2)')
+
+def _highlights(container):
+    """Destacados sin duplicados, omitiendo textos concatenados (minúscula seguida de mayúscula sin espacio)."""
+    filtered_highlights = []
+    seen_highlights = set()
+    for elem in HIGHLIGHT_ELEMENTS.select(container):
+        highlight = elem.get_text(strip=True)
+        if not highlight or CONCATENATED_RE.search(highlight):
+            continue
+        if highlight not in seen_highlights:
+            filtered_highlights.append(highlight)
+            seen_highlights.add(highlight)
+    return filtered_highlights or None
+
+def _coordinates(soup):
+    """(lat, lon) del enlace del mapa o, en su defecto, de las meta tags de la página."""
+    coords_element = MAP_PIN.select_one(soup)
+    if coords_element and 'data-atlas-latlng' in coords_element.attrs:
+        coords_content = coords_element['data-atlas-latlng']
+    else:
+        # Alternativa a las meta tags si no se encuentra el selector principal
+        coords_content = None
+        lat_meta = LAT_META.select_one(soup)
+        lon_meta = LON_META.select_one(soup)
+        if lat_meta and 'content' in lat_meta.attrs and lon_meta and 'content' in lon_meta.attrs:
+            coords_content = f"{lat_meta['content']},{lon_meta['content']}"
+        if not coords_content or coords_content == ',':
+            # Intenta meta tag alternativa
+            geo_position_meta = GEO_POSITION_META.select_one(soup)
+            if geo_position_meta and 'content' in geo_position_meta.attrs:
+                coords_content = geo_position_meta['content']
+    if not coords_content or coords_content == ',':
+        return None
+    lat, lon = coords_content.split(',')
+    return lat, lon
+
+def _detail_address(address_container):
+    """Dirección del bloque de la página del hotel, sin el texto del segundo div y truncada tras 'España'."""
+    full_text = address_container.get_text(strip=True)
+    # Encuentra el segundo div dentro del contenedor
+    second_div = SECOND_DIV.select_one(address_container)
+    if second_div:
+        # Divide el texto completo por el texto del segundo div
+        extracted_address = full_text.split(second_div.get_text(strip=True), 1)[0].strip()
+    else:
+        extracted_address = full_text.strip() # Si no hay segundo div, toma todo el texto
+    if not extracted_address:
+        return None
+    # Encuentra "España" y trunca, incluyendo "España" en el resultado
+    espana_index = extracted_address.find('España')
+    if espana_index != -1:
+        return extracted_address[:espana_index + len('España')]
+    return extracted_address
+
+# Campos de la página individual del hotel
+HOTEL_FIELDS = (
+    FieldSpec('Destacados', CompiledSelector('span.hp__hotel_ratings.pp-header__badges.pp-header__badges--combined div[data-capla-component-boundary="b-property-web-property-page/Badges"]'),
+              _highlights, None, []),
+    FieldSpec('marca', CompiledSelector('div.d7b319a0ec div.b08850ce41'), _text),
+    FieldSpec(('lat', 'lon'), None, _coordinates, float),
+    FieldSpec('Servicios populares', CompiledSelector('div.hp--popular_facilities ul.e9f7361569 li.b0bf4dc58f div.aa8988bf9c span.f006e3fcbd'),
+              lambda amenities: [amenity.get_text(strip=True) for amenity in amenities], None, [], True),
+    FieldSpec('Descripción', CompiledSelector('p[data-testid="property-description"]'), _text),
+    FieldSpec('Dirección_detalle', CompiledSelector('div.b99b6ef58f.cb4b7a25d9'), _detail_address),
+)
+
+class FieldFailures:
+    """Contador de fallos de extracción por tipo de página y campo, en lugar de una línea de log por fallo."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.fallos = {}
+
+    def add(self, kind, campo, n=1):
+        _metrics.inc('scraper_field_failures_total', n, tipo=kind, campo=campo)
+        with self._lock:
+            self.fallos[(kind, campo)] = self.fallos.get((kind, campo), 0) + n
+
+    def resumen(self):
+        with self._lock:
+            return ', '.join(f"{kind}.{campo}: {n}" for (kind, campo), n in sorted(self.fallos.items())) or 'ninguno'
+
+_field_failures = FieldFailures()
+
+def _select(node, selector, todos):
+    if isinstance(selector, tuple):
+        for alternativa in selector:
+            encontrado = _select(node, alternativa, todos)
+            if encontrado:
+                return encontrado
+        return [] if todos else None
+    return selector.select(node) if todos else selector.select_one(node)
+
+def compile_fields(spec):
+    """
+    Compila una especificación de campos al importar el módulo: normaliza nombres y conversiones
+    a tuplas y asigna a cada selector distinto un hueco, para evaluarlo una sola vez por nodo.
+
+    Retorna:
+        tuple: (número de huecos, tupla de pasos (nombres, hueco, selector, todos, extraer, tipos, defecto)).
+    """
+    huecos = {}
+    pasos = []
+    for field in spec:
+        nombres = field.campo if isinstance(field.campo, tuple) else (field.campo,)
+        tipos = field.tipo if isinstance(field.tipo, tuple) else (field.tipo,) * len(nombres)
+        hueco = None
+        if field.selector is not None:
+            hueco = huecos.setdefault((field.selector, field.todos), len(huecos))
+        pasos.append((nombres, hueco, field.selector, field.todos, field.extraer, tipos, field.defecto))
+    return len(huecos), tuple(pasos)
+
+_SIN_SELECCIONAR = object()
+
+def extract_fields(compiled, node, kind):
+    """
+    Aplica una especificación de campos compilada a un nodo (tarjeta o página) en una sola pasada.
+    Cada selector se evalúa una vez por nodo aunque lo usen varios campos, y los fallos
+    se cuentan por campo en _field_failures.
+    """
+    num_huecos, pasos = compiled
+    seleccionados = [_SIN_SELECCIONAR] * num_huecos
+    data = {}
+    for nombres, hueco, selector, todos, extraer, tipos, defecto in pasos:
+        valores = None
+        if extraer is not None:
+            try:
+                if hueco is None:
+                    objetivo = node
+                else:
+                    objetivo = seleccionados[hueco]
+                    if objetivo is _SIN_SELECCIONAR:
+                        objetivo = seleccionados[hueco] = _select(node, selector, todos)
+                if objetivo:
+                    valores = extraer(objetivo)
+                    if len(nombres) == 1:
+                        valores = (valores,)
+            except Exception:
+                for nombre in nombres:
+                    _field_failures.add(kind, nombre)
+                valores = None
+
+        for i, nombre in enumerate(nombres):
+            valor = valores[i] if valores is not None else None
+            if valor is not None and tipos[i] is not None:
+                try:
+                    valor = tipos[i](valor)
+                except (ValueError, TypeError):
+                    _field_failures.add(kind, nombre)
+                    valor = None
+            if valor is None:
+                # Copia los valores por defecto mutables (listas) para no compartirlos entre registros
+                valor = list(defecto) if defecto.__class__ is list else defecto
+            data[nombre] = valor
+    return data
+
+# Especificaciones compiladas una sola vez al importar
+_CARD_FIELDS_COMPILED = compile_fields(CARD_FIELDS)
+_HOTEL_FIELDS_COMPILED = compile_fields(HOTEL_FIELDS)
+
+def parse_search_results(content, checkin_date, checkout_date, backend=None, huespedes=DEFAULT_GUESTS):
+    """
+    Extrae los datos de cada hotel de una página de resultados de búsqueda, sin visitar la página del hotel.
+
+    Parámetros:
+        content (bytes): HTML de la página de resultados.
+        checkin_date (str): Fecha de entrada en formato 'YYYY-MM-DD'.
+        checkout_date (str): Fecha de salida en formato 'YYYY-MM-DD'.
+        backend (str): Backend de parseo; por defecto PARSER_BACKEND.
+        huespedes (int): Huéspedes de la búsqueda.
+
+    Retorna:
+        tuple: (lista de diccionarios con los datos de cada tarjeta de hotel,
+                número total de resultados de la búsqueda o None si no se indica).
+    """
+    return run_parser(extract_search_results, 'busqueda', content, backend, checkin_date, checkout_date, huespedes)
+
+def extract_search_results(soup, checkin_date, checkout_date, huespedes=DEFAULT_GUESTS):
+    """Extrae las tarjetas de hotel y el total de resultados de un árbol ya construido (ver parse_search_results)."""
+    hotel_list = []
+    for hotel in PROPERTY_CARD.select(soup):
+        hotel_data = extract_fields(_CARD_FIELDS_COMPILED, hotel, 'busqueda')
+        hotel_data['Fecha entrada'] = checkin_date # Fecha entrada (Proporcionada por el usuario)
+        hotel_data['Fecha salida'] = checkout_date # Fecha salida (Proporcionada por el usuario)
+        if huespedes != DEFAULT_GUESTS:
+            # Solo en las búsquedas con otros huéspedes, para que los registros de siempre no cambien
+            hotel_data['Huéspedes'] = huespedes
+        hotel_list.append(hotel_data)
+
+    return hotel_list, parse_total_results(soup)
+
+def build_hotel_record(hotel_data, hotel_details, province_name):
+    """
+    Combina los datos de la tarjeta de búsqueda con los detalles de la página del hotel.
+
+    Si no hay detalles se devuelven los datos de la tarjeta sin modificar.
+    """
+    if not hotel_details:
+        return hotel_data
+
+    # Construye el diccionario en el orden deseado
+    ordered_hotel_data = {
+        'url': hotel_data.get('url'),
+        'id': hotel_data.get('id'),
+        'nombre': hotel_data.get('nombre'),
+        'marca': hotel_details.get('marca'), # Obtiene marca de hotel_details
+        'destacados': hotel_details.get('Destacados'), # Añade Destacados
+        'provincia': province_name, # Añade el nombre de la provincia aquí
+        'localidad': hotel_data.get('localidad'), # Añade la localidad aquí
+        'direccion': hotel_details.get('Dirección_detalle'), # Obtiene Dirección de hotel_details
+        'location': { # Crea un diccionario anidado para las coordenadas
+            'lat': hotel_details.get('lat'), # Obtiene lat de hotel_details
+            'lon': hotel_details.get('lon'), # Obtiene lon de hotel_details
+        },
+        'servicios': hotel_details.get('Servicios populares'), # Obtiene Servicios populares de hotel_details
+        'descripcion': hotel_details.get('Descripción'), # Obtiene Descripción de hotel_details
+        'puntuacion': hotel_data.get('Puntuación'),
+        'opinion': hotel_data.get('Opinión'),
+        'comentarios': hotel_data.get('Numero comentarios'),
+        'fechaEntrada': hotel_data.get('Fecha entrada'),
+        'fechaSalida': hotel_data.get('Fecha salida'),
+        'huespedes': hotel_data.get('Huéspedes'),
+        'precio': hotel_data.get('Precio'), # Usa el precio procesado
+    }
+    # Elimina claves con valores None o listas vacías para mantener la salida limpia
+    return {k: v for k, v in ordered_hotel_data.items() if v is not None and v != []}
+
+def fetch_result_page(dest_id, checkin_date, checkout_date, offset, huespedes=DEFAULT_GUESTS):
+    """
+    Descarga y extrae una página de resultados posterior a la primera.
+
+    Retorna:
+        list: Las tarjetas de hotel de la página, o None si no se pudo descargar.
+    """
+    url = build_search_url(dest_id, checkin_date, checkout_date, offset, huespedes)
+    try:
+        content = fetch_page(url)
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Error al obtener la página de resultados con offset {offset}: {e}")
+        return None
+    return parse_search_results(content, checkin_date, checkout_date, huespedes=huespedes)[0]
+
+def scrape_booking_region(dest_id, checkin_date, checkout_date, huespedes=DEFAULT_GUESTS):
+    """
+    Extrae datos de hoteles de Booking.com para una región especificada basada en dest_id.
+
+    Parámetros:
+        dest_id (str): El ID de destino para la región (ej. '1363' para Almería).
+        checkin_date (str): Fecha de entrada en formato 'YYYY-MM-DD'.
+        checkout_date (str): Fecha de salida en formato 'YYYY-MM-DD'.
+        huespedes (int): Huéspedes de la búsqueda.
+
+    Retorna:
+        list: Una lista de diccionarios, donde cada diccionario representa un hotel.
+    """
+    hotels = iter_booking_region(dest_id, checkin_date, checkout_date, huespedes)
+    return None if hotels is None else list(hotels)
+
+def iter_booking_region(dest_id, checkin_date, checkout_date, huespedes=DEFAULT_GUESTS):
+    """
+    Versión en flujo de scrape_booking_region: descarga la primera página de resultados y devuelve un
+    generador que produce cada hotel en cuanto tiene sus detalles, o None si la primera página falla.
+    Las páginas siguientes se descargan con una ventana de PAGINATION_CONCURRENCY páginas, de modo que
+    la memoria usada no crece con el número de páginas.
+    """
+    url = build_search_url(dest_id, checkin_date, checkout_date, huespedes=huespedes)
+
+    # Obtiene el nombre de la provincia a partir del dest_id
+    province_name = get_province_from_dest_id(dest_id)
+
+    try:
+        logging.info(f"Obteniendo resultados de dest_id {dest_id} ({province_name}) el {checkin_date}...") # Corrección aquí
+
+        content = fetch_page(url)
+        cards, total_results = parse_search_results(content, checkin_date, checkout_date, huespedes=huespedes)
+        logging.info(f"Encontrados {len(cards)} hoteles en la página de resultados de búsqueda de {province_name}.") # Log Número de hoteles encontrados
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Error al obtener la página de resultados: {e}")
+        return None
+
+    offsets = result_page_offsets(total_results)
+    if offsets:
+        logging.info(f"{province_name} el {checkin_date}: {total_results} resultados, se leen {len(offsets) + 1} páginas.")
+
+    def _hotels():
+        seen_ids = set()
+        # Modo PIPELINE: hoteles con sus detalles pedidos, como mucho PIPELINE_WINDOW por delante del que se escribe
+        en_vuelo = deque()
+        for page_cards in _result_pages(dest_id, checkin_date, checkout_date, cards, offsets, huespedes):
+            for hotel_data in page_cards:
+                # Un hotel puede repetirse entre páginas si el orden de los resultados cambia
+                hotel_id = hotel_data.get('id')
+                if hotel_id:
+                    if hotel_id in seen_ids:
+                        continue
+                    seen_ids.add(hotel_id)
+
+                if _pipeline is not None:
+                    en_vuelo.append((hotel_data, pedir_detalles(hotel_id, hotel_data['url']) if hotel_data.get('url') else None))
+                    if len(en_vuelo) >= PIPELINE_WINDOW:
+                        yield _registro_en_vuelo(en_vuelo.popleft(), province_name)
+                    continue
+
+                # Extrae detalles adicionales de la página individual del hotel
+                hotel_details = None
+                if hotel_data.get('url'):
+                    hotel_details = get_hotel_details(hotel_id, hotel_data['url'])
+                yield build_hotel_record(hotel_data, hotel_details, province_name)
+        while en_vuelo:
+            yield _registro_en_vuelo(en_vuelo.popleft(), province_name)
+
+    return _hotels()
+
+def _registro_en_vuelo(pendiente, province_name):
+    """Espera a los detalles de un hotel pedido con pedir_detalles y construye su registro."""
+    hotel_data, future = pendiente
+    return build_hotel_record(hotel_data, future.result() if future is not None else None, province_name)
+
+def _result_pages(dest_id, checkin_date, checkout_date, first_cards, offsets, huespedes=DEFAULT_GUESTS):
+    """
+    Produce las tarjetas de cada página de resultados en orden, empezando por las de la primera.
+    Las páginas restantes se descargan en paralelo, pero solo PAGINATION_CONCURRENCY por delante de la que se consume.
+    """
+    yield first_cards
+    if not offsets:
+        return
+    with ThreadPoolExecutor(max_workers=PAGINATION_CONCURRENCY, thread_name_prefix='paginas') as executor:
+        pendientes = deque()
+        offsets = iter(offsets)
+        for offset in offsets:
+            pendientes.append(executor.submit(fetch_result_page, dest_id, checkin_date, checkout_date, offset, huespedes))
+            if len(pendientes) >= PAGINATION_CONCURRENCY:
+                break
+        while pendientes:
+            page_cards = pendientes.popleft().result()
+            offset = next(offsets, None)
+            if offset is not None:
+                pendientes.append(executor.submit(fetch_result_page, dest_id, checkin_date, checkout_date, offset, huespedes))
+            if page_cards is not None:
+                yield page_cards
+
+def parse_hotel_details(content, backend=None):
+    """
+    Extrae los detalles adicionales de la página individual de un hotel.
+
+    Parámetros:
+        content (bytes): HTML de la página del hotel.
+        backend (str): Backend de parseo; por defecto PARSER_BACKEND.
+
+    Retorna:
+        dict: Un diccionario que contiene detalles adicionales del hotel.
+    """
+    return run_parser(extract_hotel_details, 'hotel', content, backend)
+
+def extract_hotel_details(soup):
+    """Extrae los detalles de un árbol ya construido de la página del hotel (ver parse_hotel_details)."""
+    # El precio se toma de los resultados de búsqueda; si se necesitara el de la página del hotel
+    # bastaría con añadir su campo a HOTEL_FIELDS.
+    return extract_fields(_HOTEL_FIELDS_COMPILED, soup, 'hotel')
+
+# Extractores por tipo de página; el de búsqueda se usa sin fechas (solo para medir y comparar)
+PAGE_EXTRACTORS = {
+    'busqueda': lambda soup: extract_search_results(soup, None, None)[0],
+    'hotel': extract_hotel_details,
+}
+
+def scrape_hotel_details(url, hotel_id=None):
+    """
+    Extrae detalles adicionales de la página individual de un hotel en Booking.com.
+
+    Parámetros:
+        url (str): La URL de la página individual del hotel.
+        hotel_id (str): Id del hotel; si se indica, la página se revalida contra la caché HTTP.
+
+    Retorna:
+        dict: Un diccionario que contiene detalles adicionales del hotel.
+    """
+    entrada, cabeceras = revalidacion_hotel(hotel_id)
+    try:
+        # logging.info(f"Obteniendo detalles del hotel: {url}") # Corrección aquí
+        response = fetch_response(url, cabeceras)
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Error al obtener la página del hotel {url}: {e}")
+        return None
+
+    return detalles_de_respuesta(hotel_id, entrada, response)
+
+class AsyncFetchEngine:
+    """
+    Motor de descargas asíncrono para el modo ASYNC_MODE.
+
+    Descarga páginas de resultados y de detalle de forma concurrente, limitando el número
+    de solicitudes simultáneas en total y por host. Cada descarga se ejecuta con fetch_response
+    en un pool de hilos, de modo que ambos modos comparten la misma pila HTTP. El parseo de las páginas
+    también se hace en ese pool para no detener el bucle de eventos.
+    """
+
+    def __init__(self, max_concurrency, max_per_host):
+        self.max_per_host = max_per_host
+        self._global = asyncio.Semaphore(max_concurrency)
+        self._hosts = {} # host -> asyncio.Semaphore
+        self._detalles_en_curso = {} # id de hotel -> tarea que descarga sus detalles
+
+    async def fetch(self, url):
+        """Descarga una página respetando los límites de concurrencia global y por host."""
+        return (await self.fetch_response(url)).content
+
+    async def fetch_response(self, url, headers=None):
+        """Como fetch, con cabeceras adicionales y devolviendo la respuesta completa (ver fetch_response)."""
+        host = urlparse(url).netloc
+        host_semaphore = self._hosts.get(host)
+        if host_semaphore is None:
+            host_semaphore = self._hosts[host] = asyncio.Semaphore(self.max_per_host)
+        # Primero el límite por host, para no ocupar huecos globales mientras se espera a un host saturado
+        async with host_semaphore:
+            async with self._global:
+                response = await asyncio.to_thread(fetch_response, url, headers)
+        if _profiler is not None:
+            # La traza se creó en el hilo de la descarga; el parseo de la página ocurre en esta tarea
+            _traza.set(getattr(response, 'traza', None))
+        return response
+
+    async def parsear(self, funcion, *args):
+        """
+        Llama a una función de parseo en un hilo, para que el bucle de eventos siga atendiendo las demás
+        descargas mientras tanto. En el modo PIPELINE ese hilo solo espera al pool de procesos.
+        """
+        return await asyncio.to_thread(funcion, *args)
+
+    async def scrape_hotel_details(self, url, hotel_id=None):
+        """Equivalente asíncrono de scrape_hotel_details."""
+        entrada, cabeceras = revalidacion_hotel(hotel_id)
+        try:
+            response = await self.fetch_response(url, cabeceras)
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Error al obtener la página del hotel {url}: {e}")
+            return None
+        return await self.parsear(detalles_de_respuesta, hotel_id, entrada, response)
+
+    async def get_hotel_details(self, hotel_id, url):
+        """
+        Equivalente asíncrono de get_hotel_details. Si otro trabajo ya está descargando
+        el mismo hotel se espera a esa descarga en lugar de repetirla.
+        """
+        if not hotel_id:
+            return await self.scrape_hotel_details(url)
+
+        task = self._detalles_en_curso.get(hotel_id)
+        if task is not None:
+            contar_detalles_compartidos()
+            return await asyncio.shield(task)
+
+        cache = _detail_cache
+        if cache is not None:
+            details = cache.get(hotel_id)
+            if details is not None:
+                return details
+
+        task = asyncio.ensure_future(self.scrape_hotel_details(url, hotel_id))
+        self._detalles_en_curso[hotel_id] = task
+        try:
+            details = await task
+        finally:
+            del self._detalles_en_curso[hotel_id]
+        if details is not None and cache is not None:
+            try:
+                cache.put(hotel_id, details)
+            except (IOError, OSError) as e:
+                logging.error(f"Error guardando detalles del hotel {hotel_id} en caché: {e}")
+        return details
+
+    async def scrape_booking_region(self, dest_id, checkin_date, checkout_date, huespedes=DEFAULT_GUESTS):
+        """Equivalente asíncrono de scrape_booking_region: los detalles de los hoteles se descargan en paralelo."""
+        url = build_search_url(dest_id, checkin_date, checkout_date, huespedes=huespedes)
+        province_name = get_province_from_dest_id(dest_id)
+
+        try:
+            logging.info(f"Obteniendo resultados de dest_id {dest_id} ({province_name}) el {checkin_date}...")
+            content = await self.fetch(url)
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Error al obtener la página de resultados: {e}")
+            return None
+
+        cards, total_results = await self.parsear(parse_search_results, content, checkin_date, checkout_date, None, huespedes)
+        logging.info(f"Encontrados {len(cards)} hoteles en la página de resultados de búsqueda de {province_name}.")
+
+        offsets = result_page_offsets(total_results)
+        if offsets:
+            logging.info(f"{province_name} el {checkin_date}: {total_results} resultados, se leen {len(offsets) + 1} páginas.")
+            page_semaphore = asyncio.Semaphore(PAGINATION_CONCURRENCY)
+
+            async def _result_page(offset):
+                async with page_semaphore:
+                    page_url = build_search_url(dest_id, checkin_date, checkout_date, offset, huespedes)
+                    try:
+                        page_content = await self.fetch(page_url)
+                    except requests.exceptions.RequestException as e:
+                        logging.error(f"Error al obtener la página de resultados con offset {offset}: {e}")
+                        return []
+                    return (await self.parsear(parse_search_results, page_content, checkin_date, checkout_date, None, huespedes))[0]
+
+            # gather conserva el orden de las páginas
+            for page_cards in await asyncio.gather(*(_result_page(offset) for offset in offsets)):
+                cards.extend(page_cards)
+
+        # Un hotel puede repetirse entre páginas si el orden de los resultados cambia
+        seen_ids = set()
+        unique_cards = []
+        for hotel_data in cards:
+            hotel_id = hotel_data.get('id')
+            if hotel_id:
+                if hotel_id in seen_ids:
+                    continue
+                seen_ids.add(hotel_id)
+            unique_cards.append(hotel_data)
+
+        async def _hotel_record(hotel_data):
+            hotel_details = None
+            if hotel_data.get('url'):
+                hotel_details = await self.get_hotel_details(hotel_data.get('id'), hotel_data['url'])
+            return build_hotel_record(hotel_data, hotel_details, province_name)
+
+        # gather conserva el orden de las tarjetas
+        return list(await asyncio.gather(*(_hotel_record(hotel_data) for hotel_data in unique_cards)))
+
+def comprobar_backends_parser():
+    """Vuelve a html.parser si el backend configurado no está instalado y desactiva la paridad si falta el segundo."""
+    global PARSER_BACKEND, PARSER_PARITY
+    if not parser_backend_available(PARSER_BACKEND):
+        logging.warning(f"Backend de parseo '{PARSER_BACKEND}' no disponible, se usa 'html.parser'.")
+        PARSER_BACKEND = 'html.parser'
+    if PARSER_PARITY and not parser_backend_available(PARSER_PARITY):
+        logging.warning(f"Backend de paridad '{PARSER_PARITY}' no disponible, se desactiva la comparación.")
+        PARSER_PARITY = ''
+    logging.info(f"Backend de parseo: {PARSER_BACKEND}" + (f" (paridad con {PARSER_PARITY})" if PARSER_PARITY else ""))
+
+def variante(checkin_date, checkout_date, huespedes):
+    """
+    Sufijo de una variante de estancia en los nombres de fichero, el diario y los leases: vacío para la de
+    por defecto (DEFAULT_STAY_NIGHTS noches, DEFAULT_GUESTS huéspedes) y '<noches>n<huéspedes>p' para el resto.
+    """
+    noches = (checkout_date - checkin_date).days
+    if noches == DEFAULT_STAY_NIGHTS and huespedes == DEFAULT_GUESTS:
+        return ''
+    return f"{noches}n{huespedes}p"
+
+def variantes_estancia():
+    """Pares (noches, huéspedes) de la matriz STAY_LENGTHS x GUEST_COUNTS, con la variante por defecto primero."""
+    variantes = list(dict.fromkeys((noches, huespedes) for noches in STAY_LENGTHS for huespedes in GUEST_COUNTS))
+    return sorted(variantes, key=lambda v: v != (DEFAULT_STAY_NIGHTS, DEFAULT_GUESTS))
+
+def build_jobs(start_date):
+    """
+    Planifica los trabajos (dest_id, fecha de entrada, fecha de salida, huéspedes) de una ejecución en orden
+    de prioridad: primero las fechas de entrada más próximas y, dentro de cada fecha, provincia a provincia
+    con todas sus variantes de estancia seguidas, de modo que las variantes que siguen a la primera encuentran
+    los detalles de los hoteles en la caché. Las variantes que no son la de por defecto solo se buscan en los
+    VARIANT_DAYS primeros días. Si el presupuesto de la ejecución se agota, lo que queda sin hacer es lo más lejano.
+    """
+    variantes = variantes_estancia()
+    jobs = []
+    for i in range(DAYS_TO_SCRAPE):
+        checkin_date = start_date + timedelta(days=i)
+        for dest_id in DEST_IDS_TO_SCRAPE:
+            for noches, huespedes in variantes:
+                if VARIANT_DAYS and i >= VARIANT_DAYS and (noches, huespedes) != (DEFAULT_STAY_NIGHTS, DEFAULT_GUESTS):
+                    continue
+                jobs.append((dest_id, checkin_date, checkin_date + timedelta(days=noches), huespedes))
+    return jobs
+
+def _compresor(f, compresion):
+    """Envuelve el fichero binario f con el compresor indicado ('gzip', 'zstd' o None) sin tomar su propiedad."""
+    if compresion == 'gzip':
+        return gzip.GzipFile(fileobj=f, mode='wb', compresslevel=OUTPUT_COMPRESSION_LEVEL)
+    if compresion == 'zstd':
+        return zstandard.ZstdCompressor(level=OUTPUT_COMPRESSION_LEVEL).stream_writer(f, closefd=False)
+    return f
+
+class AtomicNdjsonWriter:
+    """
+    Escribe líneas ndjson con buffer en un fichero temporal junto al definitivo y lo renombra al confirmar,
+    de modo que los lectores nunca ven un fichero a medias: o el anterior completo o el nuevo completo.
+    Con compresion='gzip' o 'zstd' las líneas se comprimen al escribirlas.
+    """
+
+    def __init__(self, path, buffer_size=None, compresion=None):
+        self.path = path
+        self.tmp_path = nombre_replica(path + '.tmp') # Único por réplica si dos hacen a la vez el mismo trabajo
+        self.lineas = 0
+        self._f = open(self.tmp_path, 'wb', buffering=buffer_size or OUTPUT_BUFFER_SIZE)
+        self._out = _compresor(self._f, compresion)
+
+    def write(self, record):
+        self._out.write((json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8'))
+        self.lineas += 1
+
+    def commit(self):
+        """Vuelca el buffer a disco y sustituye el fichero definitivo por el temporal."""
+        if self._out is not self._f:
+            self._out.close() # Escribe el final del flujo comprimido sin cerrar el fichero
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._f.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        """Descarta lo escrito; el fichero definitivo, si existía, no se modifica."""
+        self._f.close()
+        try:
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
+
+class AtomicParquetWriter:
+    """
+    Escribe registros en un fichero Parquet con un esquema fijo, por lotes de PARQUET_BATCH_ROWS filas
+    (un grupo de filas por lote), con el mismo fichero temporal y renombrado final que AtomicNdjsonWriter.
+    """
+
+    def __init__(self, path, schema):
+        self.path = path
+        self.tmp_path = nombre_replica(path + '.tmp')
+        self.lineas = 0
+        self.schema = schema
+        self._lote = []
+        self._writer = pyarrow.parquet.ParquetWriter(self.tmp_path, schema, compression='zstd')
+
+    def write(self, record):
+        self._lote.append(record)
+        self.lineas += 1
+        if len(self._lote) >= PARQUET_BATCH_ROWS:
+            self._volcar()
+
+    def _volcar(self):
+        if self._lote:
+            self._writer.write_table(pyarrow.Table.from_pylist(self._lote, schema=self.schema))
+            self._lote = []
+
+    def commit(self):
+        self._volcar()
+        self._writer.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        self._lote = []
+        try:
+            self._writer.close()
+            os.remove(self.tmp_path)
+        except (OSError, pyarrow.ArrowException):
+            pass
+
+class SegmentWriter:
+    """
+    Segmentos de salida de una ejecución: los registros de todos los trabajos se añaden a unos pocos
+    ficheros grandes ({prefijo}_{NNN}{extension}) en lugar de uno por provincia y fecha, y se abre un
+    segmento nuevo al superar max_bytes. Cada trabajo se añade de una vez como un tramo contiguo
+    (un miembro gzip o una trama zstd independiente si hay compresión), y su posición se anota en el
+    índice {segmento}.idx, un ndjson con provincia, fecha, variante de estancia (si no es la de por defecto),
+    desplazamiento, longitud y registros.
+    Los tramos solo aparecen en el índice cuando están completos en disco.
+    """
+
+    def __init__(self, directorio, prefijo, extension, compresion, max_bytes):
+        self.directorio = directorio
+        self.prefijo = prefijo
+        self.extension = extension
+        self.compresion = compresion
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._f = None
+        self._idx = None
+        self.segmentos = []
+        self.tramos = 0
+        self.bytes = 0
+
+    def tramo(self, province_name, checkin_date, sufijo=''):
+        """Writer para los registros de un trabajo; se añaden al segmento al confirmarlo."""
+        return SegmentSlice(self, province_name.lower().replace(' ', '_'), checkin_date.strftime('%Y-%m-%d'), sufijo)
+
+    def _siguiente_segmento(self):
+        self._cerrar_segmento()
+        path = os.path.join(self.directorio, f"{self.prefijo}_{len(self.segmentos):03d}{self.extension}")
+        self._f = open(path, 'ab')
+        self._idx = open(path + '.idx', 'a', encoding='utf-8')
+        self.segmentos.append(path)
+
+    def _cerrar_segmento(self):
+        if self._f is not None:
+            self._f.close()
+            self._idx.close()
+            self._f = self._idx = None
+
+    def append(self, spool, provincia, fecha, registros, sufijo=''):
+        """
+        Copia el tramo al final del segmento actual y lo anota en el índice.
+
+        Retorna:
+            tuple: (ruta del segmento, desplazamiento, longitud, sha256 del tramo)
+        """
+        sha256 = hashlib.sha256()
+        with self._lock:
+            if self._f is None or self._f.tell() >= self.max_bytes:
+                self._siguiente_segmento()
+            offset = self._f.tell()
+            for bloque in iter(lambda: spool.read(OUTPUT_BUFFER_SIZE), b''):
+                sha256.update(bloque)
+                self._f.write(bloque)
+            self._f.flush()
+            os.fsync(self._f.fileno())
+            longitud = self._f.tell() - offset
+            entrada = {'provincia': provincia, 'fecha': fecha, 'segmento': os.path.basename(self._f.name),
+                       'offset': offset, 'longitud': longitud, 'registros': registros}
+            if sufijo:
+                entrada['variante'] = sufijo
+            self._idx.write(json.dumps(entrada, ensure_ascii=False) + "\n")
+            self._idx.flush()
+            self.tramos += 1
+            self.bytes += longitud
+            return self._f.name, offset, longitud, sha256.hexdigest()
+
+    def close(self):
+        with self._lock:
+            self._cerrar_segmento()
+
+    def resumen(self):
+        """Texto con los segmentos y tramos escritos para el log."""
+        return f"{self.prefijo}: {len(self.segmentos)} segmentos, {self.tramos} tramos, {self.bytes / 1e6:.1f} MB"
+
+class SegmentSlice:
+    """Registros de un trabajo pendientes de añadirse a un segmento; misma interfaz que AtomicNdjsonWriter."""
+
+    def __init__(self, segmentos, provincia, fecha, sufijo=''):
+        self.segmentos = segmentos
+        self.provincia = provincia
+        self.fecha = fecha
+        self.sufijo = sufijo
+        self.path = None
+        self.lineas = 0
+        self._spool = tempfile.SpooledTemporaryFile(max_size=SEGMENT_SPOOL_BYTES, dir=segmentos.directorio)
+        self._out = _compresor(self._spool, segmentos.compresion)
+
+    def write(self, record):
+        self._out.write((json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8'))
+        self.lineas += 1
+
+    def commit(self):
+        if self._out is not self._spool:
+            self._out.close()
+        self._spool.seek(0)
+        self.segmento, self.offset, self.longitud, self.sha256 = self.segmentos.append(
+            self._spool, self.provincia, self.fecha, self.lineas, self.sufijo)
+        self.path = f"{self.segmento}@{self.offset}"
+        self._spool.close()
+
+    def abort(self):
+        self._spool.close()
+
+def abrir_segmentos():
+    """
+    Crea los SegmentWriter de la ejecución (uno para los registros anchos y otro para los precios,
+    según OUTPUT_MODE), o retorna None si OUTPUT_SEGMENTS está desactivado.
+    """
+    if not OUTPUT_SEGMENTS:
+        return None
+    extension, compresion = OUTPUT_FORMATS[OUTPUT_FORMAT]
+    ejecucion = datetime.now().strftime('%Y%m%d_%H%M%S')
+    max_bytes = OUTPUT_SEGMENT_MB << 20
+    segmentos = {}
+    if OUTPUT_MODE != 'normalizado':
+        segmentos['ancho'] = SegmentWriter(OUT_DIRECTORY, nombre_replica(f"hoteles_{ejecucion}"), extension, compresion, max_bytes)
+    if OUTPUT_MODE != 'ancho':
+        segmentos['precios'] = SegmentWriter(OUT_DIRECTORY, nombre_replica(f"precios_{ejecucion}"), extension, compresion, max_bytes)
+    return segmentos
+
+def leer_tramo(directorio, provincia, fecha, tipo='hoteles', sufijo=''):
+    """
+    Lee los registros de una provincia y fecha de los segmentos de directorio sin recorrerlos enteros:
+    busca en los índices .idx (el tramo más reciente si hay varias ejecuciones) y lee solo sus bytes.
+
+    Parámetros:
+        provincia (str): Nombre de la provincia tal como aparece en los ficheros (p. ej. 'almería').
+        fecha (str): Fecha de entrada 'AAAA-MM-DD'.
+        tipo (str): 'hoteles' para los registros anchos o 'precios' para las filas de precio.
+        sufijo (str): Variante de estancia (p. ej. '7n2p'); vacío para la de por defecto.
+    """
+    encontrado = None
+    for idx_path in sorted(glob.glob(os.path.join(directorio, f"{tipo}_*.idx"))):
+        with open(idx_path, 'r', encoding='utf-8') as f:
+            for linea in f:
+                try:
+                    entrada = json.loads(linea)
+                except ValueError:
+                    continue
+                if entrada['provincia'] == provincia and entrada['fecha'] == fecha and entrada.get('variante', '') == sufijo:
+                    encontrado = entrada
+    if encontrado is None:
+        return
+    segmento = os.path.join(directorio, encontrado['segmento'])
+    with open(segmento, 'rb') as f:
+        f.seek(encontrado['offset'])
+        datos = f.read(encontrado['longitud'])
+    if segmento.endswith('.gz'):
+        datos = gzip.decompress(datos)
+    elif segmento.endswith('.zst'):
+        datos = zstandard.ZstdDecompressor().decompressobj().decompress(datos)
+    for linea in datos.decode('utf-8').splitlines():
+        yield json.loads(linea)
+
+# Extensión y compresión de cada formato de salida
+OUTPUT_FORMATS = {
+    'ndjson': ('.ndjson', None),
+    'ndjson.gz': ('.ndjson.gz', 'gzip'),
+    'ndjson.zst': ('.ndjson.zst', 'zstd'),
+    'parquet': ('.parquet', None),
+}
+
+def output_format_available(formato):
+    """Indica si el formato de salida existe y su dependencia opcional está instalada."""
+    if formato == 'ndjson.zst':
+        return zstandard is not None
+    if formato == 'parquet':
+        return pyarrow is not None
+    return formato in OUTPUT_FORMATS
+
+def comprobar_formato_salida():
+    """
+    Termina el proceso si OUTPUT_FORMAT es desconocido o le falta su dependencia opcional: escribir en otro
+    formato del configurado dejaría ficheros que quien los consume no espera.
+    """
+    if output_format_available(OUTPUT_FORMAT):
+        return
+    dependencia = {'ndjson.zst': 'zstandard', 'parquet': 'pyarrow'}.get(OUTPUT_FORMAT)
+    if dependencia:
+        logging.error(f"El formato de salida '{OUTPUT_FORMAT}' requiere '{dependencia}', que no está instalado.")
+    else:
+        logging.error(f"Formato de salida '{OUTPUT_FORMAT}' desconocido (válidos: {', '.join(OUTPUT_FORMATS)}).")
+    raise SystemExit(1)
+
+def parquet_schemas():
+    """Esquemas Parquet del registro ancho de build_hotel_record y de la fila de precio del modo normalizado."""
+    texto, lista = pyarrow.string(), pyarrow.list_(pyarrow.string())
+    tipos = {
+        'url': texto, 'id': texto, 'nombre': texto, 'marca': texto, 'destacados': lista,
+        'provincia': texto, 'localidad': texto, 'direccion': texto,
+        'location': pyarrow.struct([('lat', pyarrow.float64()), ('lon', pyarrow.float64())]),
+        'servicios': lista, 'descripcion': texto,
+        'puntuacion': pyarrow.float64(), 'opinion': pyarrow.float64(), 'comentarios': pyarrow.int64(),
+        'fechaEntrada': texto, 'fechaSalida': texto, 'huespedes': pyarrow.int64(), 'precio': pyarrow.int64(),
+    }
+    ancho = pyarrow.schema([(campo, tipos[campo]) for campo in HOTEL_ATTRIBUTES + PRICE_FIELDS])
+    precios = pyarrow.schema([(campo, tipos[campo]) for campo in ('id',) + PRICE_FIELDS])
+    return ancho, precios
+
+def abrir_writer(path_base, tipo, province_name=None, checkin_date=None, sufijo=''):
+    """
+    Abre el writer de OUTPUT_FORMAT para path_base (ruta sin extensión); tipo es 'ancho' o 'precios'
+    y elige el esquema en Parquet. Con segmentos activos se devuelve un tramo del segmento de ese tipo.
+    """
+    if _segmentos is not None:
+        return _segmentos[tipo].tramo(province_name, checkin_date, sufijo)
+    extension, compresion = OUTPUT_FORMATS[OUTPUT_FORMAT]
+    if OUTPUT_FORMAT == 'parquet':
+        ancho, precios = parquet_schemas()
+        return AtomicParquetWriter(path_base + extension, ancho if tipo == 'ancho' else precios)
+    return AtomicNdjsonWriter(path_base + extension, compresion=compresion)
+
+def output_paths(province_name, checkin_date, sufijo=''):
+    """
+    Rutas sin extensión del fichero ancho y del de precios de una provincia, fecha y variante de estancia
+    (sufijo, vacío para la de por defecto). Con OUTPUT_PARTITIONED se crean los directorios
+    provincia=<provincia>/fecha=<AAAA-MM-DD>/ dentro de OUT_DIRECTORY.
+    """
+    provincia = province_name.lower().replace(' ', '_')
+    variante_fichero = f"_{sufijo}" if sufijo else ''
+    if OUTPUT_PARTITIONED:
+        directorio = os.path.join(OUT_DIRECTORY, f"provincia={provincia}", f"fecha={checkin_date.strftime('%Y-%m-%d')}")
+        os.makedirs(directorio, exist_ok=True)
+        return os.path.join(directorio, f"hoteles{variante_fichero}"), os.path.join(directorio, f"precios{variante_fichero}")
+    base = os.path.join(OUT_DIRECTORY, f"{provincia}_{checkin_date.strftime('%Y%m%d')}{variante_fichero}")
+    return base, base + '_precios'
+
+def leer_registros(path):
+    """Lee los registros de un fichero de salida en cualquiera de los formatos de OUTPUT_FORMATS."""
+    if path.endswith('.parquet'):
+        yield from pyarrow.parquet.read_table(path).to_pylist()
+        return
+    if path.endswith('.gz'):
+        f = gzip.open(path, 'rt', encoding='utf-8')
+    elif path.endswith('.zst'):
+        f = io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True), encoding='utf-8')
+    else:
+        f = open(path, 'r', encoding='utf-8')
+    with f:
+        for linea in f:
+            yield json.loads(linea)
+
+def guardar_resultados(hotels_data, province_name, checkin_date, sufijo=''):
+    """
+    Escribe los hoteles de una provincia y fecha en OUT_DIRECTORY a medida que se producen: en modo ancho,
+    en su fichero .ndjson; en modo normalizado, las filas de precio en {provincia}_{fecha}_precios.ndjson y
+    los atributos en la dimensión de hoteles. hotels_data puede ser una lista o el generador de iter_booking_region;
+    sufijo es la variante de estancia que se añade a los nombres de fichero (vacío para la de por defecto).
+    """
+    checkin_str = checkin_date.strftime("%Y-%m-%d")
+    if sufijo:
+        checkin_str += f" ({sufijo})"
+    if hotels_data is None:
+        logging.error(f"Error al obtener datos para {province_name} para el {checkin_str}")
+        return
+
+    # Define el nombre del archivo basado en la provincia y la fecha de entrada
+    ancho_path = precios_path = None
+    if _segmentos is None:
+        ancho_path, precios_path = output_paths(province_name, checkin_date, sufijo)
+    writers = []
+    ancho = precios = None
+    try:
+        if OUTPUT_MODE != 'normalizado':
+            ancho = abrir_writer(ancho_path, 'ancho', province_name, checkin_date, sufijo)
+            writers.append(ancho)
+        if OUTPUT_MODE != 'ancho':
+            precios = abrir_writer(precios_path, 'precios', province_name, checkin_date, sufijo)
+            writers.append(precios)
+
+        hoteles = 0
+        escritura = 0.0 # Segundos escribiendo, sin contar la espera a que lleguen los hoteles
+        for hotel in hotels_data:
+            hoteles += 1
+            inicio = time.perf_counter()
+            # print(f"Escribiendo datos del hotel en JSON: {hotel}") # Impresión de depuración para los datos del hotel antes de escribir
+            try:
+                with etapa_perfil('escritura'):
+                    if ancho is not None:
+                        ancho.write(hotel if OUTPUT_FORMAT != 'parquet' else wide_record(hotel, province_name))
+                    if precios is not None:
+                        atributos, fila, completo = split_hotel_record(hotel, province_name)
+                        if _hotel_dimension is not None:
+                            _hotel_dimension.upsert(atributos, completo)
+                        precios.write(fila)
+            except (TypeError, ValueError) as e:
+                print(f"Error escribiendo datos del hotel en JSON: {e} para el hotel: {hotel.get('nombre', 'N/A')}")
+            escritura += time.perf_counter() - inicio
+    except BaseException:
+        # Un fallo a mitad del trabajo deja intactos los ficheros de la ejecución anterior
+        for writer in writers:
+            writer.abort()
+        raise
+
+    if not hoteles:
+        for writer in writers:
+            writer.abort()
+        logging.error(f"Error al obtener datos para {province_name} para el {checkin_str}")
+        return None
+    inicio = time.perf_counter()
+    with etapa_perfil('escritura'):
+        for writer in writers:
+            writer.commit()
+    _metrics.observe('scraper_write_seconds', escritura + time.perf_counter() - inicio)
+    _metrics.inc('scraper_hotels_total', hoteles, provincia=province_name)
+    _run_manifest.hoteles_trabajo(province_name, checkin_date.strftime("%Y-%m-%d"), hoteles, sufijo)
+    _metrics.set('scraper_last_progress_timestamp_seconds', time.time())
+    rutas = ', '.join(writer.path for writer in writers)
+    logging.info(f"Fin de scraping para {province_name} para el {checkin_str}. Guardado en {rutas}")
+    return [describir_salida(writer) for writer in writers]
+
+def describir_salida(writer):
+    """Ruta (y tramo, en un segmento), registros y sha256 de una salida confirmada, para el diario de la ejecución."""
+    if isinstance(writer, SegmentSlice):
+        return {'path': writer.segmento, 'offset': writer.offset, 'longitud': writer.longitud,
+                'registros': writer.lineas, 'sha256': writer.sha256}
+    return {'path': writer.path, 'registros': writer.lineas, 'sha256': sha256_fichero(writer.path)}
+
+def sha256_fichero(path, offset=0, longitud=None):
+    """sha256 de un fichero completo o de longitud bytes a partir de offset."""
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        pendiente = longitud
+        while pendiente is None or pendiente > 0:
+            bloque = f.read(OUTPUT_BUFFER_SIZE if pendiente is None else min(OUTPUT_BUFFER_SIZE, pendiente))
+            if not bloque:
+                break
+            sha256.update(bloque)
+            if pendiente is not None:
+                pendiente -= len(bloque)
+    return sha256.hexdigest()
+
+class RunJournal:
+    """
+    Diario de la ejecución del día: un ndjson de solo anexado en OUT_DIRECTORY con cada trabajo
+    (dest_id, fecha de entrada, variante de estancia) terminado, sus ficheros de salida y el sha256 de cada uno. Si la
+    ejecución se interrumpe, al reiniciar se omiten los trabajos cuyas salidas siguen intactas.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entradas = {} # (dest_id, fecha de entrada, variante) -> última entrada del diario
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for linea in f:
+                    try:
+                        entrada = json.loads(linea)
+                        self._entradas[(entrada['dest_id'], entrada['checkin'], entrada.get('variante', ''))] = entrada
+                    except (ValueError, KeyError):
+                        continue # Línea truncada por una caída durante la escritura
+
+    def completados(self):
+        """Trabajos del diario cuyas salidas existen y conservan su sha256, como (dest_id, 'AAAA-MM-DD', variante)."""
+        completados = set()
+        for clave, entrada in self._entradas.items():
+            try:
+                intactas = all(sha256_fichero(s['path'], s.get('offset', 0), s.get('longitud')) == s['sha256']
+                               for s in entrada['salidas'])
+            except (IOError, OSError, KeyError):
+                intactas = False
+            if intactas:
+                completados.add(clave)
+            else:
+                logging.warning(f"Diario: las salidas de {' '.join(filter(None, clave))} no están o han cambiado, se repite el trabajo.")
+        return completados
+
+    def registrar(self, dest_id, checkin_date, salidas, sufijo=''):
+        """Anota un trabajo terminado; la línea se sincroniza a disco antes de continuar."""
+        entrada = {'dest_id': dest_id, 'checkin': checkin_date.strftime('%Y-%m-%d'),
+                   'ts': datetime.now().isoformat(timespec='seconds'), 'salidas': salidas}
+        if sufijo:
+            entrada['variante'] = sufijo
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entrada, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._entradas[(dest_id, entrada['checkin'], sufijo)] = entrada
+
+def registrar_trabajo(dest_id, checkin_date, salidas, sufijo=''):
+    """Anota el trabajo en el diario de la ejecución si ha generado salidas; los trabajos fallidos se repiten al reanudar."""
+    if _run_journal is None or not salidas:
+        return
+    try:
+        _run_journal.registrar(dest_id, checkin_date, salidas, sufijo)
+    except (IOError, OSError) as e:
+        logging.error(f"No se puede anotar el trabajo {dest_id} {checkin_date} en el diario: {e}")
+
+def clave_trabajo(dest_id, checkin_date, checkout_date, huespedes):
+    """Nombre del lease de un trabajo: <dest_id>_<AAAAMMDD>, seguido de _<variante> si no es la de por defecto."""
+    sufijo = variante(checkin_date, checkout_date, huespedes)
+    return f"{dest_id}_{checkin_date.strftime('%Y%m%d')}" + (f"_{sufijo}" if sufijo else '')
+
+class LeaseStore:
+    """
+    Reparto de los trabajos (dest_id, fecha de entrada, variante) de una ejecución entre réplicas. Cada trabajo tiene
+    un lease con la réplica que lo hace, su estado ('en_curso', 'hecho' o 'fallido'), los intentos y, mientras
+    está en curso, cuándo expira. La réplica renueva sus leases cada LEASE_HEARTBEAT segundos; si deja de
+    hacerlo (se ha caído o ha perdido el volumen), otra réplica se queda el trabajo al expirar. Las subclases
+    guardan los leases (leer, _crear, _escribir, _borrar y contadores); esta clase decide cuáles se pueden reclamar.
+    """
+
+    def __init__(self, replica, ttl):
+        self.replica = replica
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._reclamo = threading.Lock() # Los hilos de una réplica reclaman de uno en uno y no compiten entre sí
+        self._propios = {} # clave -> entrada de los leases en curso de esta réplica
+        self._terminados = set() # Claves hechas o sin más intentos, que ya no se vuelven a leer
+        self.reclamados = 0
+        self.recuperados = 0
+        self.perdidos = 0
+
+    def _terminado(self, clave, entrada):
+        """Indica si el trabajo ya no se puede reclamar: hecho con sus salidas en disco, o fallido sin más intentos."""
+        if entrada is None:
+            return False
+        if entrada.get('estado') == 'hecho':
+            # Basta con que existan: comprobar el sha256 de las salidas de otras réplicas costaría leerlas por NFS
+            if all(os.path.exists(s['path']) for s in entrada.get('salidas', [])):
+                return True
+            logging.warning(f"Lease {clave}: las salidas de {entrada.get('replica')} no están, se repite el trabajo.")
+            return False
+        return entrada.get('estado') == 'fallido' and entrada.get('intentos', 0) >= LEASE_MAX_ATTEMPTS
+
+    def siguiente(self, jobs, reclamar=True):
+        """
+        Reclama el primer trabajo libre de jobs, en su orden: sin lease, con el lease expirado o fallido con
+        intentos restantes. Retorna (trabajo o None, trabajos sin terminar, incluidos los de otras réplicas).
+        """
+        with self._reclamo:
+            pendientes = 0
+            for job in jobs:
+                clave = clave_trabajo(*job)
+                if clave in self._terminados:
+                    continue
+                entrada = self.leer(clave)
+                if self._terminado(clave, entrada):
+                    self._terminados.add(clave)
+                    continue
+                pendientes += 1
+                if not reclamar or clave in self._propios or not self._libre(entrada):
+                    continue
+                expirado = entrada is not None and entrada.get('estado') == 'en_curso'
+                if self._reclamar(clave, entrada):
+                    if expirado:
+                        logging.warning(f"Lease {clave} de {entrada.get('replica')} expirado: se hace cargo {self.replica}.")
+                        self.recuperados += 1
+                    return job, pendientes
+            return None, pendientes
+
+    def sin_empezar(self, jobs):
+        """Trabajos de jobs sin terminar que ninguna réplica tiene en curso."""
+        with self._reclamo:
+            libres = 0
+            for job in jobs:
+                clave = clave_trabajo(*job)
+                if clave in self._terminados:
+                    continue
+                entrada = self.leer(clave)
+                if self._terminado(clave, entrada):
+                    self._terminados.add(clave)
+                elif self._libre(entrada):
+                    libres += 1
+            return libres
+
+    @staticmethod
+    def _libre(entrada):
+        """Indica si un trabajo sin terminar se puede reclamar: sin lease, fallido con intentos restantes o expirado."""
+        return entrada is None or entrada.get('estado') != 'en_curso' or entrada.get('expira', 0) <= time.time()
+
+    def _reclamar(self, clave, anterior):
+        entrada = {'replica': self.replica, 'estado': 'en_curso', 'expira': time.time() + self.ttl,
+                   'intentos': (anterior or {}).get('intentos', 0) + 1, 'inicio': datetime.now().isoformat(timespec='seconds')}
+        if not self._crear(clave, entrada, anterior):
+            return False # Otra réplica lo ha reclamado antes
+        with self._lock:
+            self._propios[clave] = entrada
+            self.reclamados += 1
+        return True
+
+    def renovar(self):
+        """Amplía la expiración de los leases en curso de esta réplica; los que otra réplica ha reclamado se dan por perdidos."""
+        with self._lock:
+            for clave, entrada in list(self._propios.items()):
+                if self.leer(clave) != entrada:
+                    logging.warning(f"Lease {clave} perdido: ha expirado y lo ha reclamado otra réplica.")
+                    del self._propios[clave]
+                    self.perdidos += 1
+                    continue
+                entrada = {**entrada, 'expira': time.time() + self.ttl}
+                self._escribir(clave, entrada)
+                self._propios[clave] = entrada
+
+    def terminar(self, clave, salidas):
+        """Marca el trabajo como hecho (con sus salidas) o fallido; aunque el lease se hubiera perdido, el resultado vale."""
+        with self._lock:
+            propio = self._propios.pop(clave, None) or {}
+            entrada = {'replica': self.replica, 'estado': 'hecho' if salidas else 'fallido',
+                       'intentos': propio.get('intentos', 1), 'fin': datetime.now().isoformat(timespec='seconds'),
+                       'salidas': salidas or []}
+            self._escribir(clave, entrada)
+        if salidas or entrada['intentos'] >= LEASE_MAX_ATTEMPTS:
+            self._terminados.add(clave)
+
+    def soltar(self, clave):
+        """Borra el lease en curso de un trabajo que esta réplica ya no va a empezar."""
+        with self._lock:
+            entrada = self._propios.pop(clave, None)
+            if entrada is not None and self.leer(clave) == entrada:
+                self._borrar(clave)
+
+    def liberar(self):
+        """Borra los leases que esta réplica aún tiene en curso para que otra los reclame sin esperar a que expiren."""
+        with self._lock:
+            for clave, entrada in self._propios.items():
+                if self.leer(clave) == entrada:
+                    self._borrar(clave)
+            self._propios.clear()
+
+    def publicar_solicitudes(self, solicitudes):
+        """Anota las solicitudes hechas por esta réplica en la ejecución, junto a los leases."""
+        self._escribir(f"{LEASE_COUNTER_PREFIX}{self.replica}", {'replica': self.replica, 'solicitudes': solicitudes})
+
+    def solicitudes_otras(self):
+        """Solicitudes anotadas por las demás réplicas en la ejecución."""
+        return sum(n for replica, n in self.contadores().items() if replica != self.replica)
+
+    def resumen(self):
+        """Texto con los trabajos reclamados, recuperados de réplicas caídas y perdidos para el log."""
+        return (f"réplica {self.replica}: {self.reclamados} trabajos reclamados, {self.recuperados} recuperados "
+                f"de réplicas caídas, {self.perdidos} leases perdidos")
+
+class FileLeaseStore(LeaseStore):
+    """
+    Leases como ficheros <clave>.lease en un directorio compartido (el volumen NFS de OUT_DIRECTORY).
+    Un trabajo libre se reclama creando su fichero con O_EXCL, que es atómico también sobre NFSv3 y
+    posteriores. Un lease expirado o fallido se retira antes renombrándolo a un nombre único: solo una
+    réplica consigue el rename, y si el contenido ya no es el que leyó (otra lo ha renovado o reclamado)
+    lo devuelve a su sitio. Las actualizaciones se escriben en un temporal y se renombran.
+    """
+
+    def __init__(self, directorio, replica, ttl):
+        super().__init__(replica, ttl)
+        self.directorio = directorio
+        os.makedirs(directorio, exist_ok=True)
+
+    def _path(self, clave):
+        return os.path.join(self.directorio, f"{clave}.lease")
+
+    def leer(self, clave):
+        path = self._path(clave)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            # Recién creado por otra réplica y aún vacío (o truncado por una caída): se trata como en curso
+            # hasta que expire, y entonces _crear lo retira aunque siga sin poder leerse
+            try:
+                return {'estado': 'en_curso', 'expira': os.path.getmtime(path) + self.ttl, 'ilegible': True}
+            except OSError:
+                return None
+
+    def _crear(self, clave, entrada, anterior):
+        path = self._path(clave)
+        if anterior is not None:
+            retirado = f"{path}.{self.replica}.{os.urandom(4).hex()}"
+            try:
+                os.rename(path, retirado)
+            except FileNotFoundError:
+                return False
+            try:
+                with open(retirado, 'r', encoding='utf-8') as f:
+                    sigue_igual = json.load(f) == anterior
+            except ValueError:
+                sigue_igual = anterior.get('ilegible', False)
+            if not sigue_igual:
+                with contextlib.suppress(FileExistsError):
+                    os.link(retirado, path)
+                os.remove(retirado)
+                return False
+            os.remove(retirado)
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(entrada, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        return True
+
+    def _escribir(self, clave, entrada):
+        path = self._path(clave)
+        tmp_path = nombre_replica(path + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entrada, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _borrar(self, clave):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self._path(clave))
+
+    def contadores(self):
+        contadores = {}
+        for path in glob.glob(os.path.join(self.directorio, f"{LEASE_COUNTER_PREFIX}*.lease")):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    entrada = json.load(f)
+                contadores[entrada['replica']] = entrada['solicitudes']
+            except (OSError, ValueError, KeyError):
+                continue # Sustituido por otra réplica mientras se leía
+        return contadores
+
+class MemoryLeaseStore(LeaseStore):
+    """
+    Leases en memoria con la misma semántica que FileLeaseStore, compartidos por los almacenes del mismo
+    directorio dentro del proceso. Sustituto local para ejecutar sin volumen compartido o probar el reparto
+    con varias réplicas en un solo proceso.
+    """
+
+    _tablas = {} # directorio -> {clave: entrada}
+    _tablas_lock = threading.Lock()
+
+    def __init__(self, directorio, replica, ttl):
+        super().__init__(replica, ttl)
+        with self._tablas_lock:
+            self._tabla = self._tablas.setdefault(directorio, {})
+
+    def leer(self, clave):
+        with self._tablas_lock:
+            entrada = self._tabla.get(clave)
+            return dict(entrada) if entrada is not None else None
+
+    def _crear(self, clave, entrada, anterior):
+        with self._tablas_lock:
+            if self._tabla.get(clave) != anterior:
+                return False
+            self._tabla[clave] = dict(entrada)
+            return True
+
+    def _escribir(self, clave, entrada):
+        with self._tablas_lock:
+            self._tabla[clave] = dict(entrada)
+
+    def _borrar(self, clave):
+        with self._tablas_lock:
+            self._tabla.pop(clave, None)
+
+    def contadores(self):
+        with self._tablas_lock:
+            return {entrada['replica']: entrada['solicitudes']
+                    for clave, entrada in self._tabla.items() if clave.startswith(LEASE_COUNTER_PREFIX)}
+
+LEASE_BACKENDS = {
+    'fichero': FileLeaseStore,
+    'memoria': MemoryLeaseStore,
+}
+
+def abrir_leases(start_date):
+    """
+    Abre el almacén de leases de la ejecución del día (leases/AAAAMMDD/ en OUT_DIRECTORY) y borra los
+    directorios de más de LEASE_RETENTION_DAYS días.
+    """
+    directorio = os.path.join(OUT_DIRECTORY, LEASES_DIRNAME)
+    limite = (start_date - timedelta(days=LEASE_RETENTION_DAYS)).strftime('%Y%m%d')
+    if os.path.isdir(directorio):
+        for nombre in os.listdir(directorio):
+            if nombre.isdigit() and nombre < limite:
+                shutil.rmtree(os.path.join(directorio, nombre), ignore_errors=True)
+    backend = LEASE_BACKENDS.get(LEASE_BACKEND)
+    if backend is None:
+        logging.error(f"Almacén de leases '{LEASE_BACKEND}' desconocido, se usa 'fichero'.")
+        backend = FileLeaseStore
+    return backend(os.path.join(directorio, start_date.strftime('%Y%m%d')), REPLICA_ID, LEASE_TTL)
+
+def indice_replica():
+    """Número de la réplica: el sufijo numérico de REPLICA_ID (el slot de Swarm) o, si no lo tiene, un hash estable."""
+    coincidencia = re.search(r'(\d+)$', REPLICA_ID)
+    return int(coincidencia.group(1)) if coincidencia else zlib.crc32(REPLICA_ID.encode('utf-8'))
+
+def orden_replica(jobs):
+    """
+    Ordena los trabajos para esta réplica empezando por una provincia distinta en cada una, de modo que
+    las réplicas no compitan por los mismos leases. Se conserva la prioridad de build_jobs: las fechas
+    más próximas primero y, dentro de una provincia y fecha, sus variantes de estancia seguidas.
+    """
+    provincias = list(dict.fromkeys(job[0] for job in jobs))
+    if not provincias:
+        return jobs
+    inicio = indice_replica() % len(provincias)
+    posicion = {dest_id: i for i, dest_id in enumerate(provincias[inicio:] + provincias[:inicio])}
+    return sorted(jobs, key=lambda job: (job[1], posicion[job[0]]))
+
+# Campos del registro ancho que describen al hotel y campos que cambian con la fecha de entrada;
+# juntos y en este orden forman el registro de build_hotel_record
+HOTEL_ATTRIBUTES = ('url', 'id', 'nombre', 'marca', 'destacados', 'provincia', 'localidad', 'direccion',
+                    'location', 'servicios', 'descripcion')
+PRICE_FIELDS = ('puntuacion', 'opinion', 'comentarios', 'fechaEntrada', 'fechaSalida', 'huespedes', 'precio')
+
+# Nombres de los campos en la tarjeta de búsqueda, para los hoteles que se guardan sin detalles
+CARD_PRICE_FIELDS = {
+    'Puntuación': 'puntuacion',
+    'Opinión': 'opinion',
+    'Numero comentarios': 'comentarios',
+    'Fecha entrada': 'fechaEntrada',
+    'Fecha salida': 'fechaSalida',
+    'Huéspedes': 'huespedes',
+    'Precio': 'precio',
+}
+
+def wide_record(record, province_name):
+    """
+    Devuelve el registro con los nombres de campo de build_hotel_record. Los hoteles sin detalles se
+    guardan como la tarjeta de búsqueda sin transformar; se renombran sus campos y se descarta el resto.
+    """
+    if 'fechaEntrada' in record or 'Fecha entrada' not in record:
+        return record
+    ordered = {'url': record.get('url'), 'id': record.get('id'), 'nombre': record.get('nombre'),
+               'provincia': province_name, 'localidad': record.get('localidad'),
+               **{nuevo: record.get(campo) for campo, nuevo in CARD_PRICE_FIELDS.items()}}
+    return {k: v for k, v in ordered.items() if v is not None}
+
+def split_hotel_record(record, province_name):
+    """
+    Separa un registro de build_hotel_record en atributos del hotel y fila de precio.
+
+    Retorna:
+        tuple: (atributos, fila de precio, completo); completo es False si el hotel no tenía detalles
+               y el registro es la tarjeta de búsqueda sin transformar.
+    """
+    completo = 'fechaEntrada' in record or 'Fecha entrada' not in record
+    record = wide_record(record, province_name)
+    atributos = {k: record[k] for k in HOTEL_ATTRIBUTES if record.get(k) is not None}
+    if atributos.get('url'):
+        # Los parámetros de la URL dependen de la búsqueda (fechas, posición), no del hotel
+        atributos['url'] = atributos['url'].split('?')[0]
+    fila = {'id': record.get('id')}
+    fila.update((k, record[k]) for k in PRICE_FIELDS if record.get(k) is not None)
+    return atributos, fila, completo
+
+def join_hotel_record(fila, atributos):
+    """Reconstruye el registro ancho a partir de una fila de precio y los atributos vigentes del hotel."""
+    record = {k: atributos[k] for k in HOTEL_ATTRIBUTES if atributos.get(k) is not None}
+    record['id'] = fila.get('id')
+    record.update((k, fila[k]) for k in PRICE_FIELDS if fila.get(k) is not None)
+    return {k: record[k] for k in HOTEL_ATTRIBUTES + PRICE_FIELDS if k in record}
+
+class HotelDimension:
+    """
+    Fichero ndjson de solo anexado con los atributos de cada hotel. Solo se añade una línea
+    cuando los atributos de un id cambian (se compara un hash); la última línea de cada id es la vigente.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._hashes = {} # id -> hash de los atributos vigentes
+        self.escritos = 0
+        self.sin_cambios = 0
+        # Con SHARDING cada réplica anexa a su propio fichero, pero parte de los atributos vigentes de todas
+        for hotel_id, entrada in cargar_dimension_hoteles(rutas_dimension_hoteles(os.path.dirname(path) or '.')).items():
+            self._hashes[hotel_id] = entrada.get('hash')
+
+    @staticmethod
+    def _hash(atributos):
+        return hashlib.sha1(json.dumps(atributos, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    def upsert(self, atributos, completo=True):
+        """
+        Añade los atributos del hotel si han cambiado. Los atributos incompletos (hotel sin detalles)
+        solo se escriben si el id aún no existe, para no sustituir una versión completa.
+        """
+        hotel_id = atributos.get('id')
+        if not hotel_id:
+            return False
+        digest = self._hash(atributos)
+        with self._lock:
+            anterior = self._hashes.get(hotel_id)
+            if anterior == digest or (not completo and anterior is not None):
+                self.sin_cambios += 1
+                return False
+            entrada = {**atributos, 'hash': digest, 'actualizado': datetime.now().isoformat(timespec='seconds')}
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entrada, ensure_ascii=False) + "\n")
+            self._hashes[hotel_id] = digest
+            self.escritos += 1
+            return True
+
+    def resumen(self):
+        """Texto con los hoteles escritos y sin cambios para el log."""
+        return f"{self.escritos} hoteles nuevos o modificados, {self.sin_cambios} sin cambios ({len(self._hashes)} en total)"
+
+def rutas_dimension_hoteles(directorio):
+    """Ficheros de la dimensión de hoteles de un directorio: HOTELS_FILENAME y los de cada réplica con SHARDING."""
+    return rutas_replicas(directorio, HOTELS_FILENAME)
+
+def cargar_dimension_hoteles(paths):
+    """
+    Lee la dimensión de hoteles (un fichero o una lista, p. ej. los de varias réplicas) y devuelve
+    id -> atributos vigentes: la última línea de cada id o, entre ficheros, la de 'actualizado' más reciente.
+    """
+    hoteles = {}
+    for path in [paths] if isinstance(paths, str) else paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            for linea in f:
+                try:
+                    entrada = json.loads(linea)
+                    anterior = hoteles.get(entrada['id'])
+                    if anterior is None or entrada.get('actualizado', '') >= anterior.get('actualizado', ''):
+                        hoteles[entrada['id']] = entrada
+                except (ValueError, KeyError):
+                    continue # Línea truncada por una escritura interrumpida
+    return hoteles
+
+def unir_salida(precios_path, hoteles_path=None):
+    """
+    Genera los registros en el formato ancho a partir de un fichero de precios del modo normalizado,
+    en cualquier formato de salida, y de la dimensión de hoteles (por defecto HOTELS_FILENAME y los de cada réplica
+    en OUT_DIRECTORY si el fichero está en un directorio provincia=/fecha=, o en el mismo directorio si no).
+    """
+    if hoteles_path is None:
+        directorio = os.path.dirname(os.path.abspath(precios_path))
+        while os.path.basename(directorio).startswith(('provincia=', 'fecha=')):
+            directorio = os.path.dirname(directorio)
+        hoteles_path = rutas_dimension_hoteles(directorio)
+    hoteles = cargar_dimension_hoteles(hoteles_path)
+    for fila in leer_registros(precios_path):
+        yield join_hotel_record(fila, hoteles.get(fila.get('id'), {}))
+
+# Dimensión de hoteles activa durante la ejecución de scraping() en modo normalizado
+_hotel_dimension = None
+# Segmentos de salida de la ejecución con OUTPUT_SEGMENTS: tipo ('ancho' o 'precios') -> SegmentWriter
+_segmentos = None
+# Diario de trabajos completados de la ejecución actual
+_run_journal = None
+
+# Límite de tiempo de la ejecución actual (time.monotonic()) y trabajos que no se empezaron por agotar
+# el presupuesto, por motivo ('sin_tiempo' o 'sin_solicitudes')
+_run_deadline = None
+_trabajos_sin_presupuesto = Counter()
+_presupuesto_lock = threading.Lock()
+# Solicitudes de las demás réplicas en la ejecución (SHARDING), según su última anotación en los leases
+_solicitudes_otras_replicas = 0
+
+def presupuesto_agotado():
+    """
+    Motivo por el que ya no se empiezan trabajos: 'sin_tiempo' si se ha superado RUN_TIME_BUDGET,
+    'sin_solicitudes' si se han hecho RUN_REQUEST_BUDGET solicitudes entre todas las réplicas, o None
+    si queda presupuesto.
+    """
+    if _run_deadline is not None and time.monotonic() >= _run_deadline:
+        return 'sin_tiempo'
+    if RUN_REQUEST_BUDGET > 0 and _fetch_stats.solicitudes + _solicitudes_otras_replicas >= RUN_REQUEST_BUDGET:
+        return 'sin_solicitudes'
+    return None
+
+def compartir_solicitudes(leases):
+    """
+    Con RUN_REQUEST_BUDGET, anota en los leases las solicitudes de esta réplica y lee las de las demás,
+    de modo que el presupuesto es de toda la ejecución y no de cada réplica.
+    """
+    global _solicitudes_otras_replicas
+    if RUN_REQUEST_BUDGET <= 0:
+        return
+    with _presupuesto_lock:
+        try:
+            leases.publicar_solicitudes(_fetch_stats.solicitudes)
+            _solicitudes_otras_replicas = leases.solicitudes_otras()
+        except (IOError, OSError) as e:
+            logging.error(f"No se pueden compartir las solicitudes de la réplica: {e}")
+
+def empezar_trabajo():
+    """Saca un trabajo de la cola de la ejecución; retorna False si ya no queda presupuesto para hacerlo."""
+    _metrics.inc('scraper_jobs_pending', -1)
+    motivo = presupuesto_agotado()
+    if motivo is not None:
+        with _presupuesto_lock:
+            _trabajos_sin_presupuesto[motivo] += 1
+        _metrics.inc('scraper_jobs_total', resultado=motivo)
+        _run_manifest.trabajo(motivo)
+        return False
+    _metrics.inc('scraper_jobs_running')
+    return True
+
+def terminar_trabajo(salidas):
+    _metrics.inc('scraper_jobs_running', -1)
+    _metrics.inc('scraper_jobs_total', resultado='ok' if salidas else 'error')
+    _run_manifest.trabajo('ok' if salidas else 'error')
+
+def run_job(dest_id, checkin_date, checkout_date, huespedes=DEFAULT_GUESTS):
+    """Extrae y guarda una provincia para una fecha de entrada y variante de estancia (modo síncrono)."""
+    if not empezar_trabajo():
+        return
+    province_name = get_province_from_dest_id(dest_id)
+    checkin_str = checkin_date.strftime("%Y-%m-%d")
+    checkout_str = checkout_date.strftime("%Y-%m-%d")
+    sufijo = variante(checkin_date, checkout_date, huespedes)
+
+    logging.info(f"Iniciando scraping para {province_name} para el {checkin_str}" + (f" ({sufijo})" if sufijo else ""))
+    salidas = None
+    try:
+        # Los hoteles se escriben según se obtienen, sin acumular la provincia completa en memoria
+        hotels_data = iter_booking_region(dest_id, checkin_str, checkout_str, huespedes)
+        salidas = guardar_resultados(hotels_data, province_name, checkin_date, sufijo)
+        registrar_trabajo(dest_id, checkin_date, salidas, sufijo)
+    finally:
+        terminar_trabajo(salidas)
+    return salidas
+
+def run_jobs_parallel(jobs, workers):
+    """
+    Ejecuta los trabajos en un pool de hilos. El ritmo total de solicitudes lo limita
+    _rate_limiter, compartido por todos los hilos; cada trabajo escribe su propio fichero.
+    """
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='scraper') as executor:
+        futures = {executor.submit(run_job, *job): job for job in jobs}
+        for future, (dest_id, checkin_date, *_) in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                logging.error(f"Error inesperado en el trabajo {get_province_from_dest_id(dest_id)} {checkin_date}: {e}")
+
+def run_jobs_sharded(jobs, workers, leases):
+    """
+    Modo distribuido (SHARDING): cada hilo reclama en el almacén de leases el siguiente trabajo libre, lo
+    ejecuta y lo marca como hecho o fallido. Cuando los trabajos que quedan los tienen otras réplicas, espera
+    LEASE_POLL segundos y vuelve a mirar, de modo que se queda con los de una réplica caída cuando expiran.
+    Un hilo aparte renueva los leases en curso cada LEASE_HEARTBEAT segundos.
+    """
+    parar = threading.Event()
+
+    def latido():
+        while not parar.wait(LEASE_HEARTBEAT):
+            try:
+                leases.renovar()
+            except (IOError, OSError) as e:
+                logging.error(f"No se pueden renovar los leases: {e}")
+            compartir_solicitudes(leases)
+
+    def trabajador():
+        while True:
+            compartir_solicitudes(leases)
+            if presupuesto_agotado() is not None:
+                return
+            try:
+                job, pendientes = leases.siguiente(jobs)
+            except (IOError, OSError) as e:
+                logging.error(f"No se pueden leer los leases: {e}")
+                job, pendientes = None, 1
+            _metrics.set('scraper_jobs_pending', pendientes)
+            if job is None:
+                if not pendientes:
+                    return
+                time.sleep(LEASE_POLL)
+                continue
+            dest_id, checkin_date = job[:2]
+            if presupuesto_agotado() is not None:
+                # Agotado mientras se reclamaba: se suelta sin gastar uno de sus intentos
+                try:
+                    leases.soltar(clave_trabajo(*job))
+                except (IOError, OSError) as e:
+                    logging.error(f"No se puede soltar el lease de {dest_id} {checkin_date}: {e}")
+                return
+            salidas = None
+            try:
+                salidas = run_job(*job)
+            except Exception as e:
+                logging.error(f"Error inesperado en el trabajo {get_province_from_dest_id(dest_id)} {checkin_date}: {e}")
+            finally:
+                try:
+                    leases.terminar(clave_trabajo(*job), salidas)
+                except (IOError, OSError) as e:
+                    logging.error(f"No se puede cerrar el lease de {dest_id} {checkin_date}: {e}")
+
+    hilo_latido = threading.Thread(target=latido, name='leases', daemon=True)
+    hilo_latido.start()
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='scraper') as executor:
+            for future in [executor.submit(trabajador) for _ in range(workers)]:
+                future.result()
+    finally:
+        parar.set()
+        leases.liberar()
+    motivo = presupuesto_agotado()
+    if motivo is not None:
+        # Los que no tiene en curso ninguna réplica; otras con presupuesto pueden hacerlos todavía
+        sin_empezar = leases.sin_empezar(jobs)
+        with _presupuesto_lock:
+            _trabajos_sin_presupuesto[motivo] += sin_empezar
+        for _ in range(sin_empezar):
+            _run_manifest.trabajo(motivo)
+
+async def scraping_async(jobs):
+    """
+    Ejecuta los trabajos de forma concurrente con AsyncFetchEngine. Como mucho ASYNC_MAX_CONCURRENCY trabajos
+    están en curso a la vez y el resto esperan en cola por orden, así que el presupuesto de la ejecución se
+    comprueba al empezar cada uno igual que en el modo con hilos.
+    """
+    loop = asyncio.get_running_loop()
+    # Hilos para las descargas (como mucho ASYNC_MAX_CONCURRENCY a la vez) y, aparte, para el parseo y la escritura
+    # de los resultados, que así no esperan a que termine una descarga para empezar
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=ASYNC_MAX_CONCURRENCY + (os.cpu_count() or 1)))
+    engine = AsyncFetchEngine(ASYNC_MAX_CONCURRENCY, ASYNC_MAX_PER_HOST)
+
+    async def _run_job(dest_id, checkin_date, checkout_date, huespedes):
+        if not empezar_trabajo():
+            return
+        province_name = get_province_from_dest_id(dest_id)
+        checkin_str = checkin_date.strftime("%Y-%m-%d")
+        checkout_str = checkout_date.strftime("%Y-%m-%d")
+        sufijo = variante(checkin_date, checkout_date, huespedes)
+
+        logging.info(f"Iniciando scraping para {province_name} para el {checkin_str}" + (f" ({sufijo})" if sufijo else ""))
+        salidas = None
+        try:
+            hotels_data = await engine.scrape_booking_region(dest_id, checkin_str, checkout_str, huespedes)
+            # La escritura (y el fsync de los ficheros y del diario) no bloquea las descargas de los demás trabajos
+            salidas = await asyncio.to_thread(guardar_resultados, hotels_data, province_name, checkin_date, sufijo)
+            await asyncio.to_thread(registrar_trabajo, dest_id, checkin_date, salidas, sufijo)
+        finally:
+            terminar_trabajo(salidas)
+
+    cola = deque(jobs)
+
+    async def _trabajador():
+        while cola:
+            dest_id, checkin_date, *_ = job = cola.popleft()
+            try:
+                await _run_job(*job)
+            except Exception as e:
+                logging.error(f"Error inesperado en el trabajo {get_province_from_dest_id(dest_id)} {checkin_date}: {e}")
+
+    await asyncio.gather(*(_trabajador() for _ in range(max(min(ASYNC_MAX_CONCURRENCY, len(jobs)), 1))))
+
+def scraping():
+    global _detail_cache, _http_cache, _http_session, _parse_stats, _field_failures, _hotel_dimension, _segmentos, _run_journal
+    global _run_deadline, _trabajos_sin_presupuesto, _solicitudes_otras_replicas, _pacer, _circuit, _fetch_stats, _profiler, _run_manifest, _pipeline
+    global OUTPUT_MODE
+
+    configurar_logging()
+
+    logging.info("Inicio de scraper booking.")
+    _run_manifest = RunManifest()
+    _run_deadline = time.monotonic() + RUN_TIME_BUDGET if RUN_TIME_BUDGET > 0 else None
+    _trabajos_sin_presupuesto = Counter()
+    _solicitudes_otras_replicas = 0
+
+    _detail_cache = abrir_cache_detalles()
+    _http_cache = abrir_cache_http()
+    _http_session = abrir_sesion_http()
+    _pacer = abrir_pacer()
+    _circuit = abrir_circuito()
+    _fetch_stats = FetchStats()
+    _profiler = None
+    if PROFILE:
+        _profiler = RunProfiler(os.path.join(OUT_DIRECTORY, nombre_replica(f"{PROFILE_PREFIX}{datetime.now().strftime('%Y%m%d_%H%M%S')}")))
+        _profiler.instrumentar()
+    _parse_stats = ParseStats()
+    _field_failures = FieldFailures()
+    comprobar_backends_parser()
+    _pipeline = abrir_pipeline()
+    if _pipeline is not None:
+        logging.info(f"Modo en cadena: {PIPELINE_FETCHERS} hilos de descarga de hoteles, {_pipeline.procesos} procesos de parseo, "
+                     f"cola de {PIPELINE_QUEUE_SIZE} páginas.")
+    if OUTPUT_MODE not in ('ancho', 'normalizado', 'ambos'):
+        logging.error(f"Formato de salida '{OUTPUT_MODE}' desconocido, se usa 'ancho'.")
+        OUTPUT_MODE = 'ancho'
+    comprobar_formato_salida()
+    _hotel_dimension = None
+    if OUTPUT_MODE != 'ancho':
+        _hotel_dimension = HotelDimension(os.path.join(OUT_DIRECTORY, nombre_replica(HOTELS_FILENAME)))
+    if OUTPUT_SEGMENTS and OUTPUT_FORMAT == 'parquet':
+        logging.error("Los segmentos no admiten el formato 'parquet'; se escribe un fichero por provincia y fecha.")
+        _segmentos = None
+    else:
+        _segmentos = abrir_segmentos()
+
+    # Obtiene la fecha de hoy como fecha de entrada inicial
+    start_date = date.today()
+    jobs = build_jobs(start_date)
+    variantes = variantes_estancia()
+    if variantes != [(DEFAULT_STAY_NIGHTS, DEFAULT_GUESTS)]:
+        logging.info(f"Matriz de estancias: {', '.join(f'{n} noches/{h} huéspedes' for n, h in variantes)}; "
+                     f"{len(jobs)} trabajos" + (f", variantes en los {VARIANT_DAYS} primeros días." if VARIANT_DAYS else "."))
+    if RUN_REQUEST_BUDGET > 0:
+        logging.info(f"Presupuesto de {RUN_REQUEST_BUDGET} solicitudes; los trabajos se hacen por orden de prioridad, "
+                     f"las fechas más próximas primero.")
+
+    # Diario del día: si una ejecución anterior de hoy se interrumpió, se continúa donde se quedó.
+    # Con SHARDING cada réplica tiene su diario y los trabajos ya hechos por cualquiera se saben por los leases.
+    _run_journal = RunJournal(os.path.join(OUT_DIRECTORY, nombre_replica(f"{JOURNAL_PREFIX}{start_date.strftime('%Y%m%d')}.ndjson")))
+    leases = None
+    if SHARDING:
+        leases = abrir_leases(start_date)
+        jobs = orden_replica(jobs)
+        _, pendientes = leases.siguiente(jobs, reclamar=False)
+        _run_manifest.reanudados = len(jobs) - pendientes
+        logging.info(f"Modo distribuido como réplica {REPLICA_ID}: {pendientes} de {len(jobs)} trabajos sin terminar "
+                     f"entre todas las réplicas.")
+    elif RESUME:
+        completados = _run_journal.completados()
+        pendientes = [job for job in jobs if (job[0], job[1].strftime('%Y-%m-%d'), variante(*job[1:])) not in completados]
+        _run_manifest.reanudados = len(jobs) - len(pendientes)
+        if len(pendientes) < len(jobs):
+            logging.info(f"Reanudando la ejecución de hoy: {len(jobs) - len(pendientes)} trabajos ya completados, "
+                         f"quedan {len(pendientes)}.")
+        jobs = pendientes
+
+    inicio_ejecucion = time.time()
+    _metrics.set('scraper_jobs_pending', len(jobs))
+    _metrics.set('scraper_run_in_progress', 1)
+    _metrics.set('scraper_last_progress_timestamp_seconds', inicio_ejecucion)
+    try:
+        if leases is not None:
+            if ASYNC_MODE:
+                logging.warning("SHARDING reparte los trabajos entre hilos; se ignora ASYNC_MODE.")
+            run_jobs_sharded(jobs, max(SCRAPER_WORKERS, 1), leases)
+        elif ASYNC_MODE:
+            logging.info(f"Modo asíncrono: {len(jobs)} trabajos, concurrencia máxima {ASYNC_MAX_CONCURRENCY} ({ASYNC_MAX_PER_HOST} por host).")
+            asyncio.run(scraping_async(jobs))
+        elif SCRAPER_WORKERS > 1:
+            logging.info(f"Modo paralelo: {len(jobs)} trabajos con {SCRAPER_WORKERS} hilos.")
+            run_jobs_parallel(jobs, SCRAPER_WORKERS)
+        else:
+            for job in jobs:
+                run_job(*job)
+    finally:
+        if _pipeline is not None:
+            _pipeline.cerrar()
+        cerrar_sesion_http(_http_session)
+        _http_session = None
+        if _profiler is not None:
+            _profiler.desinstrumentar()
+        _metrics.set('scraper_run_in_progress', 0)
+        _metrics.set('scraper_jobs_pending', 0)
+        _metrics.set('scraper_last_run_end_timestamp_seconds', time.time())
+        _metrics.set('scraper_last_run_duration_seconds', time.time() - inicio_ejecucion)
+        if _segmentos is not None:
+            for segmentos in _segmentos.values():
+                segmentos.close()
+
+    if _trabajos_sin_presupuesto['sin_tiempo']:
+        logging.warning(f"Presupuesto de tiempo de {RUN_TIME_BUDGET} s agotado: {_trabajos_sin_presupuesto['sin_tiempo']} trabajos sin hacer.")
+    if _trabajos_sin_presupuesto['sin_solicitudes']:
+        logging.warning(f"Presupuesto de {RUN_REQUEST_BUDGET} solicitudes agotado: "
+                        f"{_trabajos_sin_presupuesto['sin_solicitudes']} trabajos sin hacer.")
+    if leases is not None:
+        logging.info(f"Leases: {leases.resumen()}")
+    logging.info(f"Solicitudes HTTP: {_fetch_stats.resumen()}")
+    if _circuit is not None:
+        logging.info(f"Cortocircuito: {_circuit.resumen()}")
+    logging.info(f"Limitador de tasa: {_rate_limiter.resumen()}")
+    if _pacer is not None:
+        logging.info(f"Ritmo adaptativo: {_pacer.resumen()}")
+    if _pipeline is not None:
+        logging.info(f"Modo en cadena: {_pipeline.resumen()}")
+        _pipeline = None
+    if _detail_cache is not None:
+        logging.info(f"Caché de detalles: {_detail_cache.resumen()}")
+    if _http_cache is not None:
+        logging.info(f"Caché HTTP: {_http_cache.resumen()}")
+    if _hotel_dimension is not None:
+        logging.info(f"Dimensión de hoteles: {_hotel_dimension.resumen()}")
+    if _segmentos is not None:
+        for segmentos in _segmentos.values():
+            logging.info(f"Segmentos de salida: {segmentos.resumen()}")
+    for linea in _parse_stats.resumen():
+        logging.info(f"Parseo: {linea}")
+    logging.info(f"Fallos de extracción por campo: {_field_failures.resumen()}")
+    if _profiler is not None:
+        try:
+            for linea in _profiler.guardar():
+                logging.info(f"Perfil: {linea}")
+        except (IOError, OSError) as e:
+            logging.error(f"No se puede guardar el perfil de la ejecución: {e}")
+        _profiler = None
+    try:
+        logging.info(f"Manifiesto de la ejecución: {_run_manifest.guardar(OUT_DIRECTORY)}")
+    except (IOError, OSError) as e:
+        logging.error(f"No se puede guardar el manifiesto de la ejecución: {e}")
+    logging.info("Fin de scraper booking.")
+
+def percentil(valores, p):
+    """Percentil p (0-100) por el método del rango más cercano, o None sin valores."""
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    indice = max(0, min(len(ordenados) - 1, -(-len(ordenados) * p // 100) - 1))
+    return ordenados[int(indice)]
+
+def version_codigo():
+    """Huella del código en ejecución (sha256 de este fichero), para distinguir versiones en los manifiestos."""
+    try:
+        return sha256_fichero(os.path.abspath(__file__))[:12]
+    except (IOError, OSError):
+        return None
+
+class RunManifest:
+    """
+    Resultado de una ejecución en formato legible por máquina: tiempos, trabajos, hoteles por provincia
+    y fecha, solicitudes, bytes, aciertos de las cachés y percentiles de latencia. Se guarda como
+    manifiesto_<AAAAMMDD_HHMMSS>.json junto a la salida y se compara entre ejecuciones con --comparar.
+    """
+
+    def __init__(self):
+        self.inicio = datetime.now()
+        self._lock = threading.Lock()
+        self.trabajos = Counter() # resultado -> trabajos
+        self.hoteles = {} # 'provincia/AAAA-MM-DD[/variante]' -> hoteles escritos
+        self.reanudados = 0
+
+    def trabajo(self, resultado):
+        with self._lock:
+            self.trabajos[resultado] += 1
+
+    def hoteles_trabajo(self, provincia, fecha, hoteles, sufijo=''):
+        with self._lock:
+            self.hoteles[f"{provincia}/{fecha}" + (f"/{sufijo}" if sufijo else '')] = hoteles
+
+    def construir(self):
+        """Diccionario del manifiesto con el estado actual de los contadores de la ejecución."""
+        fin = datetime.now()
+        duracion = (fin - self.inicio).total_seconds()
+        hoteles = sum(self.hoteles.values())
+        latencias = {tipo: valores for tipo, valores in _fetch_stats.latencias.items()}
+        latencias['total'] = [v for valores in latencias.values() for v in valores]
+        parseo = {}
+        for (backend, kind), (paginas, segundos) in _parse_stats.tiempos.items():
+            parseo[f"{backend}/{kind}"] = segundos / paginas * 1000
+            if backend != PARSER_PARITY:
+                parseo[kind] = segundos / paginas * 1000
+        manifiesto = {
+            'version': version_codigo(),
+            'inicio': self.inicio.isoformat(timespec='seconds'),
+            'fin': fin.isoformat(timespec='seconds'),
+            'duracion_s': duracion,
+            'configuracion': {
+                'provincias': len(DEST_IDS_TO_SCRAPE), 'dias': DAYS_TO_SCRAPE, 'async': ASYNC_MODE,
+                'workers': SCRAPER_WORKERS, 'request_rate': REQUEST_RATE, 'adaptive_pacing': ADAPTIVE_PACING,
+                'parser_backend': PARSER_BACKEND, 'parse_subtrees': PARSE_SUBTREES,
+                'output_mode': OUTPUT_MODE, 'output_format': OUTPUT_FORMAT,
+                'pipeline': PIPELINE, 'replica': REPLICA_ID if SHARDING else None,
+                'estancias': STAY_LENGTHS, 'huespedes': GUEST_COUNTS, 'variant_days': VARIANT_DAYS,
+                'request_budget': RUN_REQUEST_BUDGET,
+            },
+            'trabajos': {
+                'intentados': self.trabajos['ok'] + self.trabajos['error'],
+                'completados': self.trabajos['ok'],
+                'fallidos': self.trabajos['error'],
+                'sin_tiempo': self.trabajos['sin_tiempo'],
+                'sin_solicitudes': self.trabajos['sin_solicitudes'],
+                'reanudados': self.reanudados,
+            },
+            'hoteles': {'total': hoteles, 'por_trabajo': dict(sorted(self.hoteles.items()))},
+            'hoteles_por_s': hoteles / duracion if duracion else None,
+            'solicitudes': {
+                'total': _fetch_stats.solicitudes,
+                'por_s': _fetch_stats.solicitudes / duracion if duracion else None,
+                'reintentos': _fetch_stats.reintentos,
+                'timeouts': _fetch_stats.timeouts,
+                'errores_conexion': _fetch_stats.errores_conexion,
+                'errores_http': {str(k): v for k, v in sorted(_fetch_stats.errores_http.items())},
+                'fallidas': _fetch_stats.fallidas,
+                'bytes': _fetch_stats.bytes,
+            },
+            'latencia_s': {tipo: {'p50': percentil(valores, 50), 'p95': percentil(valores, 95),
+                                  'p99': percentil(valores, 99), 'max': max(valores, default=None)}
+                           for tipo, valores in sorted(latencias.items())},
+            'parseo_ms': parseo,
+            'caches': {'dns': dict(_dns_stats)},
+        }
+        if _detail_cache is not None:
+            # Cada consulta de detalles es un acierto (incluidas las que esperan a la descarga en curso de otro
+            # trabajo) o un fallo que descarga la página, así que la tasa es (consultas - descargas) / consultas
+            # y no depende de cómo se intercalen los hilos
+            consultas = _detail_cache.aciertos + _detail_cache.misses
+            manifiesto['caches']['detalles'] = {'consultas': consultas, 'aciertos': _detail_cache.aciertos,
+                                                'compartidos': _detail_cache.compartidos, 'fallos': _detail_cache.misses,
+                                                'tasa_acierto': (consultas - _detail_cache.misses) / consultas if consultas else None}
+        if _http_cache is not None:
+            total = _http_cache.revalidadas + _http_cache.descargadas + _http_cache.sin_validadores
+            manifiesto['caches']['http'] = {'revalidadas': _http_cache.revalidadas, 'descargadas': _http_cache.descargadas,
+                                            'tasa_revalidacion': _http_cache.revalidadas / total if total else None,
+                                            'bytes_ahorrados': _http_cache.bytes_ahorrados}
+        return manifiesto
+
+    def guardar(self, directorio):
+        """Escribe el manifiesto en el directorio (primero en un .tmp) y retorna su ruta."""
+        path = os.path.join(directorio, nombre_replica(f"{MANIFEST_PREFIX}{self.inicio.strftime('%Y%m%d_%H%M%S')}.json"))
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self.construir(), f, ensure_ascii=False, indent=2)
+        os.replace(path + '.tmp', path)
+        return path
+
+_run_manifest = RunManifest()
+
+# Indicadores que compara --comparar: nombre -> (valor en el manifiesto, sentido, umbral por defecto, umbral absoluto).
+# Con sentido 'menor' empeora si sube y con 'mayor' si baja; el umbral es relativo salvo que se indique absoluto.
+MANIFEST_INDICATORS = {
+    'duracion_s': (lambda m: m['duracion_s'], 'menor', 0.20, False),
+    'solicitudes_por_s': (lambda m: m['solicitudes']['por_s'], 'mayor', 0.20, False),
+    'hoteles_por_s': (lambda m: m['hoteles_por_s'], 'mayor', 0.20, False),
+    'latencia_p50_s': (lambda m: m['latencia_s'].get('total', {}).get('p50'), 'menor', 0.25, False),
+    'latencia_p95_s': (lambda m: m['latencia_s'].get('total', {}).get('p95'), 'menor', 0.25, False),
+    'latencia_p99_s': (lambda m: m['latencia_s'].get('total', {}).get('p99'), 'menor', 0.25, False),
+    'parseo_busqueda_ms': (lambda m: m['parseo_ms'].get('busqueda'), 'menor', 0.25, False),
+    'parseo_hotel_ms': (lambda m: m['parseo_ms'].get('hotel'), 'menor', 0.25, False),
+    'hoteles': (lambda m: m['hoteles']['total'], 'mayor', 0.10, False),
+    'trabajos_completados': (lambda m: m['trabajos']['completados'] / m['trabajos']['intentados']
+                             if m['trabajos']['intentados'] else None, 'mayor', 0.02, True),
+    'tasa_fallos': (lambda m: m['solicitudes']['fallidas'] / m['solicitudes']['total']
+                    if m['solicitudes']['total'] else None, 'menor', 0.01, True),
+    'acierto_cache_detalles': (lambda m: m['caches'].get('detalles', {}).get('tasa_acierto'), 'mayor', 0.10, True),
+}
+
+def comparar_manifiestos(paths, umbrales=None):
+    """
+    Compara cada manifiesto con el primero (la referencia) e imprime una tabla por indicador.
+
+    Parámetros:
+        paths (list): Rutas de los manifiestos, la referencia primero.
+        umbrales (dict): Umbral por indicador que sustituye al de MANIFEST_INDICATORS.
+
+    Retorna:
+        list: (manifiesto, indicador) de cada regresión que supera su umbral.
+    """
+    umbrales = umbrales or {}
+    manifiestos = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            manifiestos.append(json.load(f))
+    base = manifiestos[0]
+    print(f"Referencia: {paths[0]} ({base.get('inicio')}, versión {base.get('version')})")
+    regresiones = []
+    for path, manifiesto in zip(paths[1:], manifiestos[1:]):
+        print(f"\n{path} ({manifiesto.get('inicio')}, versión {manifiesto.get('version')}):")
+        for nombre, (valor, sentido, umbral, absoluto) in MANIFEST_INDICATORS.items():
+            umbral = umbrales.get(nombre, umbral)
+            try:
+                anterior, actual = valor(base), valor(manifiesto)
+            except (KeyError, TypeError):
+                continue
+            if anterior is None or actual is None:
+                continue
+            if absoluto:
+                cambio = actual - anterior
+                texto = f"{cambio:+.3f}"
+            else:
+                cambio = (actual - anterior) / anterior if anterior else 0.0
+                texto = f"{cambio * 100:+.1f}%"
+            empeora = cambio > umbral if sentido == 'menor' else cambio < -umbral
+            marca = '  <-- REGRESIÓN' if empeora else ''
+            if empeora:
+                regresiones.append((path, nombre))
+            print(f"  {nombre:<24} {anterior:>12.4g} -> {actual:<12.4g} {texto:>9} (umbral {umbral:g}){marca}")
+    return regresiones
+
+class RunLock:
+    """
+    Cerrojo de fichero que impide dos ejecuciones a la vez sobre el mismo OUT_DIRECTORY, p. ej. una
+    ejecución programada que se alarga y un --once lanzado por cron. Usa lockf, que también funciona sobre NFS.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._f = None
+
+    def acquire(self):
+        """Intenta tomar el cerrojo sin esperar; retorna False si otra ejecución lo tiene."""
+        if fcntl is None:
+            return True
+        f = open(self.path, 'a+')
+        try:
+            fcntl.lockf(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        f.seek(0)
+        f.truncate()
+        f.write(f"{os.getpid()} {datetime.now().isoformat(timespec='seconds')}\n")
+        f.flush()
+        self._f = f
+        return True
+
+    def release(self):
+        if self._f is not None:
+            fcntl.lockf(self._f, fcntl.LOCK_UN)
+            self._f.close()
+            self._f = None
+
+def ejecutar_scraping(jitter=0):
+    """
+    Ejecuta scraping() si no hay otra ejecución en curso, tras esperar un retraso aleatorio de hasta
+    jitter segundos. Retorna True si la ejecución terminó sin excepciones.
+    """
+    configurar_logging()
+    if jitter > 0:
+        espera = random.uniform(0, jitter)
+        logging.info(f"Inicio retrasado {espera:.0f} s.")
+        time.sleep(espera)
+    cerrojo = RunLock(os.path.join(OUT_DIRECTORY, nombre_replica(LOCK_FILENAME)))
+    if not cerrojo.acquire():
+        logging.warning("Hay otra ejecución en curso sobre el mismo directorio de salida; se omite esta.")
+        return False
+    try:
+        scraping()
+        return True
+    except Exception:
+        logging.exception("Error inesperado en la ejecución del scraper.")
+        return False
+    finally:
+        cerrojo.release()
+
+def ejecutar_demonio():
+    """
+    Ejecuta el scraper cada día a SCHEDULE_TIME. Entre ejecuciones el proceso duerme hasta la siguiente
+    (schedule.idle_seconds) en lugar de comprobar la hora periódicamente. Como schedule calcula la próxima
+    ejecución al terminar la actual, una ejecución de más de 24 h no encadena otra justo detrás.
+    """
+    if RUN_ON_START:
+        ejecutar_scraping()
+    schedule.every().day.at(SCHEDULE_TIME).do(ejecutar_scraping, SCHEDULE_JITTER)
+    while True:
+        schedule.run_pending()
+        espera = schedule.idle_seconds()
+        if espera is None:
+            return
+        if espera > 0:
+            logging.info(f"Próxima ejecución: {schedule.next_run()}.")
+            # Se despierta al menos cada hora por si cambia la hora del sistema (p. ej. horario de verano)
+            time.sleep(min(espera, 3600))
+
+def medir_parseo(kind, paths, backend=None):
+    """Muestra, para cada fichero HTML, el tiempo y el pico de memoria del parseo completo frente al de subárboles."""
+    for path in paths:
+        with open(path, 'rb') as f:
+            content = f.read()
+        medida = measure_parse(content, kind, backend)
+        completo, subarbol = medida['completo'], medida['subarbol']
+        print(f"{path}: completo {completo['segundos'] * 1000:.1f} ms / {completo['pico_bytes'] / 1024:.0f} KiB, "
+              f"subárbol {subarbol['segundos'] * 1000:.1f} ms / {subarbol['pico_bytes'] / 1024:.0f} KiB, "
+              f"campos {'iguales' if medida['iguales'] else 'DISTINTOS'}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scraper de hoteles de Booking.com")
+    parser.add_argument('--medir-parseo', nargs='+', metavar=('TIPO', 'FICHERO'),
+                        help="Compara el parseo completo y por subárboles de páginas guardadas (TIPO: busqueda u hotel) y termina.")
+    parser.add_argument('--backend', default=None, help="Backend de parseo para --medir-parseo (por defecto PARSER_BACKEND).")
+    parser.add_argument('--unir', metavar='PRECIOS',
+                        help="Escribe en la salida estándar el fichero de precios del modo normalizado en el formato ancho y termina.")
+    parser.add_argument('--hoteles', default=None, help=f"Dimensión de hoteles para --unir (por defecto {HOTELS_FILENAME} junto a PRECIOS).")
+    parser.add_argument('--tramo', nargs=2, metavar=('PROVINCIA', 'FECHA'),
+                        help="Escribe en la salida estándar los registros de una provincia y fecha (AAAA-MM-DD) de los segmentos de OUT_DIRECTORY y termina.")
+    parser.add_argument('--precios', action='store_true', help="Con --tramo, lee las filas de precio en lugar de los registros anchos.")
+    parser.add_argument('--variante', default='', help="Con --tramo, variante de estancia (p. ej. 7n2p); por defecto 1 noche y 2 huéspedes.")
+    parser.add_argument('--comparar', nargs='+', metavar='MANIFIESTO',
+                        help="Compara manifiestos de ejecución con el primero y termina; sale con 1 si hay regresiones.")
+    parser.add_argument('--umbral', action='append', default=[], metavar='[INDICADOR=]VALOR',
+                        help="Umbral de --comparar para un indicador, o para todos sin INDICADOR; se puede repetir.")
+    parser.add_argument('--profile', action='store_true',
+                        help="Perfila la ejecución: cProfile por etapa, traza de tiempos por solicitud y las solicitudes más lentas.")
+    parser.add_argument('--once', action='store_true',
+                        help="Ejecuta el scraper una sola vez y termina (para lanzarlo desde un cron externo).")
+    args = parser.parse_args()
+
+    if args.tramo:
+        provincia, fecha = args.tramo
+        for record in leer_tramo(OUT_DIRECTORY, provincia.lower().replace(' ', '_'), fecha,
+                                 'precios' if args.precios else 'hoteles', args.variante):
+            print(json.dumps(record, ensure_ascii=False))
+        raise SystemExit(0)
+
+    if args.comparar:
+        if len(args.comparar) < 2:
+            parser.error("--comparar necesita al menos dos manifiestos")
+        umbrales, especificos = {}, {}
+        for umbral in args.umbral:
+            nombre, _, valor = umbral.rpartition('=')
+            try:
+                valor = float(valor)
+            except ValueError:
+                parser.error(f"umbral no válido: {umbral}")
+            if nombre and nombre not in MANIFEST_INDICATORS:
+                parser.error(f"indicador desconocido: {nombre} (válidos: {', '.join(MANIFEST_INDICATORS)})")
+            if nombre:
+                especificos[nombre] = valor
+            else:
+                umbrales = dict.fromkeys(MANIFEST_INDICATORS, valor)
+        umbrales.update(especificos)
+        raise SystemExit(1 if comparar_manifiestos(args.comparar, umbrales) else 0)
+
+    if args.unir:
+        for record in unir_salida(args.unir, args.hoteles):
+            print(json.dumps(record, ensure_ascii=False))
+        raise SystemExit(0)
+
+    if args.medir_parseo:
+        tipo, *ficheros = args.medir_parseo
+        if tipo not in PAGE_REGIONS or not ficheros:
+            parser.error("--medir-parseo necesita un tipo (busqueda u hotel) y al menos un fichero")
+        medir_parseo(tipo, ficheros, args.backend)
+        raise SystemExit(0)
+
+    if args.profile:
+        PROFILE = True
+    configurar_logging()
+    comprobar_formato_salida()
+    iniciar_servidor_metricas()
+    if args.once:
+        raise SystemExit(0 if ejecutar_scraping() else 1)
+
+    ejecutar_demonio()
\ No newline at end of file